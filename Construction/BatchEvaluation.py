@@ -0,0 +1,96 @@
+from .CompoundFunction import CompoundFunction, INPUT_ID, OUTPUT_ID, KEY_ID
+from .Linear import Linear
+from weakref import WeakKeyDictionary
+import numpy as np
+
+# Bitsliced evaluation: every wire is a lane, an array of uint64 words in which bit j of word w holds the value of the wire for sample 64*w + j.
+# Values of more than 64 bits are given as arrays of shape (N, n_words), word i holds bits 64*i up to 64*i + 63.
+
+def _n_words(n_bits):
+    return max(1, (n_bits + 63) // 64)
+
+def to_lanes(values, n_bits):
+    values = np.asarray(values, dtype=np.uint64).reshape(len(values), -1)
+    n_samples = values.shape[0]
+    lanes = np.zeros((n_bits, _n_words(n_samples)), dtype=np.uint64)
+    for i in range(n_bits):
+        bits = ((values[:, i // 64] >> np.uint64(i % 64)) & np.uint64(1)).astype(np.uint8)
+        packed = np.packbits(bits, bitorder="little")
+        lanes[i].view(np.uint8)[:len(packed)] = packed
+    return lanes
+
+def from_lanes(lanes, n_samples):
+    n_bits = len(lanes)
+    values = np.zeros((n_samples, _n_words(n_bits)), dtype=np.uint64)
+    for i in range(n_bits):
+        bits = np.unpackbits(lanes[i].view(np.uint8), bitorder="little")[:n_samples].astype(np.uint64)
+        values[:, i // 64] |= bits << np.uint64(i % 64)
+    return values[:, 0] if n_bits <= 64 else values
+
+_anfs = WeakKeyDictionary()
+def _anf(f):
+    # anf[j] lists the monomials (as input masks) of output bit j
+    if f not in _anfs:
+        table = np.array([f(x) for x in range(2**f.input_size)], dtype=np.uint64)
+        anf = []
+        for j in range(f.output_size):
+            coefficients = ((table >> np.uint64(j)) & np.uint64(1)).astype(np.uint8)
+            # Moebius transform
+            step = 1
+            while step < len(coefficients):
+                c = coefficients.reshape(-1, 2*step)
+                c[:, step:] ^= c[:, :step]
+                step *= 2
+            anf.append(tuple(np.flatnonzero(coefficients).tolist()))
+        _anfs[f] = anf
+    return _anfs[f]
+
+def _evaluate_component(f, inputs):
+    n_words = inputs.shape[1]
+    if isinstance(f, Linear):
+        # rows of the binary matrix, output i is the xor of the inputs selected by row i
+        mat = np.asarray(f.mat, dtype=np.uint8)
+        outputs = np.zeros((f.output_size, n_words), dtype=np.uint64)
+        for i in range(f.output_size):
+            selected = np.flatnonzero(mat[i])
+            if len(selected) > 0:
+                outputs[i] = np.bitwise_xor.reduce(inputs[selected], axis=0)
+        return outputs
+    if isinstance(f, CompoundFunction):
+        return evaluate_lanes(f, inputs)
+    # small components are evaluated through their algebraic normal form, monomials are shared between output bits
+    monomials = {0: np.full(n_words, ~np.uint64(0), dtype=np.uint64)}
+    def monomial(m):
+        if m not in monomials:
+            low = m & -m
+            monomials[m] = monomial(m ^ low) & inputs[low.bit_length() - 1]
+        return monomials[m]
+    outputs = np.zeros((f.output_size, n_words), dtype=np.uint64)
+    for j, anf in enumerate(_anf(f)):
+        for m in anf:
+            outputs[j] ^= monomial(m)
+    return outputs
+
+def evaluate_lanes(f, input_lanes, key_lanes = None):
+    # bitsliced evaluation of a CompoundFunction, input_lanes has shape (input_size, n_words), key_lanes (n_key_bits, n_words)
+    wires = {INPUT_ID: input_lanes}
+    def lane(wire):
+        if wire[0] == KEY_ID:
+            return key_lanes[wire[1]]
+        return wires[wire[0]][wire[1]]
+    for i in range(1, f.n_components+1):
+        record = f.components[i]
+        inputs = np.array([lane(wire) for wire in record.input_connections], dtype=np.uint64).reshape(len(record.input_connections), input_lanes.shape[1])
+        wires[i] = _evaluate_component(record.f, inputs)
+    return np.array([lane(wire) for wire in f.components[OUTPUT_ID].input_connections], dtype=np.uint64).reshape(f.output_size, input_lanes.shape[1])
+
+def evaluate_batch(f, inputs, keys = None):
+    """
+    Evaluates f on every pair (inputs[i], keys[i]).
+    inputs and keys are arrays of N integers (uint64) or of shape (N, n_words) for more than 64 bits, keys can be omitted if f has no key bits.
+    The result has the same format.
+    """
+    n_samples = len(inputs)
+    key_lanes = None if keys is None else to_lanes(keys, f.n_key_bits)
+    assert(keys is not None or f.n_key_bits == 0)
+    return from_lanes(evaluate_lanes(f, to_lanes(inputs, f.input_size), key_lanes), n_samples)
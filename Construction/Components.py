@@ -1,14 +1,21 @@
 from .Function import Function 
 from Modelling.PropModels import compute_parity_propagation_model, compute_UT_propagation_model
+from Modelling.CNF import CNF
 from abc import abstractmethod
 from pysat.card import CardEnc, EncType
 
 class Component(Function):
+    # name of the CNF minimisation engine in Modelling.PropModels.MINIMISERS, "espresso" for components too large for QMC
+    minimiser = "QMC"
+
     def __init__(self, input_size, output_size):
         super().__init__(input_size, output_size)
         self.parity_prop_models = {}
         self.n_cvars = 0
         self.UT_prop_model = None
+        # CNF templates of the models, built once for the instances in CompoundFunction models
+        self.parity_prop_templates = {}
+        self.UT_prop_template = None
 
     def compute_parity_propagation_model(self, input_key_mask, output_key_mask):
         return compute_parity_propagation_model(self, input_key_mask, output_key_mask)
@@ -18,6 +25,11 @@ class Component(Function):
             self.parity_prop_models[(input_key_mask, output_key_mask)] = self.compute_parity_propagation_model(input_key_mask, output_key_mask)
         return self.parity_prop_models[(input_key_mask, output_key_mask)]
 
+    def get_parity_propagation_template(self, input_key_mask, output_key_mask):
+        if (input_key_mask, output_key_mask) not in self.parity_prop_templates:
+            self.parity_prop_templates[(input_key_mask, output_key_mask)] = CNF(self.get_parity_propagation_model(input_key_mask, output_key_mask))
+        return self.parity_prop_templates[(input_key_mask, output_key_mask)]
+
     def compute_UT_propagation_model(self):
         return compute_UT_propagation_model(self)
 
@@ -26,6 +38,11 @@ class Component(Function):
             self.UT_prop_model, self.n_cvars = self.compute_UT_propagation_model()
         return self.UT_prop_model
 
+    def get_UT_propagation_template(self):
+        if self.UT_prop_template is None:
+            self.UT_prop_template = CNF(self.get_UT_propagation_model())
+        return self.UT_prop_template
+
     def get_n_cvars(self):
         if self.UT_prop_model is None:
             self.UT_prop_model, self.n_cvars = self.compute_UT_propagation_model()
@@ -37,8 +54,9 @@ class Component(Function):
 
 class SBox(Component):
 
-    def __init__(self, input_size, output_size, lookup_table: list):
+    def __init__(self, input_size, output_size, lookup_table: list, minimiser = "QMC"):
         self.lookup_table = lookup_table
+        self.minimiser = minimiser
         super().__init__(input_size, output_size)
 
     def __call__(self, v):
@@ -1,6 +1,7 @@
 from .Function import Function
 from .Components import Component, XOR
-from pysat.formula import IDPool
+from Modelling.CNF import InstancedCNF, VarPool, new_vars
+import numpy as np
 
 INPUT_ID = 0
 OUTPUT_ID = 2**64
@@ -16,6 +17,17 @@ class Null(Function):
     def __call__(self, v):
         return 0
 
+def _variable_map(n_vars, pool, fixed):
+    # vs[x] is the new variable for local variable x, fixed is a sequence of (local vars, new vars)
+    # the remaining variables are taken from the pool in increasing order of the local variable
+    vs = np.zeros(n_vars+1, dtype=np.int32)
+    for local_vars, global_vars in fixed:
+        # as before, only the first len(local_vars) of the given variables are used
+        vs[np.asarray(local_vars, dtype=np.int64)] = np.asarray(global_vars, dtype=np.int32)[:len(local_vars)]
+    free = np.flatnonzero(vs[1:] == 0) + 1
+    vs[free] = new_vars(pool, len(free))
+    return vs
+
 class component_record(object):
     def __init__(self, f):
         self.f = f
@@ -36,14 +48,17 @@ class CompoundFunction(Function):
         self.n_components = 0
         self.n_key_bits = 0
         self.key = 0
-        self.local_model = tuple()
-        self.local_UT_model = tuple()
+        self.local_model = InstancedCNF()
+        self.local_UT_model = InstancedCNF()
+        self.__flat_model = None
+        self.__flat_UT_model = None
         self.local_input_vars = tuple()
         self.local_output_vars = tuple()
         self.local_key_vars = tuple()
         self.local_c_vars = tuple()
         self.local_vars = {}
         self.n_vars = 0
+        self.n_UT_vars = 0
         return
 
     def add_component(self, component):
@@ -84,8 +99,8 @@ class CompoundFunction(Function):
         self.n_key_bits += 1
         return
 
-    def __call__(self, v):
-        # evaluates with random key based on the given key value
+    def __call__(self, v, key = 0):
+        # evaluates with the given key, bit i of key is the i-th key bit (in order of connect_to_key)
         outputs = [v]
         for i in range(1, self.n_components+1):
             # construct input
@@ -113,8 +128,9 @@ class CompoundFunction(Function):
             assert((ERROR_ID, ERROR_ID) not in record.input_connections)
             assert((ERROR_ID, ERROR_ID) not in record.output_connections)
 
-        pool = IDPool()
-        self.local_model = []
+        pool = VarPool()
+        self.local_model = InstancedCNF()
+        self.__flat_model = None
         # build model
         all_component_output_vars = {}
         self.local_key_vars = tuple(pool.id() for _ in range(self.n_key_bits))
@@ -136,37 +152,38 @@ class CompoundFunction(Function):
                     vs[j+1] = input_vars[j]
                 for j in range(f.output_size):
                     vs[f.input_size + j + 1] = output_vars[j]
-                self.local_vars[i] = vs.copy()
-                vs += [-x for x in vs[1:][::-1]]
-                for clause in f.get_parity_propagation_model(component.input_key_mask, component.output_key_mask):
-                    self.local_model.append(tuple(vs[x] for x in clause))
+                self.local_vars[i] = vs
+                template = f.get_parity_propagation_template(component.input_key_mask, component.output_key_mask)
+                # variables of the model after the inputs and outputs are auxiliary variables of the component
+                self.local_model.add(template, vs + [pool.id() for _ in range(template.nv - f.input_size - f.output_size)])
             elif isinstance(f, CompoundFunction):
-                clauses = f.to_model()[0]
-                vs = [0]*(f.n_vars+1)
-                for j in range(f.input_size):
-                    vs[f.local_input_vars[j]] = input_vars[j]
-                for j in range(f.output_size):
-                    vs[f.local_output_vars[j]] = output_vars[j]
-                for j in range(1, len(vs)):
-                    if vs[j] == 0:
-                        vs[j] = pool.id()
-                self.local_vars[i] = vs.copy()
-                vs += [-x for x in vs[1:][::-1]]
-                for clause in clauses:
-                    self.local_model.append(tuple(vs[x] for x in clause))
+                clauses = f._instanced_model()
+                vs = _variable_map(f.n_vars, pool, ((f.local_input_vars, input_vars), (f.local_output_vars, output_vars)))
+                self.local_vars[i] = vs.tolist()
+                self.local_model.extend(clauses.relabel(vs))
             else:
                 self.local_input_vars = output_vars
             # recover local output vars
         self.local_output_vars = tuple(all_component_output_vars[wire] for wire in self.components[OUTPUT_ID].input_connections)
-        self.n_vars = max(map(lambda x: max(map(abs, x)), self.local_model))
+        self.n_vars = self.local_model.nv
         return
 
-    def to_model(self, pool=None, input_vars = tuple(), output_vars = tuple(), key_vars = tuple()):
-        if len(self.local_model) == 0:
+    def _instanced_model(self):
+        # the local model as instances of component templates, it is materialised once on the first call to to_model
+        if len(self.local_model.instances) == 0:
             self.__build_local_model()
+        return self.local_model
+
+    def __materialised_model(self):
+        if self.__flat_model is None:
+            self.__flat_model = self.local_model.materialise()
+        return self.__flat_model
+
+    def to_model(self, pool=None, input_vars = tuple(), output_vars = tuple(), key_vars = tuple()):
+        self._instanced_model()
 
         if pool is None:
-            return tuple(self.local_model), self.local_input_vars, self.local_output_vars, self.local_key_vars
+            return self.__materialised_model()[:], self.local_input_vars, self.local_output_vars, self.local_key_vars
         
         if len(input_vars) == 0:
             input_vars = tuple(pool.id() for _ in range(self.input_size))
@@ -177,25 +194,25 @@ class CompoundFunction(Function):
         else:
             output_vars = tuple(output_vars)
 
-        vs = [0]*(self.n_vars+1)
-        for i in range(self.input_size):
-            vs[self.local_input_vars[i]] = input_vars[i]
-        for i in range(self.output_size):
-            vs[self.local_output_vars[i]] = output_vars[i]
-        for i in range(1, len(vs)):
-            if vs[i] == 0:
-                vs[i] = pool.id()
-        vs += [-x for x in vs[1:][::-1]]
-        model = []
-        for clause in self.local_model:
-            model.append(tuple(vs[x] for x in clause))
-        
-        return model, input_vars, output_vars, key_vars
+        vs = _variable_map(self.n_vars, pool, ((self.local_input_vars, input_vars), (self.local_output_vars, output_vars)))
+        return self.__materialised_model().relabel(vs), input_vars, output_vars, key_vars
 
     def __build_local_UT_model(self):
         self.__build_local_model()
-        pool = IDPool(start_from=self.n_vars+1)
-        self.local_UT_model = []
+        pool = VarPool(start_from=self.n_vars+1)
+        self.local_UT_model = InstancedCNF()
+        self.__flat_UT_model = None
+        self.local_c_vars = tuple()
+        # the count vars are n_vars+1, ..., the auxiliary variables of the UT models of the components follow them
+        n_c_vars = 0
+        for i in range(1, self.n_components+1):
+            f = self.components[i].f
+            if isinstance(f, Component):
+                n_c_vars += f.get_n_cvars()
+            elif isinstance(f, CompoundFunction):
+                f._instanced_UT_model()
+                n_c_vars += len(f.local_c_vars)
+        aux_pool = VarPool(start_from=self.n_vars+n_c_vars+1)
         # build model
         for i in range(1, self.n_components+1):
             component = self.components[i]
@@ -203,28 +220,36 @@ class CompoundFunction(Function):
             # generate clauses
             if isinstance(f, Component):
                 c_vars = tuple(pool.id() for _ in range(f.get_n_cvars()))
+                template = f.get_UT_propagation_template()
                 vs = self.local_vars[i] + list(c_vars)
-                vs += [-x for x in vs[1:][::-1]]
-                for clause in f.get_UT_propagation_model():
-                    self.local_UT_model.append(tuple(vs[x] for x in clause))
+                vs += [aux_pool.id() for _ in range(template.nv - len(vs) + 1)]
+                self.local_UT_model.add(template, vs)
                 self.local_c_vars += c_vars
             elif isinstance(f, CompoundFunction):
-                clauses, _, _, _, cv = f.to_UT_model()
+                clauses, cv = f._instanced_UT_model(), f.local_c_vars
                 c_vars = tuple(pool.id() for _ in range(len(cv)))
-                vs = self.local_vars[i] + list(c_vars)
-                vs += [-x for x in vs[1:][::-1]]
-                for clause in clauses:
-                    self.local_UT_model.append(tuple(vs[x] for x in clause))
+                vs = self.local_vars[i] + list(c_vars) + [aux_pool.id() for _ in range(f.n_UT_vars - f.n_vars - len(cv))]
+                self.local_UT_model.extend(clauses.relabel(vs))
                 self.local_c_vars += c_vars
+        self.n_UT_vars = aux_pool.top
         return
 
+    def _instanced_UT_model(self):
+        if len(self.local_UT_model.instances) == 0:
+            self.__build_local_UT_model()
+        return self.local_UT_model
+
+    def __materialised_UT_model(self):
+        if self.__flat_UT_model is None:
+            self.__flat_UT_model = self.local_UT_model.materialise()
+        return self.__flat_UT_model
+
     def to_UT_model(self, pool=None, input_vars = tuple(), output_vars = tuple(), key_vars = tuple(), c_vars = tuple()):
         # this model does not include the possible gain at the input set
-        if len(self.local_UT_model) == 0:
-            self.__build_local_UT_model()
+        self._instanced_UT_model()
 
         if pool is None:
-            return tuple(self.local_UT_model), self.local_input_vars, self.local_output_vars, self.local_key_vars, self.local_c_vars
+            return self.__materialised_UT_model()[:], self.local_input_vars, self.local_output_vars, self.local_key_vars, self.local_c_vars
         
         if len(input_vars) == 0:
             input_vars = tuple(pool.id() for _ in range(self.input_size))
@@ -243,22 +268,6 @@ class CompoundFunction(Function):
         else:
             c_vars = tuple(c_vars)
 
-        vs = [0]*(self.n_vars+len(self.local_c_vars)+1)
-        for i in range(self.input_size):
-            vs[self.local_input_vars[i]] = input_vars[i]
-        for i in range(self.output_size):
-            vs[self.local_output_vars[i]] = output_vars[i]
-        for i in range(self.n_key_bits):
-            vs[self.local_key_vars[i]] = key_vars[i]
-        for i in range(len(self.local_c_vars)):
-            vs[self.local_c_vars[i]] = c_vars[i]
-        for i in range(1, len(vs)):
-            if vs[i] == 0:
-                vs[i] = pool.id()
-        vs += [-x for x in vs[1:][::-1]]
-        model = []
-        for clause in self.local_UT_model:
-            model.append(tuple(vs[x] for x in clause))
-        
-        return model, input_vars, output_vars, key_vars, c_vars
+        vs = _variable_map(self.n_UT_vars, pool, ((self.local_input_vars, input_vars), (self.local_output_vars, output_vars), (self.local_key_vars, key_vars), (self.local_c_vars, c_vars)))
+        return self.__materialised_UT_model().relabel(vs), input_vars, output_vars, key_vars, c_vars
         
\ No newline at end of file
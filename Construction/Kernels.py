@@ -0,0 +1,138 @@
+from .CompoundFunction import CompoundFunction, INPUT_ID, OUTPUT_ID, KEY_ID
+from .Components import Component
+from .Linear import Linear
+from .BatchEvaluation import _anf, to_lanes, from_lanes
+from Modelling.PropModels import UT_matrix
+from hashlib import sha256
+from weakref import WeakKeyDictionary
+from numba import njit
+import numpy as np
+
+# Straight-line numba kernels for CompoundFunctions.
+# The generated source only depends on the structure of the DAG (and the tables of its components),
+# such that the source (and its hash) identifies the kernel and structurally equal functions share a compiled kernel.
+
+class _Emitter(object):
+    def __init__(self):
+        self.lines = []
+        self.n_names = 0
+
+    def name(self, expression):
+        n = f"t{self.n_names}"
+        self.n_names += 1
+        self.lines.append(f"{n} = {expression}")
+        return n
+
+    def xor(self, names):
+        if len(names) == 0:
+            return "ZERO"
+        return self.name(" ^ ".join(names))
+
+    def component(self, f, inputs):
+        # returns the names of the output lanes of f given the names of its input lanes
+        if isinstance(f, Linear):
+            mat = np.asarray(f.mat, dtype=np.uint8)
+            return [self.xor([inputs[j] for j in np.flatnonzero(mat[i])]) for i in range(f.output_size)]
+        if isinstance(f, CompoundFunction):
+            return self.compound(f, inputs, [])
+        monomials = {0: "ONES"}
+        def monomial(m):
+            if m not in monomials:
+                low = m & -m
+                rest = monomial(m ^ low)
+                monomials[m] = inputs[low.bit_length() - 1] if rest == "ONES" else self.name(f"{rest} & {inputs[low.bit_length() - 1]}")
+            return monomials[m]
+        return [self.xor([monomial(m) for m in anf]) for anf in _anf(f)]
+
+    def compound(self, f, inputs, keys):
+        wires = {INPUT_ID: inputs}
+        def lane(wire):
+            return keys[wire[1]] if wire[0] == KEY_ID else wires[wire[0]][wire[1]]
+        for i in range(1, f.n_components+1):
+            record = f.components[i]
+            wires[i] = self.component(record.f, [lane(wire) for wire in record.input_connections])
+        return [lane(wire) for wire in f.components[OUTPUT_ID].input_connections]
+
+def kernel_source(f):
+    e = _Emitter()
+    inputs = [f"x{i}" for i in range(f.input_size)]
+    keys = [f"k{i}" for i in range(f.n_key_bits)]
+    outputs = e.compound(f, inputs, keys)
+    body = [f"x{i} = inp[{i}, w]" for i in range(f.input_size)] + [f"k{i} = key[{i}, w]" for i in range(f.n_key_bits)]
+    body += e.lines + [f"out[{i}, w] = {o}" for i, o in enumerate(outputs)]
+    return "def kernel(inp, key, out):\n    for w in range(inp.shape[1]):\n" + "".join(f"        {line}\n" for line in body)
+
+# structural hashes per function object, functions are not changed once they are evaluated (as for their cached models)
+_hashes = WeakKeyDictionary()
+def structural_hash(f):
+    if f not in _hashes:
+        _hashes[f] = sha256(kernel_source(f).encode()).hexdigest()
+    return _hashes[f]
+
+def _jit(source, name, constants):
+    namespace = dict(constants)
+    exec(source, namespace)
+    return njit(namespace[name])
+
+_kernels = {}
+def compile_kernel(f):
+    """
+    Returns a function that evaluates f as evaluate_batch does, with a numba compiled kernel over bitsliced lanes.
+    Kernels are cached by structural hash.
+    """
+    h = structural_hash(f)
+    if h not in _kernels:
+        _kernels[h] = _jit(kernel_source(f), "kernel", {"ZERO": np.uint64(0), "ONES": ~np.uint64(0)})
+    kernel = _kernels[h]
+    def evaluate(inputs, keys = None):
+        input_lanes = to_lanes(inputs, f.input_size)
+        key_lanes = to_lanes(np.zeros(len(inputs), dtype=np.uint64) if keys is None else keys, max(f.n_key_bits, 1))
+        out = np.zeros((f.output_size, input_lanes.shape[1]), dtype=np.uint64)
+        kernel(input_lanes, key_lanes, out)
+        return from_lanes(out, len(inputs))
+    return evaluate
+
+def correlation_source(f, table_index):
+    # f should be a single layer: all inputs of the components come from the input or the key, all outputs go to the output
+    output_wire = {}
+    for j, (c, w) in enumerate(f.components[OUTPUT_ID].input_connections):
+        output_wire[(c, w)] = j
+    lines = []
+    for i in range(1, f.n_components+1):
+        record = f.components[i]
+        if not isinstance(record.f, Component) or isinstance(record.f, Linear) or any(c not in (INPUT_ID, KEY_ID) for c, _ in record.input_connections):
+            raise ValueError("correlation kernels are only supported for a single layer of small components")
+        uc = [f"(({'k' if c == KEY_ID else 'u'} >> {w}) & 1) << {j}" for j, (c, w) in enumerate(record.input_connections)]
+        vc = [f"((v >> {output_wire[(i, j)]}) & 1) << {j}" for j in range(record.f.output_size) if (i, j) in output_wire]
+        lines.append(f"r *= tables[{table_index[record.f]}, {' | '.join(vc) or '0'}, {' | '.join(uc) or '0'}]")
+    body = ["u, v, k = us[s], vs[s], ks[s]", "r = np.int64(1)"] + lines + ["res[s] = r"]
+    return "def correlation(us, vs, ks, tables, res):\n    for s in range(len(us)):\n" + "".join(f"        {line}\n" for line in body)
+
+_correlations = {}
+def compile_correlation(f):
+    """
+    Returns a function (us, vs, ks) -> correlations for arrays of input, output and key masks (of at most 64 bits),
+    the product of the entries of the UT matrices of the components of f, modulo 2^64 as int64.
+    f should be a single layer of components, such as a round function or a key addition.
+    """
+    components = []
+    for i in range(1, f.n_components+1):
+        if f.components[i].f not in components:
+            components.append(f.components[i].f)
+    table_index = {c: i for i, c in enumerate(components)}
+    source = correlation_source(f, table_index)
+    matrices = [UT_matrix(c, c.input_size, c.output_size) for c in components]
+    tables = np.zeros((max(1, len(matrices)), max([m.shape[0] for m in matrices], default=1), max([m.shape[1] for m in matrices], default=1)), dtype=np.int64)
+    for i, m in enumerate(matrices):
+        tables[i, :m.shape[0], :m.shape[1]] = m
+    h = sha256(source.encode() + tables.tobytes()).hexdigest()
+    if h not in _correlations:
+        _correlations[h] = _jit(source, "correlation", {"np": np})
+    kernel = _correlations[h]
+    def correlation(us, vs, ks = None):
+        us, vs = np.asarray(us, dtype=np.uint64), np.asarray(vs, dtype=np.uint64)
+        ks = np.zeros(len(us), dtype=np.uint64) if ks is None else np.asarray(ks, dtype=np.uint64)
+        res = np.zeros(len(us), dtype=np.int64)
+        kernel(us.astype(np.int64), vs.astype(np.int64), ks.astype(np.int64), tables, res)
+        return res
+    return correlation
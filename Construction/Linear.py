@@ -2,19 +2,73 @@ from .CompoundFunction import CompoundFunction, INPUT_ID, OUTPUT_ID
 from .Components import get_COPYn, get_XORn, Component
 from galois import GF, GF2
 from numpy import matmul
+import numpy as np
 
 def convert_to_F2_matrix(mat):
-    res = GF2.Zeros((mat.shape[0]*mat._degree, mat.shape[1]*mat._degree))
+    # column d*i+j is the image of the unit vector with 2^j at position i, bit b of entry a is row d*a+b
+    d = mat._degree
     Field = GF(mat._order)
-    for i in range(mat.shape[1]):
-        for j in range(mat._degree):
-            x = Field.Zeros((mat.shape[0], 1))
-            x[i, 0] = Field(1<<j)
-            v = matmul(mat, x)
-            for a in range(mat.shape[0]):
-                for b in range(mat._degree):
-                    res[mat._degree*a+b, mat._degree*i+j] = (int(v[a])>>b)&1
-    return res
+    products = mat[:, :, None] * Field([1<<j for j in range(d)])[None, None, :]
+    bits = (products.view(np.ndarray)[..., None].astype(np.int64) >> np.arange(d)) & 1
+    return GF2(bits.transpose(0, 3, 1, 2).reshape(mat.shape[0]*d, mat.shape[1]*d))
+
+def _edges(mat):
+    # the nonzero entries (j, i) of the matrix, these are the wires between the COPYs and the XORs of linear_to_compound_COPY_XOR
+    return np.argwhere(np.asarray(mat, dtype=np.uint8) == 1).tolist()
+
+def linear_propagation_model(mat, UT, input_key_mask=0, output_key_mask=0):
+    """
+    The model of the COPY/XOR expansion of mat (see linear_to_compound_COPY_XOR), built directly from the matrix.
+    Variables are the inputs, the outputs, the count vars (for UT) and then one variable per nonzero entry of mat
+    (and for UT the prefix ORs of the entries of each row), such that models have linear size in the number of entries
+    and are exact without QMC. Monomial and UT trails through a linear layer choose an active input for every active output,
+    they are OR and at-most-one constraints and not parity constraints, so no XOR clauses are needed.
+    As for __IDn, a wire in a key mask drops the implication against the direction of propagation: a key fed input may be
+    inactive when its entries are active, and a key fed output may be active without an active entry.
+    returns clauses, n_cvars
+    """
+    n, m = mat.shape[1], mat.shape[0]
+    edges = _edges(mat)
+    n_cvars = sum(max(0, len(row) - 1) for row in (np.flatnonzero(np.asarray(mat, dtype=np.uint8)[j]) for j in range(m))) if UT else 0
+    top = n + m + n_cvars
+    e = {}
+    for j, i in edges:
+        top += 1
+        e[(j, i)] = top
+    rows, columns = [[] for _ in range(m)], [[] for _ in range(n)]
+    for j, i in edges:
+        rows[j].append(e[(j, i)])
+        columns[i].append(e[(j, i)])
+    clauses = []
+    # COPY: an input is active iff it reaches an active XOR
+    for i in range(n):
+        if input_key_mask & (1 << i) == 0:
+            clauses += [(-x, i+1) for x in columns[i]]
+        clauses += [(-(i+1),) + tuple(columns[i])]
+    # XOR: an output is active iff one of its inputs is
+    for j in range(m):
+        clauses += [(-x, n+j+1) for x in rows[j]]
+        if output_key_mask & (1 << j) == 0:
+            clauses += [(-(n+j+1),) + tuple(rows[j])]
+    c = n + m
+    for j in range(m):
+        if not UT:
+            # at most one active input
+            clauses += [(-a, -b) for k, a in enumerate(rows[j]) for b in rows[j][k+1:]]
+            continue
+        # the weight of an XOR is the number of active inputs minus one, count var c is set for every active input after the first
+        # p is the OR of the inputs before it
+        p = None
+        for x in rows[j]:
+            if p is None:
+                p = x
+                continue
+            c += 1
+            top += 1
+            clauses += [(-c, x), (-c, p), (c, -x, -p)]
+            clauses += [(-top, p, x), (top, -p), (top, -x)]
+            p = top
+    return tuple(clauses), n_cvars
 
 class Linear(Component):
     def __init__(self, mat):
@@ -24,6 +78,12 @@ class Linear(Component):
             self.mat = convert_to_F2_matrix(mat)
         super().__init__(self.mat.shape[1], self.mat.shape[0])
 
+    def compute_parity_propagation_model(self, input_key_mask, output_key_mask):
+        return linear_propagation_model(self.mat, False, input_key_mask, output_key_mask)[0]
+
+    def compute_UT_propagation_model(self):
+        return linear_propagation_model(self.mat, True)
+
     def __call__(self, v, key=0):
         x = GF2([[(v >> i) & 1] for i in range(self.input_size)])
         y = matmul(self.mat, x)
@@ -0,0 +1,213 @@
+from .CompoundFunction import CompoundFunction, INPUT_ID, OUTPUT_ID, KEY_ID
+from .Components import Component, get_COPYn, get_XORn, Sink, ID
+from collections import Counter
+from time import time
+
+# Optimisation passes over the DAG of a CompoundFunction, applied before modelling.
+# Every pass preserves the function and the (u, v) semantics of the parity and UT models:
+# - the components of nested CompoundFunctions are their own models on the shared wires,
+# - ID, COPY1 and XOR1 are the identity in every model,
+# - an XOR (COPY) feeding an XOR (COPY) has exactly one intermediate mask for every transition of the fused XOR (COPY),
+#   with the same weight,
+# - the row v = 0 of every transition matrix is the unit vector u = 0, so a component of which all outputs go to a Sink
+#   is equivalent to Sinks on its inputs.
+
+class _Graph(object):
+    # nodes[key] = [f, sources], sources[i] is (source key, wire) with source key INPUT_ID, KEY_ID or a node key
+    # node keys are tuples, components of nested functions get the key of the nested function extended by their index
+    # such that sorting the keys gives an order of execution
+    # consumers[(source key, wire)] = (node key, input index), the output is the node OUTPUT_ID
+
+    def __init__(self, f):
+        self.input_size, self.output_size, self.n_key_bits = f.input_size, f.output_size, f.n_key_bits
+        self.nodes, self.consumers = {}, {}
+        wire = lambda c, w: (c if c in (INPUT_ID, KEY_ID) else (c,), w)
+        for i in range(1, f.n_components+1):
+            self.add((i,), f.components[i].f, [wire(c, w) for c, w in f.components[i].input_connections])
+        self.add(OUTPUT_ID, None, [wire(c, w) for c, w in f.components[OUTPUT_ID].input_connections])
+
+    def add(self, key, f, sources):
+        self.nodes[key] = [f, list(sources)]
+        for i, source in enumerate(sources):
+            self.consumers[source] = (key, i)
+
+    def remove(self, key):
+        f, sources = self.nodes.pop(key)
+        for i, source in enumerate(sources):
+            if self.consumers.get(source) == (key, i):
+                del self.consumers[source]
+        return f, sources
+
+    def rewire(self, old, new):
+        # the consumer of wire old reads wire new instead
+        key, i = self.consumers.pop(old)
+        self.nodes[key][1][i] = new
+        self.consumers[new] = (key, i)
+
+    def keys(self):
+        return sorted(key for key in self.nodes if key != OUTPUT_ID)
+
+    def to_compound(self):
+        g = CompoundFunction(self.input_size, self.output_size)
+        ids, key_wires = {}, []
+        def connect(source, to_component, to_wire):
+            if source[0] == KEY_ID:
+                key_wires.append((source[1], to_component, to_wire))
+            else:
+                g.connect_components(INPUT_ID if source[0] == INPUT_ID else ids[source[0]], source[1], to_component, to_wire)
+        for key in self.keys():
+            f, sources = self.nodes[key]
+            ids[key] = g.add_component(f)
+            for i, source in enumerate(sources):
+                connect(source, ids[key], i)
+        for i, source in enumerate(self.nodes[OUTPUT_ID][1]):
+            if source[0] in (INPUT_ID, KEY_ID):
+                # input and output vars of a model are distinct, wires from the input or the key to the output pass through an ID
+                idc = g.add_component(ID)
+                connect(source, idc, 0)
+                g.connect_components(idc, 0, OUTPUT_ID, i)
+            else:
+                g.connect_components(ids[source[0]], source[1], OUTPUT_ID, i)
+        # key bits are numbered in order of connection
+        for k, to_component, to_wire in sorted(key_wires):
+            g.connect_to_key(to_component, to_wire)
+        assert g.n_key_bits == self.n_key_bits
+        return g
+
+def _is_identity(f):
+    return type(f) is type(ID) or f is get_COPYn(1) or f is get_XORn(1)
+
+def _is_XOR(f):
+    return isinstance(f, Component) and f is get_XORn(f.input_size) and f.output_size == 1
+
+def _is_COPY(f):
+    return isinstance(f, Component) and f.input_size == 1 and f is get_COPYn(f.output_size)
+
+def _smaller(fused, *parts):
+    # fusing removes the intermediate wire, it is only done when the UT model does not get larger
+    return len(fused.get_UT_propagation_model()) <= sum(len(f.get_UT_propagation_model()) for f in parts)
+
+def flatten_compounds(graph, max_fan):
+    n = 0
+    for key in graph.keys():
+        if not isinstance(graph.nodes[key][0], CompoundFunction):
+            continue
+        f, sources = graph.remove(key)
+        wire = lambda c, w: sources[w] if c == INPUT_ID else (key + (c,), w)
+        for i in range(1, f.n_components+1):
+            graph.add(key + (i,), f.components[i].f, [wire(c, w) for c, w in f.components[i].input_connections])
+        for w, (c, v) in enumerate(f.components[OUTPUT_ID].input_connections):
+            graph.rewire((key, w), wire(c, v))
+        n += 1
+    return n
+
+def remove_identities(graph, max_fan):
+    n = 0
+    for key in graph.keys():
+        if _is_identity(graph.nodes[key][0]):
+            f, sources = graph.remove(key)
+            for w in range(f.output_size):
+                graph.rewire((key, w), sources[w])
+            n += 1
+    return n
+
+def fuse_XORs(graph, max_fan):
+    # an XOR feeding an XOR is merged into the latter
+    n = 0
+    for key in graph.keys():
+        if key not in graph.nodes or not _is_XOR(graph.nodes[key][0]):
+            continue
+        sources = graph.nodes[key][1]
+        for i, (c, w) in enumerate(sources):
+            if c not in graph.nodes or not _is_XOR(graph.nodes[c][0]) or len(sources) + graph.nodes[c][0].input_size - 1 > max_fan:
+                continue
+            fused = get_XORn(len(sources) + graph.nodes[c][0].input_size - 1)
+            if _smaller(fused, graph.nodes[key][0], graph.nodes[c][0]):
+                _, upstream = graph.remove(c)
+                graph.remove(key)
+                graph.add(key, fused, sources[:i] + upstream + sources[i+1:])
+                n += 1
+                break
+    return n
+
+def fuse_COPYs(graph, max_fan):
+    # a COPY feeding a COPY is merged into the former
+    n = 0
+    for key in graph.keys():
+        if key not in graph.nodes or not _is_COPY(graph.nodes[key][0]):
+            continue
+        f = graph.nodes[key][0]
+        for w in range(f.output_size):
+            c, _ = graph.consumers[(key, w)]
+            if c not in graph.nodes or not _is_COPY(graph.nodes[c][0]) or f.output_size + graph.nodes[c][0].output_size - 1 > max_fan:
+                continue
+            g = graph.nodes[c][0]
+            if _smaller(get_COPYn(f.output_size + g.output_size - 1), f, g):
+                graph.remove(c)
+                outputs = [(key, v) for v in range(f.output_size) if v != w] + [(c, v) for v in range(g.output_size)]
+                consumers = [graph.consumers.pop(o) for o in outputs]
+                graph.nodes[key][0] = get_COPYn(len(outputs))
+                for v, (d, i) in enumerate(consumers):
+                    graph.nodes[d][1][i] = (key, v)
+                    graph.consumers[(key, v)] = (d, i)
+                n += 1
+                break
+    return n
+
+def remove_dead_components(graph, max_fan):
+    # components of which all outputs go to a Sink are replaced by Sinks on their inputs
+    n = 0
+    for key in graph.keys()[::-1]:
+        f = graph.nodes[key][0]
+        if f is Sink or f.output_size == 0:
+            continue
+        sinks = [graph.consumers[(key, w)][0] for w in range(f.output_size)]
+        if all(s != OUTPUT_ID and graph.nodes[s][0] is Sink for s in sinks):
+            for s in sinks:
+                graph.remove(s)
+            _, sources = graph.remove(key)
+            for i, source in enumerate(sources):
+                graph.add(key + (0, i), Sink, [source])
+            n += 1
+    return n
+
+PASSES = {"flatten": flatten_compounds, "identities": remove_identities, "XOR": fuse_XORs, "COPY": fuse_COPYs, "dead": remove_dead_components}
+
+def function_statistics(f):
+    # number of components by name, variables and clauses of the UT model, nested functions are counted by their components
+    components, n_vars, n_clauses = Counter(), f.input_size + f.n_key_bits, 0
+    for i in range(1, f.n_components+1):
+        c = f.components[i].f
+        if isinstance(c, CompoundFunction):
+            s = function_statistics(c)
+            components.update(s["components"])
+            n_vars += s["vars"] - c.input_size
+            n_clauses += s["clauses"]
+        else:
+            components[type(c).__name__.strip("_")] += 1
+            n_vars += c.output_size + c.get_n_cvars()
+            n_clauses += len(c.get_UT_propagation_model())
+    return {"components": components, "vars": n_vars, "clauses": n_clauses}
+
+def optimise_compound_function(f, passes = tuple(PASSES), max_fan = 8, debug = False):
+    """
+    f: a CompoundFunction
+    passes: names of the passes in PASSES, applied in order until none of them changes the function
+    max_fan: fused XORs and COPYs have at most this many inputs and outputs (their models grow exponentially)
+    returns an equivalent CompoundFunction with the same input, output and key bits and statistics
+    """
+    stime = time()
+    graph = _Graph(f)
+    rewrites = Counter()
+    changed = True
+    while changed:
+        changed = False
+        for p in passes:
+            n = PASSES[p](graph, max_fan)
+            rewrites[p] += n
+            changed |= n > 0
+    g = graph.to_compound()
+    statistics = {"before": function_statistics(f), "after": function_statistics(g), "rewrites": rewrites}
+    if debug:
+        print(f"debug: optimisation took {time() - stime} seconds, {statistics}")
+    return g, statistics
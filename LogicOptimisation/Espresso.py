@@ -0,0 +1,120 @@
+from math import log2
+from time import time
+from .QMC import implicant_to_clause
+import numpy as np
+
+# Heuristic CNF minimisation in the style of Espresso (expand, irredundant, reduce), for truth tables that are too large for QMC.
+# Cubes are pairs (a, u) with a & u == 0 for the subcube a + span(u), as the implicants in QMC. A cube is valid when it contains
+# no one of the truth table, the cover has to contain every zero that is not a don't care.
+# Memory is linear in the size of the truth table. Expanding a cube only looks at the ones, not at the points of the cube.
+
+def _points(a, u):
+    res = np.array([a], dtype=np.int64)
+    while u != 0:
+        b = u & -u
+        res = np.concatenate((res, res | b))
+        u ^= b
+    return res
+
+def _expand(a, u, ones, n):
+    # a one p is outside the cube iff (p ^ a) & ~u != 0, a bit is blocked when raising it would make this zero for some p
+    # of the free bits, the one is raised that blocks the fewest further bits, such that the prime gets as large as possible
+    D = ones ^ a
+    candidates = [1 << i for i in range(n) if not (u >> i) & 1]
+    while len(candidates) > 0:
+        R = D & ~u
+        single = R[(R & (R - 1)) == 0]
+        blocked = int(np.bitwise_or.reduce(single)) if len(single) > 0 else 0
+        candidates = [b for b in candidates if not blocked & b]
+        if len(candidates) == 0:
+            break
+        # blocked bits are never raised, the ones outside the cube in such a bit can not block any other bit
+        D = D[(R & blocked) == 0]
+        R = D & ~u
+        R1 = R & (R - 1)
+        pairs = R[(R1 != 0) & ((R1 & (R1 - 1)) == 0)]
+        b = min(candidates, key=lambda b: np.count_nonzero(pairs & b))
+        u |= b
+        a &= ~b
+        candidates.remove(b)
+    return a, u
+
+def _next_uncovered(care, count, start, chunk = 2**16):
+    for i in range(start, len(care), chunk):
+        nz = np.flatnonzero(care[i:i+chunk] & (count[i:i+chunk] == 0))
+        if len(nz) > 0:
+            return i + int(nz[0])
+    return None
+
+def _irredundant(cubes, care, count):
+    # small cubes first, a cube is removed when all its zeros are covered by another cube
+    res = []
+    for a, u in sorted(cubes, key=lambda c: c[1].bit_count()):
+        points = _points(a, u)
+        covered = count[points[care[points]]]
+        if len(covered) == 0 or covered.min() >= 2:
+            count[points] -= 1
+        else:
+            res.append((a, u))
+    return res
+
+def _reduce(cubes, care, count):
+    # large cubes first, a cube is replaced by the smallest cube containing the zeros only it covers
+    res = []
+    for a, u in sorted(cubes, key=lambda c: -c[1].bit_count()):
+        points = _points(a, u)
+        own = points[care[points] & (count[points] == 1)]
+        count[points] -= 1
+        if len(own) > 0:
+            a, u = int(np.bitwise_and.reduce(own)), int(np.bitwise_and.reduce(own) ^ np.bitwise_or.reduce(own))
+            count[_points(a, u)] += 1
+            res.append((a, u))
+    return res
+
+def _cost(cubes, n):
+    return (len(cubes), sum(n - u.bit_count() for _, u in cubes))
+
+def espresso_optimise_CNF(truth_table, dont_care, max_iterations=8, max_time=60):
+    # expected that truth_table is zero where dont_care is one
+    # returns a CNF that is exact outside of dont_care, every clause is a prime implicant of ~F but the cover is not necessarily minimal
+    # when max_time runs out before the initial cover is complete, the zeros that are left get a clause of their own (not a prime)
+    stime = time()
+    n = int(log2(truth_table.size()))
+    on = truth_table.to_bools()
+    care = ~(on | dont_care.to_bools())
+    ones = np.flatnonzero(on)
+    # count[v] is the number of cubes containing v
+    count = np.zeros(len(on), dtype=np.int32)
+    # initial cover, the first zero that is not covered yet is expanded to a prime
+    cubes = []
+    v = _next_uncovered(care, count, 0)
+    while v is not None:
+        if time() - stime > max_time:
+            # out of time, the zeros that are left are covered by their minterms such that the CNF stays exact
+            rest = np.flatnonzero(care & (count == 0))
+            count[rest] += 1
+            cubes += [(int(x), 0) for x in rest]
+            return [implicant_to_clause(a, u, n) for a, u in sorted(cubes)]
+        a, u = _expand(v, 0, ones, n)
+        count[_points(a, u)] += 1
+        cubes.append((a, u))
+        v = _next_uncovered(care, count, v)
+    if time() - stime > max_time:
+        return [implicant_to_clause(a, u, n) for a, u in sorted(cubes)]
+    cubes = _irredundant(cubes, care, count)
+    best = cubes
+    for _ in range(max_iterations):
+        if time() - stime > max_time:
+            break
+        cubes = _reduce(cubes, care, count)
+        expanded = []
+        for a, u in cubes:
+            count[_points(a, u)] -= 1
+            a, u = _expand(a, u, ones, n)
+            count[_points(a, u)] += 1
+            expanded.append((a, u))
+        cubes = _irredundant(expanded, care, count)
+        if _cost(cubes, n) >= _cost(best, n):
+            break
+        best = cubes
+    return [implicant_to_clause(a, u, n) for a, u in sorted(best)]
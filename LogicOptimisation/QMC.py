@@ -1,84 +1,156 @@
 from math import log2
 from bitarrays.bitset import BitSet
 from ortools.sat.python import cp_model
-from multiprocessing import Pool, Manager
-from functools import partial
+from Modelling.Executor import budget, get_thread_pool
+from functools import partial, reduce
+from collections import defaultdict
+from heapq import heapify, heappop, heappush
 
-QMC_THREADS = 32
-def __f(truth_table, S, a):
-    if not BitSet.test(truth_table, a):
-        # X = ~(a + P)
-        X = BitSet(truth_table)
-        X.swap(a)
-        # X = ~upperclosure(X)
-        X.ORup()
-        X.flip()
-        # X = maxset(X)
-        X.ORdown()
-        X.MOREdown()
-        for u in X:
-            if (u & a) == 0:
-                S.append((a, u))
+def __f(truth_table, chunk):
+    # the prime implicants for a in one chunk, computed natively without the GIL
+    return truth_table.prime_implicants_complement(*chunk)
 
-def DNF_prime_implicants_complement(truth_table, threads=QMC_THREADS):
+def DNF_prime_implicants_complement(truth_table, threads=None):
+    # the workers are threads, such that the truth table is shared and only the batches of (a, u) pairs are returned
+    # threads is capped by the worker budget (see Modelling.Executor), None uses all of it
+    threads = budget(threads)
+    n = truth_table.size()
+    step = max(1, n // (16*threads))
+    chunks = [(a, min(a + step, n)) for a in range(0, n, step)]
     if threads > 1:
-        with Manager() as manager:
-            S = manager.list()
-            with Pool(threads) as pool:
-                for _ in pool.imap_unordered(partial(__f, truth_table, S), range(truth_table.size()), 4*QMC_THREADS):
-                    pass
-            S = list(S)
-    else:
         S = []
-        for a in range(truth_table.size()):
-            __f(truth_table, S, a)
+        for batch in get_thread_pool(threads).imap(partial(__f, truth_table), chunks):
+            S += batch
+    else:
+        S = __f(truth_table, (0, n))
     return S
 
-def __g(S, variables, v):
-    constraint_vars = list()
-    for i in range(len(S)):
-        if (((S[i][0] ^ v) & (~S[i][1])) == 0):
-            constraint_vars.append(variables[i])
-    return tuple(constraint_vars)
+def _coverage(S, points):
+    # for every point that has to be covered, the implicants whose subcube a + span(u) contains it
+    # a single subcube is materialised at a time
+    rows = defaultdict(list)
+    for i, (a, u) in enumerate(S):
+        c = BitSet(points.size())
+        c.set(a)
+        c.ORup(u)
+        c &= points
+        for v in c:
+            rows[v].append(i)
+    return rows
+
+def _reduce_cover(rows):
+    # rows are the sets of implicants covering each point
+    # returns the essential implicants and the remaining rows, without dominated rows and columns
+    essential = set()
+    rows = set(rows)
+    changed = True
+    while changed and len(rows) > 0:
+        # an implicant that is the only one covering a point is in every cover
+        ess = set(i for r in rows if len(r) == 1 for i in r)
+        essential |= ess
+        rows = set(r for r in rows if r.isdisjoint(ess))
+        # a row that contains another row is covered whenever the latter is
+        occ = defaultdict(set)
+        for r in rows:
+            for i in r:
+                occ[i].add(r)
+        for r in sorted(rows, key=len):
+            if r not in rows:
+                continue
+            i = min(r, key=lambda i: len(occ[i]))
+            for s in tuple(occ[i]):
+                if s != r and r < s:
+                    rows.discard(s)
+                    for j in s:
+                        occ[j].discard(s)
+        # a column that covers a subset of the rows of another column is not needed, of equal columns the first is kept
+        dominated = set()
+        for i in sorted(occ):
+            if len(occ[i]) == 0:
+                continue
+            candidates = reduce(frozenset.intersection, occ[i])
+            if any(len(occ[j]) > len(occ[i]) or (len(occ[j]) == len(occ[i]) and j < i) for j in candidates if j != i):
+                dominated.add(i)
+        changed = len(ess) > 0 or len(dominated) > 0
+        rows = set(r - dominated for r in rows)
+    return essential, sorted(rows, key=sorted)
+
+def _greedy_cover(rows):
+    # upper bound, repeatedly the implicant covering most of the remaining rows (lazily updated)
+    occ = defaultdict(set)
+    for k, r in enumerate(rows):
+        for i in r:
+            occ[i].add(k)
+    heap = [(-len(ks), i) for i, ks in occ.items()]
+    heapify(heap)
+    uncovered = set(range(len(rows)))
+    res = []
+    while len(uncovered) > 0:
+        n, i = heappop(heap)
+        m = len(occ[i] & uncovered)
+        if m < -n:
+            heappush(heap, (-m, i))
+            continue
+        res.append(i)
+        uncovered -= occ[i]
+    return res
+
+def _disjoint_rows(rows):
+    # lower bound, rows without common implicants each need a different implicant
+    used = set()
+    n = 0
+    for r in sorted(rows, key=len):
+        if used.isdisjoint(r):
+            used |= r
+            n += 1
+    return n
 
-def QMC_optimise_CNF(truth_table, dont_care, max_search_time=60, threads=QMC_THREADS):
+def implicant_to_clause(a, u, n):
+    # the clause that is false exactly on the subcube a + span(u), variables are numbered from 1 by bit
+    clause = []
+    for j in range(n):
+        if (u & 1) == 0:
+            clause.append((1 - 2 * (a & 1)) * (j + 1))
+        a >>= 1
+        u >>= 1
+    return clause
+
+def QMC_optimise_CNF(truth_table, dont_care, max_search_time=60, threads=None):
     # expected that truth_table is zero where dont_care is one
     # generate prime implicants (for DNF of ~F) (as per Boura and Coggia 2020 and Udovenko 2021)
     S = DNF_prime_implicants_complement(truth_table, threads)
-    # model set cover problem as CP-SAT
-    model = cp_model.CpModel()
-    # generate variables
-    variables = []
-    for i in range(len(S)):
-        variables.append(model.NewBoolVar(f"x{i}"))
-    # generate constraints
-    if threads > 1:
-        with Pool(threads) as pool:
-            for constraint_vars in pool.imap_unordered(partial(__g, S, variables), filter(lambda v: (not truth_table.test(v) and not dont_care.test(v)),  range(truth_table.size())), 4*QMC_THREADS):
-                model.AddAtLeastOne(constraint_vars)
-    else:
-        for constraint_vars in map(partial(__g, S, variables), filter(lambda v: (not truth_table.test(v) and not dont_care.test(v)),  range(truth_table.size()))):
-                model.AddAtLeastOne(constraint_vars)
-    model.Minimize(sum(variables))
-    
-    # solve problem
-    solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = max_search_time
-    solver.parameters.num_search_workers = threads 
-    status = solver.Solve(model)
-    res = []
-    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-        for i in range(len(S)):
-            if (solver.Value(variables[i])):
-                a = S[i][0]
-                u = S[i][1]
-                clause = []
-                for j in range(int(log2(truth_table.size()))):
-                    if (u & 1) == 0:
-                        clause.append((1 - 2 * (a & 1)) * (j + 1))
-                    a >>= 1
-                    u >>= 1
-                res.append(clause)
-    else:
-        res.append([])
-    return res
\ No newline at end of file
+    # the points that have to be covered are the zeros of F
+    points = BitSet(truth_table)
+    points |= dont_care
+    points.flip()
+    essential, rows = _reduce_cover(frozenset(r) for r in _coverage(S, points).values())
+    selected = sorted(essential)
+    if len(rows) > 0:
+        greedy = _greedy_cover(rows)
+        lower_bound = _disjoint_rows(rows)
+        if lower_bound < len(greedy):
+            # model set cover problem as CP-SAT, on the remaining implicants only
+            columns = sorted(set(i for r in rows for i in r))
+            model = cp_model.CpModel()
+            variables = {i: model.NewBoolVar(f"x{i}") for i in columns}
+            for r in rows:
+                model.AddBoolOr([variables[i] for i in r])
+            model.Add(sum(variables.values()) <= len(greedy))
+            model.Add(sum(variables.values()) >= lower_bound)
+            hint = set(greedy)
+            for i in columns:
+                model.AddHint(variables[i], i in hint)
+            model.Minimize(sum(variables.values()))
+
+            # solve problem
+            solver = cp_model.CpSolver()
+            solver.parameters.max_time_in_seconds = max_search_time
+            solver.parameters.num_search_workers = budget(threads)
+            # core based search proves the lower bound of the cover quickly, also with few workers
+            solver.parameters.optimize_with_core = True
+            status = solver.Solve(model)
+            if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+                greedy = [i for i in columns if solver.Value(variables[i])]
+        selected = sorted(selected + greedy)
+    n = int(log2(truth_table.size()))
+    return [implicant_to_clause(*S[i], n) for i in selected]
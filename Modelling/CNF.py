@@ -0,0 +1,259 @@
+from pysat.formula import IDPool
+import numpy as np
+
+class CNF(object):
+    """
+    Clauses stored as a single flat int32 literal buffer with clause offsets.
+    Appending is amortised O(1), slicing returns a view on the same buffers and the largest variable is cached.
+    Iterating gives tuples of ints, such that a CNF can be used wherever a tuple of clauses is expected (e.g. bootstrap_with).
+    Views are copied on the first append, adding two CNFs gives a new CNF as for tuples.
+    A CNF loaded with DIMACS.load_cnf (and its slices) is memory mapped and pickled as a reference to its file.
+    """
+
+    # (path, index of the first clause in the file, stamp of the file (see load_cnf)) for memory mapped clauses
+    source = None
+
+    def __init__(self, clauses = ()):
+        self.lits = np.empty(16, dtype=np.int32)
+        self.offsets = np.zeros(17, dtype=np.int64)
+        self.n_clauses = 0
+        self.__nv = 0
+        self.__owner = True
+        self.extend(clauses)
+
+    @staticmethod
+    def from_buffers(lits, offsets, nv = None, owner = False):
+        # clause i is lits[offsets[i]:offsets[i+1]], the buffers are shared and not copied unless owner is set
+        res = CNF.__new__(CNF)
+        res.lits, res.offsets = lits, offsets
+        res.n_clauses = len(offsets) - 1
+        res.__nv = nv
+        res.__owner = owner
+        return res
+
+    @property
+    def nv(self):
+        if self.__nv is None:
+            lits = self.literals()
+            self.__nv = int(np.abs(lits).max()) if len(lits) > 0 else 0
+        return self.__nv
+
+    def literals(self):
+        # all literals of all clauses as a single array
+        return self.lits[self.offsets[0]:self.offsets[self.n_clauses]]
+
+    def clause_lengths(self):
+        return np.diff(self.offsets[:self.n_clauses+1])
+
+    def vars(self):
+        return set(np.unique(np.abs(self.literals())).tolist())
+
+    def __reserve(self, n_clauses, n_lits):
+        if not self.__owner:
+            # copy on write, views never modify the shared buffers
+            self.source = None
+            self.lits = self.literals().copy()
+            self.offsets = self.offsets[:self.n_clauses+1] - self.offsets[0]
+            self.__owner = True
+        if self.n_clauses + n_clauses + 1 > len(self.offsets):
+            self.offsets = np.resize(self.offsets, max(2*len(self.offsets), self.n_clauses + n_clauses + 1))
+        end = self.offsets[self.n_clauses] + n_lits
+        if end > len(self.lits):
+            self.lits = np.resize(self.lits, max(2*len(self.lits), end))
+
+    def append(self, clause):
+        clause = tuple(clause)
+        self.__reserve(1, len(clause))
+        start = self.offsets[self.n_clauses]
+        self.lits[start:start+len(clause)] = clause
+        self.offsets[self.n_clauses+1] = start + len(clause)
+        self.n_clauses += 1
+        if len(clause) > 0 and self.__nv is not None:
+            self.__nv = max(self.__nv, max(map(abs, clause)))
+
+    def extend(self, clauses):
+        if isinstance(clauses, CNF):
+            lits, lengths = clauses.literals(), clauses.clause_lengths()
+            self.__reserve(len(lengths), len(lits))
+            start = self.offsets[self.n_clauses]
+            self.lits[start:start+len(lits)] = lits
+            self.offsets[self.n_clauses+1:self.n_clauses+1+len(lengths)] = start + np.cumsum(lengths)
+            self.n_clauses += len(lengths)
+            if self.__nv is not None:
+                self.__nv = max(self.__nv, clauses.nv)
+        else:
+            for clause in clauses:
+                self.append(clause)
+
+    def relabel(self, vs):
+        # variable x becomes vs[x], as a single gather over a signed lookup table
+        vs = np.asarray(vs, dtype=np.int32)
+        table = np.concatenate((-vs[:0:-1], vs))
+        return CNF.from_buffers(table[self.literals() + (len(vs) - 1)], self.offsets[:self.n_clauses+1] - self.offsets[0], owner=True)
+
+    def copy(self):
+        res = CNF()
+        res.extend(self)
+        return res
+
+    def __add__(self, other):
+        res = self.copy()
+        res.extend(other)
+        return res
+
+    def __radd__(self, other):
+        res = CNF(other)
+        res.extend(self)
+        return res
+
+    def __len__(self):
+        return self.n_clauses
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self.n_clauses)
+            if step != 1:
+                return CNF(self[j] for j in range(start, stop, step))
+            stop = max(start, stop)
+            res = CNF.from_buffers(self.lits, self.offsets[start:stop+1])
+            if self.source is not None:
+                res.source = (self.source[0], self.source[1] + start, self.source[2])
+            return res
+        if i < 0:
+            i += self.n_clauses
+        if not 0 <= i < self.n_clauses:
+            raise IndexError("clause index out of range")
+        return tuple(self.lits[self.offsets[i]:self.offsets[i+1]].tolist())
+
+    def __iter__(self):
+        lits = self.literals().tolist()
+        offsets = (self.offsets[:self.n_clauses+1] - self.offsets[0]).tolist()
+        for i in range(self.n_clauses):
+            yield tuple(lits[offsets[i]:offsets[i+1]])
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(a == tuple(b) for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f"CNF({tuple(self)})"
+
+    def __getstate__(self):
+        if self.source is not None:
+            # memory mapped clauses are mapped again by the receiving process, which fails if the file has changed
+            return ("mmap", self.source, self.n_clauses)
+        # only the used part of the buffers is pickled
+        return self.literals().copy(), self.offsets[:self.n_clauses+1] - self.offsets[0], self.__nv
+
+    def __setstate__(self, state):
+        if isinstance(state[0], str):
+            from .DIMACS import load_cnf
+            (path, first, stamp), n_clauses = state[1], state[2]
+            mapped = load_cnf(path, stamp)[first:first+n_clauses]
+            self.lits, self.offsets, self.n_clauses, self.source = mapped.lits, mapped.offsets, mapped.n_clauses, mapped.source
+            self.__nv, self.__owner = None, False
+            return
+        self.lits, self.offsets, self.__nv = state
+        self.n_clauses = len(self.offsets) - 1
+        self.__owner = True
+
+def as_cnf(clauses):
+    # clauses that are already a CNF are not copied
+    if isinstance(clauses, CNF):
+        return clauses
+    if isinstance(clauses, InstancedCNF):
+        return clauses.materialise()
+    return CNF(clauses)
+
+class VarPool(IDPool):
+    """
+    An IDPool without occupied ranges, the variables it gives out are consecutive such that new_vars can take them in bulk.
+    """
+
+    def __init__(self, start_from = 1):
+        super().__init__(start_from=start_from)
+
+    def occupy(self, start, stop):
+        raise ValueError("a VarPool has no occupied ranges, use an IDPool")
+
+def new_vars(pool, n):
+    # n fresh variables from a pool, in the same order as n calls to pool.id()
+    if type(pool) is not VarPool:
+        return np.fromiter((pool.id() for _ in range(n)), dtype=np.int32, count=n)
+    res = np.arange(pool.top + 1, pool.top + n + 1, dtype=np.int32)
+    pool.top += n
+    return res
+
+class InstancedCNF(object):
+    """
+    A CNF given as instances of template CNFs, instance i consists of the clauses of its template with variable x replaced by its map[x].
+    Every distinct template is stored once, relabeling composes the variable maps without touching the clauses.
+    Clauses are only materialised on request (materialise gives a CNF), iterating streams them instance by instance.
+    """
+
+    def __init__(self):
+        self.templates = []
+        self.template_index = {}
+        self.instances = []
+
+    def __template(self, template):
+        # templates are identified by object, such that an instance record is a template index and a variable map
+        if id(template) not in self.template_index:
+            self.template_index[id(template)] = len(self.templates)
+            self.templates.append((template, np.array(sorted(template.vars()), dtype=np.int64)))
+        return self.template_index[id(template)]
+
+    def add(self, template, vs):
+        self.instances.append((self.__template(template), np.asarray(vs, dtype=np.int32)))
+
+    def extend(self, other):
+        if isinstance(other, InstancedCNF):
+            for t, vs in other.instances:
+                self.instances.append((self.__template(other.templates[t][0]), vs))
+        else:
+            other = as_cnf(other)
+            self.add(other, np.arange(other.nv + 1, dtype=np.int32))
+
+    def relabel(self, vs):
+        vs = np.asarray(vs, dtype=np.int32)
+        res = InstancedCNF()
+        res.templates, res.template_index = list(self.templates), self.template_index.copy()
+        res.instances = [(t, vs[m]) for t, m in self.instances]
+        return res
+
+    @property
+    def nv(self):
+        return max((int(m[self.templates[t][1]].max()) for t, m in self.instances if len(self.templates[t][1]) > 0), default=0)
+
+    def __len__(self):
+        return sum(len(self.templates[t][0]) for t, _ in self.instances)
+
+    def __iter__(self):
+        for t, m in self.instances:
+            yield from self.templates[t][0].relabel(m)
+
+    def materialise(self):
+        # one gather per group of instances with the same template, written in place such that the clause order is kept
+        n_lits = np.array([len(self.templates[t][0].literals()) for t, _ in self.instances], dtype=np.int64)
+        n_clauses = np.array([len(self.templates[t][0]) for t, _ in self.instances], dtype=np.int64)
+        lit_starts = np.concatenate(([0], np.cumsum(n_lits)))
+        clause_starts = np.concatenate(([0], np.cumsum(n_clauses)))
+        lits = np.empty(lit_starts[-1], dtype=np.int32)
+        offsets = np.zeros(clause_starts[-1] + 1, dtype=np.int64)
+        groups = {}
+        for i, (t, m) in enumerate(self.instances):
+            groups.setdefault((t, len(m)), []).append(i)
+        for (t, n), idx in groups.items():
+            template = self.templates[t][0]
+            if len(template) == 0:
+                continue
+            idx = np.array(idx)
+            maps = np.stack([self.instances[i][1] for i in idx])
+            tables = np.concatenate((-maps[:, :0:-1], maps), axis=1)
+            template_lits = template.literals()
+            lits[lit_starts[idx][:, None] + np.arange(len(template_lits))] = tables[:, template_lits + (n - 1)]
+            template_offsets = template.offsets[1:template.n_clauses+1] - template.offsets[0]
+            offsets[clause_starts[idx][:, None] + np.arange(1, len(template) + 1)] = lit_starts[idx][:, None] + template_offsets
+        return CNF.from_buffers(lits, offsets, owner=True)
@@ -0,0 +1,193 @@
+from .Counting import _simplify, _clause_vars, _components, _satisfiable, _run
+from nnf import And, Or, Var, true, false
+from math import inf
+from collections import OrderedDict
+from hashlib import sha256
+import pickle
+
+FALSE, TRUE, LIT, FREE, AND, OR = range(6)
+
+class CompiledModel(object):
+    """
+    Decision-DNNF of a CNF, projected on a set of variables (all variables in the clauses by default).
+    Nodes are stored children first, such that every query is a single linear pass over the node list.
+    Queries condition on assumptions over projected variables.
+    Assumptions given at compile time hold for all queries and usually give a much smaller diagram.
+    """
+
+    def __init__(self, clauses, projected_vars = None, assumptions = []):
+        clauses = tuple(tuple(clause) for clause in clauses)
+        if projected_vars is None:
+            self.projected_vars = frozenset(_clause_vars(clauses))
+        else:
+            self.projected_vars = frozenset(projected_vars)
+        self.nodes = [(FALSE,), (TRUE,)]
+        self.__unique = {}
+        self.__cache = {}
+        residual, assigned = _simplify(clauses, assumptions)
+        if residual is None:
+            self.root = FALSE
+        else:
+            self.root = _run(self.__compile(residual, self.projected_vars, assigned))
+        del self.__unique, self.__cache
+
+    def __node(self, node):
+        if node not in self.__unique:
+            self.__unique[node] = len(self.nodes)
+            self.nodes.append(node)
+        return self.__unique[node]
+
+    def __and(self, children):
+        if FALSE in children:
+            return FALSE
+        children = tuple(sorted(set(c for c in children if c != TRUE)))
+        if len(children) == 0:
+            return TRUE
+        if len(children) == 1:
+            return children[0]
+        return self.__node((AND, children))
+
+    def __compile(self, clauses, scope, assigned):
+        remaining = _clause_vars(clauses)
+        assigned_vars = set(abs(x) for x in assigned)
+        children = [self.__node((LIT, x)) for x in assigned if abs(x) in scope]
+        children += [self.__node((FREE, x)) for x in scope if x not in remaining and x not in assigned_vars]
+        for component in _components(clauses):
+            c = yield self.__compile_component(tuple(component))
+            if c == FALSE:
+                return FALSE
+            children.append(c)
+        return self.__and(children)
+
+    def __compile_component(self, clauses):
+        key = frozenset(clauses)
+        if key in self.__cache:
+            return self.__cache[key]
+        occurrences = {}
+        for clause in clauses:
+            for x in clause:
+                if abs(x) in self.projected_vars:
+                    occurrences[abs(x)] = occurrences.get(abs(x), 0) + 1
+        if len(occurrences) == 0:
+            res = TRUE if _satisfiable(clauses) else FALSE
+        else:
+            x = max(occurrences, key=occurrences.get)
+            scope = frozenset(occurrences.keys())
+            branches = []
+            for l in (x, -x):
+                residual, assigned = _simplify(clauses, (l,))
+                branches.append(FALSE if residual is None else (yield self.__compile(residual, scope, assigned)))
+            if branches[0] == FALSE:
+                res = branches[1]
+            elif branches[1] == FALSE:
+                res = branches[0]
+            else:
+                res = self.__node((OR, x, branches[0], branches[1]))
+        self.__cache[key] = res
+        return res
+
+    def size(self):
+        return len(self.nodes)
+
+    def evaluate(self, add, mul, zero, one, literal_weight):
+        # algebraic model counting, literal_weight maps a literal to its weight
+        values = [zero, one]
+        for node in self.nodes[2:]:
+            if node[0] == LIT:
+                values.append(literal_weight(node[1]))
+            elif node[0] == FREE:
+                values.append(add(literal_weight(node[1]), literal_weight(-node[1])))
+            elif node[0] == AND:
+                r = one
+                for c in node[1]:
+                    r = mul(r, values[c])
+                values.append(r)
+            else:
+                values.append(add(values[node[2]], values[node[3]]))
+        return values[self.root]
+
+    def count(self, assumptions = [], modulus = None):
+        assumptions = set(assumptions)
+        if modulus is None:
+            return self.evaluate(int.__add__, int.__mul__, 0, 1, lambda x: 0 if -x in assumptions else 1)
+        return self.evaluate(lambda a, b: (a + b) % modulus, lambda a, b: (a * b) % modulus, 0, 1 % modulus, lambda x: 0 if -x in assumptions else 1)
+
+    def exists(self, assumptions = []):
+        assumptions = set(assumptions)
+        return self.evaluate(bool.__or__, bool.__and__, False, True, lambda x: -x not in assumptions)
+
+    def min_weight(self, weighted_vars, assumptions = []):
+        # minimum number of true weighted variables over all models, inf if there are none
+        assumptions, weighted_vars = set(assumptions), set(weighted_vars)
+        def weight(x):
+            if -x in assumptions:
+                return inf
+            return 1 if x in weighted_vars else 0
+        return self.evaluate(min, lambda a, b: a + b, inf, 0, weight)
+
+    def weight_distribution(self, weighted_vars, assumptions = [], max_weight = None, modulus = None):
+        # res[w] is the number of models with exactly w true weighted variables
+        assumptions, weighted_vars = set(assumptions), set(weighted_vars)
+        def reduce(p):
+            if max_weight is not None:
+                p = p[:max_weight+1]
+            if modulus is not None:
+                p = [c % modulus for c in p]
+            while len(p) > 0 and p[-1] == 0:
+                p = p[:-1]
+            return tuple(p)
+        def add(a, b):
+            if len(a) < len(b):
+                a, b = b, a
+            return reduce([x + y for x, y in zip(a, b)] + list(a[len(b):]))
+        def mul(a, b):
+            if len(a) == 0 or len(b) == 0:
+                return tuple()
+            res = [0]*(len(a) + len(b) - 1)
+            for i, x in enumerate(a):
+                if x != 0:
+                    for j, y in enumerate(b):
+                        res[i+j] += x*y
+            return reduce(res)
+        def weight(x):
+            if -x in assumptions:
+                return tuple()
+            return (0, 1) if x in weighted_vars else (1,)
+        return list(self.evaluate(add, mul, tuple(), (1,), weight))
+
+    def to_nnf(self):
+        values = [false, true]
+        for node in self.nodes[2:]:
+            if node[0] == LIT:
+                values.append(Var(node[1]) if node[1] > 0 else ~Var(-node[1]))
+            elif node[0] == FREE:
+                values.append(Or([Var(node[1]), ~Var(node[1])]))
+            elif node[0] == AND:
+                values.append(And([values[c] for c in node[1]]))
+            else:
+                values.append(Or([values[node[2]], values[node[3]]]))
+        return values[self.root]
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+# the most recently used compiled models, keyed by a digest of the model such that the key does not hold a copy of the clauses
+_compiled_models = OrderedDict()
+_N_COMPILED_MODELS = 4
+def get_compiled_model(clauses, projected_vars = None, assumptions = []):
+    # compiled models are cached for the last few models, callers that query a model repeatedly should keep it
+    clauses = tuple(tuple(clause) for clause in clauses)
+    key = sha256(repr((clauses, None if projected_vars is None else sorted(projected_vars), sorted(assumptions))).encode()).digest()
+    if key in _compiled_models:
+        _compiled_models.move_to_end(key)
+    else:
+        _compiled_models[key] = CompiledModel(clauses, projected_vars, assumptions)
+        if len(_compiled_models) > _N_COMPILED_MODELS:
+            _compiled_models.popitem(last=False)
+    return _compiled_models[key]
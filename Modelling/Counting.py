@@ -0,0 +1,131 @@
+from pysat.solvers import Glucose42 as Solver
+
+def _simplify(clauses, literals):
+    # unit propagation, returns None on conflict
+    # clauses are only visited through the occurrence lists of the literals that become false
+    assigned = set(literals)
+    if any(-x in assigned for x in assigned):
+        return None, assigned
+    occurrences = {}
+    for i, clause in enumerate(clauses):
+        for x in clause:
+            occurrences.setdefault(x, []).append(i)
+    units = list(assigned)
+    while len(units) > 0:
+        l = units.pop()
+        for i in occurrences.get(-l, ()):
+            clause = clauses[i]
+            if any(x in assigned for x in clause):
+                continue
+            r = [x for x in clause if -x not in assigned]
+            if len(r) == 0:
+                return None, assigned
+            if len(r) == 1:
+                assigned.add(r[0])
+                units.append(r[0])
+    residual = []
+    for clause in clauses:
+        if not any(x in assigned for x in clause):
+            residual.append(tuple(x for x in clause if -x not in assigned))
+    return residual, assigned
+
+def _clause_vars(clauses):
+    return set(abs(y) for x in clauses for y in x)
+
+def _components(clauses):
+    # split clauses into variable disjoint components with a union-find over the variables
+    parent = {}
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    for clause in clauses:
+        r = find(abs(clause[0]))
+        for x in clause[1:]:
+            s = find(abs(x))
+            if s != r:
+                parent[s] = r
+    components = {}
+    for clause in clauses:
+        components.setdefault(find(abs(clause[0])), []).append(clause)
+    return components.values()
+
+def _run(call):
+    # runs a recursion written as generators on an explicit stack, instead of the interpreter stack:
+    # a call yields the generator of a sub call and is sent its result, the value it returns goes to its caller
+    stack, value = [call], None
+    while len(stack) > 0:
+        try:
+            sub = stack[-1].send(value)
+        except StopIteration as e:
+            stack.pop()
+            value = e.value
+        else:
+            stack.append(sub)
+            value = None
+    return value
+
+def _satisfiable(clauses):
+    with Solver(bootstrap_with=clauses) as solver:
+        return solver.solve()
+
+class ParityCounter(object):
+    """
+    Counts the number of models of a CNF modulo 2, projected on a set of variables (all variables in the clauses by default).
+    The counter branches on projected variables, splits the residual formula into independent components and caches their parity.
+    A component with an even number of models makes the whole product even, and so does any projected variable that becomes unconstrained.
+    Cached components do not depend on the assumptions, such that the cache is shared by all queries on the same counter.
+    """
+
+    def __init__(self, clauses, projected_vars = None):
+        self.clauses = tuple(tuple(clause) for clause in clauses)
+        if projected_vars is None:
+            self.projected_vars = frozenset(_clause_vars(self.clauses))
+        else:
+            self.projected_vars = frozenset(projected_vars)
+        self.cache = {}
+
+    def count(self, assumptions = []):
+        clauses, assigned = _simplify(self.clauses, assumptions)
+        if clauses is None:
+            return 0
+        return _run(self.__count(clauses, self.projected_vars, assigned))
+
+    def __count(self, clauses, scope, assigned):
+        # projected variables in scope that are neither assigned nor constrained double the count
+        remaining = _clause_vars(clauses)
+        if any(x not in remaining for x in scope - set(abs(y) for y in assigned)):
+            return 0
+        for component in _components(clauses):
+            if (yield self.__count_component(tuple(component))) == 0:
+                return 0
+        return 1
+
+    def __count_component(self, clauses):
+        key = frozenset(clauses)
+        if key in self.cache:
+            return self.cache[key]
+        occurrences = {}
+        for clause in clauses:
+            for x in clause:
+                if abs(x) in self.projected_vars:
+                    occurrences[abs(x)] = occurrences.get(abs(x), 0) + 1
+        if len(occurrences) == 0:
+            res = 1 if _satisfiable(clauses) else 0
+        else:
+            # most frequent variable, ties are broken by the median index such that chains of equivalences are split in halves
+            most = max(occurrences.values())
+            candidates = sorted(y for y, c in occurrences.items() if c == most)
+            x = candidates[len(candidates)//2]
+            scope = frozenset(occurrences.keys())
+            res = 0
+            for l in (x, -x):
+                residual, assigned = _simplify(clauses, (l,))
+                if residual is not None:
+                    res ^= yield self.__count(residual, scope, assigned)
+        self.cache[key] = res
+        return res
+
+def count_models_mod_2(clauses, projected_vars = None, assumptions = []):
+    return ParityCounter(clauses, projected_vars).count(assumptions)
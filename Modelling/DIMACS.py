@@ -0,0 +1,147 @@
+from .CNF import CNF
+import numpy as np
+import os
+
+# Streaming writers for models and a memory mapped reader.
+# The binary format is a 32 byte header (magic, number of clauses, number of literals, largest variable),
+# the int32 literals (padded to a multiple of 8 bytes) and the int64 clause offsets.
+
+MAGIC = b"UTCNF001"
+HEADER_SIZE = 32
+_HEADER_WIDTH = 20
+
+class DIMACSWriter(object):
+    """
+    Writes clauses to a DIMACS file as they are added, the header is filled in on close.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w")
+        # placeholder header of fixed width, overwritten on close
+        self.file.write(" "*(2*_HEADER_WIDTH + 8) + "\n")
+        self.n_clauses = 0
+        self.nv = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def extend(self, clauses):
+        if isinstance(clauses, CNF):
+            lits, offsets = clauses.literals(), clauses.offsets[:clauses.n_clauses+1] - clauses.offsets[0]
+            if len(lits) > 0:
+                self.nv = max(self.nv, clauses.nv)
+            # written in chunks of clauses, such that only one chunk is converted to text at a time
+            for start in range(0, clauses.n_clauses, 2**14):
+                stop = min(start + 2**14, clauses.n_clauses)
+                chunk = lits[offsets[start]:offsets[stop]].tolist()
+                o = (offsets[start:stop+1] - offsets[start]).tolist()
+                self.file.write("".join(" ".join(map(str, chunk[o[i]:o[i+1]] + [0])) + "\n" for i in range(stop - start)))
+            self.n_clauses += clauses.n_clauses
+        else:
+            for clause in clauses:
+                self.append(clause)
+
+    def append(self, clause):
+        clause = tuple(clause)
+        self.nv = max([self.nv] + [abs(x) for x in clause])
+        self.file.write(" ".join(map(str, clause + (0,))) + "\n")
+        self.n_clauses += 1
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.seek(0)
+        self.file.write(f"p cnf {self.nv:>{_HEADER_WIDTH}} {self.n_clauses:>{_HEADER_WIDTH}}")
+        self.file.close()
+        self.file = None
+
+class BinaryCNFWriter(object):
+    """
+    Writes clauses to the binary format as they are added, only the clause lengths are kept in memory until close.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(bytes(HEADER_SIZE))
+        self.lengths = []
+        self.n_lits = 0
+        self.nv = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def extend(self, clauses):
+        if not isinstance(clauses, CNF):
+            clauses = CNF(clauses)
+        lits = clauses.literals()
+        self.file.write(np.ascontiguousarray(lits, dtype=np.int32).tobytes())
+        self.lengths.append(clauses.clause_lengths())
+        self.n_lits += len(lits)
+        if len(lits) > 0:
+            self.nv = max(self.nv, clauses.nv)
+
+    def append(self, clause):
+        self.extend((clause,))
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.write(bytes((-4*self.n_lits) % 8))
+        lengths = np.concatenate(self.lengths) if len(self.lengths) > 0 else np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        self.file.write(offsets.tobytes())
+        self.file.seek(0)
+        self.file.write(MAGIC + np.array([len(lengths), self.n_lits, self.nv], dtype=np.int64).tobytes())
+        self.file.close()
+        self.file = None
+
+def load_cnf(path, stamp = None):
+    # memory mapped, the clauses are shared (zero-copy) with every process that loads the same file
+    # stamp is the header and the size and modification time of the file when it was loaded before (see CNF.source),
+    # loading fails when it does not match, such that a file that was rewritten in between is not silently mapped
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+        st = os.fstat(f.fileno())
+    if header[:8] != MAGIC:
+        raise ValueError(f"{path} is not a binary CNF file")
+    n_clauses, n_lits, nv = np.frombuffer(header[8:], dtype=np.int64).tolist()
+    current = (n_clauses, n_lits, nv, st.st_size, st.st_mtime_ns)
+    if stamp is not None and tuple(stamp) != current:
+        raise ValueError(f"{path} has changed since its clauses were mapped")
+    lits = np.memmap(path, dtype=np.int32, mode="r", offset=HEADER_SIZE, shape=(n_lits,)) if n_lits > 0 else np.zeros(0, dtype=np.int32)
+    offsets = np.memmap(path, dtype=np.int64, mode="r", offset=HEADER_SIZE + 4*n_lits + (-4*n_lits) % 8, shape=(n_clauses+1,))
+    res = CNF.from_buffers(lits, offsets, nv)
+    res.source = (path, 0, current)
+    return res
+
+def save_cnf(path, clauses):
+    with BinaryCNFWriter(path) as writer:
+        writer.extend(clauses)
+
+def write_dimacs(path, clauses):
+    with DIMACSWriter(path) as writer:
+        writer.extend(clauses)
+
+def read_dimacs(path):
+    res = CNF()
+    clause = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("c") or line.startswith("p"):
+                continue
+            for x in map(int, line.split()):
+                if x == 0:
+                    res.append(clause)
+                    clause = []
+                else:
+                    clause.append(x)
+    return res
@@ -0,0 +1,85 @@
+from hashlib import sha256
+import tempfile
+import pickle
+import os
+
+class DiskCache(object):
+    """
+    Content addressed cache of picklable values, every entry is a file named after the hash of its key.
+    Entries are written to a temporary file and renamed, such that concurrent readers and writers (e.g. pool workers) only ever see complete entries.
+    Reading an entry updates its modification time, when the total size exceeds max_bytes the least recently used entries are removed.
+    """
+
+    def __init__(self, directory, max_bytes = 2**28):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, sha256(repr(key).encode()).hexdigest() + ".pkl")
+
+    def get(self, key, default = None):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                stored_key, value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return default
+        if stored_key != key:
+            return default
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def put(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((key, value), f)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+# the cache for component propagation models, the directory is taken from UT_MODEL_CACHE (an empty value disables the cache)
+_model_cache = []
+def get_model_cache():
+    if len(_model_cache) == 0:
+        directory = os.environ.get("UT_MODEL_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "ultrametric-integral-cryptanalysis"))
+        _model_cache.append(DiskCache(directory) if directory != "" else None)
+    return _model_cache[0]
+
+def set_model_cache(directory, max_bytes = 2**28):
+    # directory None disables the cache
+    _model_cache.clear()
+    _model_cache.append(None if directory is None else DiskCache(directory, max_bytes))
@@ -1,42 +1,107 @@
-from .SAT_Solving import enum_projected_models, create_assumptions, from_assignment
-from multiprocessing import Pool
+from .SAT_Solving import IncrementalSolver, create_assumptions, from_assignment
+from .CNF import CNF, as_cnf
+from .Executor import budget, process_pool
 from itertools import product
 from pysat.formula import IDPool
 from pysat.card import CardEnc, EncType
 from time import time
 from functools import partial, reduce
 from .PropModels import to_ord
+import numpy as np
 
-def construct_model_with_intermediate_vars(fs, precursor):
-    vpool = IDPool()
+def _round_models(fs, precursor, vpool):
+    # yields model, input_vars, output_vars, key_vars, count_vars for every round on the variables of vpool
+    output_vars = None
     # add constraints for input
     if precursor:
         input_vars = tuple(vpool.id() for _ in range(64))
         count_vars = tuple(vpool.id() for _ in range(64))
         output_vars = tuple(vpool.id() for _ in range(64))
-        model = tuple()
+        model = CNF()
         for i, o, c in zip(input_vars, output_vars, count_vars):
-            model += ((i, -o),)
-            model += ((-i, o, c),)
-            model += ((i, -c),)
-            model += ((-o, -c),)
-        models, input_varss, output_varss, key_varss, count_varss = [model], [input_vars], [output_vars], [tuple()], [count_vars]
-    else:
-        models, input_varss, output_varss, key_varss, count_varss = [], [], [], [], []
+            model.extend(((i, -o), (-i, o, c), (i, -c), (-o, -c)))
+        yield model, input_vars, output_vars, tuple(), count_vars
 
     # add contraints for rounds
     for f in fs:
-        if len(output_varss) > 0:
-            model, input_vars, output_vars, key_vars, count_vars = f.to_UT_model(pool=vpool, input_vars=output_varss[-1])
+        if output_vars is not None:
+            model, input_vars, output_vars, key_vars, count_vars = f.to_UT_model(pool=vpool, input_vars=output_vars)
         else:
             model, input_vars, output_vars, key_vars, count_vars = f.to_UT_model(pool=vpool)
-        models.append(tuple(model))
+        yield model, input_vars, output_vars, key_vars, count_vars
+
+def construct_model_with_intermediate_vars(fs, precursor, sink = None):
+    # with a sink (e.g. a DIMACSWriter or BinaryCNFWriter) the clauses of every round are written as they are built
+    # and the returned model is None
+    vpool = IDPool()
+    model = None if sink is not None else CNF()
+    input_varss, output_varss, key_varss, count_varss = [], [], [], []
+    for m, input_vars, output_vars, key_vars, count_vars in _round_models(fs, precursor, vpool):
+        (model if sink is None else sink).extend(m)
         input_varss.append(input_vars)
         output_varss.append(output_vars)
         key_varss.append(key_vars)
         count_varss.append(count_vars)
-    
-    return sum(models, tuple()), input_varss, output_varss, key_varss, sum(count_varss, tuple()), vpool.top
+    return model, input_varss, output_varss, key_varss, sum(count_varss, tuple()), vpool.top
+
+class RoundModel(object):
+    """
+    The UT models of a sequence of rounds (with the precursor model as round 0), built once on shared variables.
+    The clauses of every round are guarded by a selector variable, such that rounds are dropped at either end
+    by assuming their selector to be false, the remaining rounds are never rebuilt.
+    The window of remaining rounds is [first, last), input_vars, output_vars and count_vars refer to the window.
+    """
+
+    def __init__(self, fs, precursor):
+        vpool = IDPool()
+        models, self.input_varss, self.output_varss, self.key_varss, self.count_varss = [], [], [], [], []
+        for m, input_vars, output_vars, key_vars, count_vars in _round_models(fs, precursor, vpool):
+            models.append(m)
+            self.input_varss.append(input_vars)
+            self.output_varss.append(output_vars)
+            self.key_varss.append(key_vars)
+            self.count_varss.append(count_vars)
+        self.selectors = tuple(range(vpool.top + 1, vpool.top + 1 + len(models)))
+        self.top_var = vpool.top + len(models)
+        self.clauses = CNF()
+        for s, m in zip(self.selectors, models):
+            self.clauses.extend(_guarded(m, s))
+        # the count vars of all rounds, a cardinality constraint on these is one on the window:
+        # the count vars of dropped rounds only occur in disabled clauses and can always be false
+        self.all_count_vars = sum(self.count_varss, tuple())
+        self.count_vars = self.all_count_vars
+        self.first, self.last = 0, len(models)
+
+    def __len__(self):
+        return self.last - self.first
+
+    @property
+    def input_vars(self):
+        return self.input_varss[self.first]
+
+    @property
+    def output_vars(self):
+        return self.output_varss[self.last-1]
+
+    def drop_first(self):
+        self.count_vars = self.count_vars[len(self.count_varss[self.first]):]
+        self.first += 1
+
+    def drop_last(self):
+        self.last -= 1
+        self.count_vars = self.count_vars[:len(self.count_vars) - len(self.count_varss[self.last])]
+
+    def assumptions(self):
+        return tuple(s if self.first <= i < self.last else -s for i, s in enumerate(self.selectors))
+
+def _guarded(model, selector):
+    # adds -selector to every clause of model
+    model = as_cnf(model)
+    starts = model.offsets[:model.n_clauses] - model.offsets[0]
+    lits = np.insert(model.literals(), starts, -selector)
+    offsets = np.full(model.n_clauses + 1, len(lits), dtype=np.int64)
+    offsets[:-1] = starts + np.arange(model.n_clauses)
+    return CNF.from_buffers(lits, offsets, owner=True)
 
 def reduce_propagated_set(s, m):
     for v in tuple(s.keys()):
@@ -86,12 +151,29 @@ def intersect_propagated_sets(f, b, m):
                     res[k] = res2[k]
     return res
 
-def propagate(model, fix_vars, enum_vars, key_vars, m, prev_cor, comp_cor, xs, backwards = False):
+# state of a pool worker, the model is loaded once per worker and its solver is kept warm between tasks
+_worker_state = {}
+def _init_worker(model, top_var, count_vars, correlation_evals):
+    _worker_state["solver"] = IncrementalSolver(model, top_var)
+    _worker_state["bound_selectors"] = {}
+    _worker_state["count_vars"] = count_vars
+    _worker_state["correlation_evals"] = correlation_evals
+
+def _release_worker():
+    if "solver" in _worker_state:
+        _worker_state["solver"].delete()
+    _worker_state.clear()
+
+def _worker_pool(NThreads, model, top_var, count_vars, correlation_evals):
+    # with the fork start method the workers inherit the model, nothing is pickled
+    return process_pool(NThreads, _init_worker, (model, top_var, count_vars, tuple(correlation_evals)), _release_worker)
+
+def _propagate(solver, fix_vars, enum_vars, key_vars, m, prev_cor, comp_cor, xs, backwards):
     res = {}
     for x in xs:
         res2 = {}
         assumptions = create_assumptions(fix_vars, x)
-        for r in enum_projected_models(model, enum_vars + key_vars, assumptions=assumptions):
+        for r in solver.enum_projected_models(enum_vars + key_vars, assumptions=assumptions):
             y = from_assignment(enum_vars, r)
             k = from_assignment(key_vars, r)
             if backwards:
@@ -106,6 +188,19 @@ def propagate(model, fix_vars, enum_vars, key_vars, m, prev_cor, comp_cor, xs, b
         res = merge_propagated_sets(res, res2, m)
     return res
 
+def propagate(model, fix_vars, enum_vars, key_vars, m, prev_cor, comp_cor, xs, backwards = False):
+    with IncrementalSolver(model) as solver:
+        return _propagate(solver, fix_vars, enum_vars, key_vars, m, prev_cor, comp_cor, xs, backwards)
+
+def _propagate_task(fix_vars, enum_vars, key_vars, m, prev_cor, cor_index, backwards):
+    # prev_cor only contains the entries that are propagated by this task
+    comp_cor = _worker_state["correlation_evals"][cor_index]
+    return _propagate(_worker_state["solver"], fix_vars, enum_vars, key_vars, m, prev_cor, comp_cor, tuple(prev_cor.keys()), backwards)
+
+def _split_propagated_set(s, n):
+    keys = tuple(s.keys())
+    return [{k: s[k] for k in keys[i::n]} for i in range(n)]
+
 def compute_correlation_precursor_model(u, v, k):
     return 2**((v ^ u).bit_count())
 
@@ -119,11 +214,11 @@ def compute_exact_correlation_mod(functions, correlation_evals, u, v, m, precurs
     m: compute correlation modulo $2^m$
     precursor: whether to model a precursor set as input or a unit vector
     """
+    NThreads = budget(NThreads)
     # create model
     model, input_varss, output_varss, key_varss, count_vars, top_var = construct_model_with_intermediate_vars(functions, precursor = precursor)
-    model += tuple(CardEnc.atmost(count_vars, bound=m-1, top_id = top_var).clauses)
-    for x in create_assumptions(input_varss[0], u) + create_assumptions(output_varss[-1], v):
-        model += ((x,),)
+    model.extend(CardEnc.atmost(count_vars, bound=m-1, top_id = top_var).clauses)
+    model.extend((x,) for x in create_assumptions(input_varss[0], u) + create_assumptions(output_varss[-1], v))
     # update correlation_evals if necessary
     if precursor:
         correlation_evals = [compute_correlation_precursor_model] + list(correlation_evals)
@@ -136,23 +231,23 @@ def compute_exact_correlation_mod(functions, correlation_evals, u, v, m, precurs
 
     # propagate either forwards or backwards until the fi and bi indices meet
     # the direction is decided based on the sizes of the forward and backward propagated sets
-    while bi != fi:
-        with Pool(NThreads) as pool:
+    with _worker_pool(NThreads, model, None, count_vars, correlation_evals) as pool:
+        while bi != fi:
             if len(backward) < len(forward): # propagate backwards
                 if debug:
                     print("computing propagation backwards")
                     stime = time()
                 bi -= 1
-                parf = partial(propagate, model, output_varss[bi], input_varss[bi], key_varss[bi], m, backward, correlation_evals[bi], backwards=True)
-                backward = reduce(partial(merge_propagated_sets, m=m), pool.map(parf, [tuple(backward.keys())[i::NThreads] for i in range(NThreads)], chunksize=1), {})
+                tasks = [(output_varss[bi], input_varss[bi], key_varss[bi], m, part, bi, True) for part in _split_propagated_set(backward, NThreads)]
+                backward = reduce(partial(merge_propagated_sets, m=m), pool.starmap(_propagate_task, tasks, chunksize=1), {})
                 if debug:
                     print(f"backwards propagation resulted in {len(backward)} v's after {time() - stime} seconds")
             else: # propagate forwards
                 if debug:
                     print("computing propagation forwards")
                     stime = time()
-                parf = partial(propagate, model, input_varss[fi], output_varss[fi], key_varss[fi], m, forward, correlation_evals[fi], backwards=False)
-                forward = reduce(partial(merge_propagated_sets, m=m), pool.map(parf, [tuple(forward.keys())[i::NThreads] for i in range(NThreads)], chunksize=1), {})
+                tasks = [(input_varss[fi], output_varss[fi], key_varss[fi], m, part, fi, False) for part in _split_propagated_set(forward, NThreads)]
+                forward = reduce(partial(merge_propagated_sets, m=m), pool.starmap(_propagate_task, tasks, chunksize=1), {})
                 fi += 1
                 if debug:
                     print(f"forwards propagation resulted in {len(forward)} u's after {time() - stime} seconds")
@@ -171,16 +266,21 @@ def extend_propagated_sets_var(k, c, prop, m, backwards):
                 res[(k0 + (k, ), k1)] = c3
     return res
 
-def propagate_var(model, count_vars, top_var, input_vars, output_vars, enum_vars, key_vars, m, comp_cor, ios, backwards = False):
+def _propagate_var(solver, bound_selectors, count_vars, input_vars, output_vars, enum_vars, key_vars, m, comp_cor, ios, backwards, round_selectors = ()):
     res = {}
     for (u, v), prop in ios:
         res2 = {}
-        assumptions = create_assumptions(input_vars, u)
+        assumptions = tuple(round_selectors) + create_assumptions(input_vars, u)
         assumptions += create_assumptions(output_vars, v)
-        # create cardinality constraints
+        # create cardinality constraints, they are added once per bound and guarded by a selector
         o = int(min(map(to_ord, prop.values())))
-        new_model = model + tuple(CardEnc.atmost(count_vars, bound=m-1-o, top_id = top_var).clauses)
-        for r in enum_projected_models(new_model, enum_vars + key_vars, assumptions=assumptions):
+        if o not in bound_selectors:
+            bound_selectors[o] = solver.new_var()
+            card_enc = CardEnc.atmost(count_vars, bound=m-1-o, top_id = solver.top_var)
+            solver.top_var = max(solver.top_var, card_enc.nv)
+            solver.add_clauses(card_enc.clauses, bound_selectors[o])
+        assumptions += (bound_selectors[o],)
+        for r in solver.enum_projected_models(enum_vars + key_vars, assumptions=assumptions):
             x = from_assignment(enum_vars, r)
             k = from_assignment(key_vars, r)
 
@@ -190,7 +290,7 @@ def propagate_var(model, count_vars, top_var, input_vars, output_vars, enum_vars
             else:
                 ex = extend_propagated_sets_var(k, comp_cor(u, x, k) & ((1<<m) - 1), prop, m, False)
                 s = (x, v)
-            
+        
             if s in res2:
                 for a, b in ex.items():
                     res2[s][a] = b
@@ -200,6 +300,14 @@ def propagate_var(model, count_vars, top_var, input_vars, output_vars, enum_vars
         res = merge_propagated_sets(res, res2, m)
     return res
 
+def propagate_var(model, count_vars, top_var, input_vars, output_vars, enum_vars, key_vars, m, comp_cor, ios, backwards = False):
+    with IncrementalSolver(model, top_var) as solver:
+        return _propagate_var(solver, {}, count_vars, input_vars, output_vars, enum_vars, key_vars, m, comp_cor, ios, backwards)
+
+def _propagate_var_task(input_vars, output_vars, enum_vars, key_vars, m, cor_index, ios, backwards, round_selectors):
+    comp_cor = _worker_state["correlation_evals"][cor_index]
+    return _propagate_var(_worker_state["solver"], _worker_state["bound_selectors"], _worker_state["count_vars"], input_vars, output_vars, enum_vars, key_vars, m, comp_cor, ios, backwards, round_selectors)
+
 def compute_exact_correlation_mod_var(functions, correlation_evals, u, v, m, precursor = True, NThreads = 1, debug = False):
     """
     functions: A list of compound functions (see Construction.CompoundFunction) that are evaluated in order
@@ -210,6 +318,7 @@ def compute_exact_correlation_mod_var(functions, correlation_evals, u, v, m, pre
     m: compute correlation modulo $2^m$
     precursor: whether to model a precursor set as input or a unit vector
     """
+    NThreads = budget(NThreads)
     # debug setup
     if debug:
         dbg_msg = {True:"back", False:"for"}
@@ -218,22 +327,15 @@ def compute_exact_correlation_mod_var(functions, correlation_evals, u, v, m, pre
         correlation_evals = [compute_correlation_precursor_model] + list(correlation_evals)
     # instantiate propagation set and indices
     io = {(u, v): {(tuple(), tuple()) : 1}}
-    fi = 0
-    bi = len(correlation_evals)
 
-    # propagate either forwards or backwards until the fi and bi indices meet
+    # the model of all rounds is built once, every step drops the round it propagated through
+    # and the workers keep their solver (and cardinality constraints) for the whole computation
+    rounds = RoundModel(functions, precursor)
+
+    # propagate either forwards or backwards until no rounds are left
     # the direction is decided based on the sizes number of unique u's or v's
-            
-    while bi != fi:
-        with Pool(NThreads) as pool:
-            # compute model
-            if precursor:
-                if fi == 0:
-                    model, input_varss, output_varss, key_varss, count_vars, top_var = construct_model_with_intermediate_vars(functions[fi:bi-1], precursor = precursor)
-                else:
-                    model, input_varss, output_varss, key_varss, count_vars, top_var = construct_model_with_intermediate_vars(functions[fi-1:bi-1], precursor=False)
-            else:
-                model, input_varss, output_varss, key_varss, count_vars, top_var = construct_model_with_intermediate_vars(functions[fi:bi], precursor=False)
+    with _worker_pool(NThreads, rounds.clauses, rounds.top_var, rounds.all_count_vars, correlation_evals) as pool:
+        while len(rounds) > 0:
             # decide on propagation direction
             us, vs = set(), set()
             for u, v in io.keys():
@@ -248,19 +350,20 @@ def compute_exact_correlation_mod_var(functions, correlation_evals, u, v, m, pre
                 stime = time()   
 
             if go_backwards:
-                bi -= 1
-                enum_vars = input_varss[-1]
-                key_vars = key_varss[-1]
-                comp_cor = correlation_evals[bi]
+                cor_index = rounds.last - 1
+                enum_vars = rounds.input_varss[cor_index]
             else:
-                enum_vars = output_varss[0]
-                key_vars = key_varss[0]
-                comp_cor = correlation_evals[fi]
-                fi += 1
+                cor_index = rounds.first
+                enum_vars = rounds.output_varss[cor_index]
+            key_vars = rounds.key_varss[cor_index]
 
-            parf = partial(propagate_var, model, count_vars, top_var, input_varss[0], output_varss[-1], enum_vars, key_vars, m, comp_cor, backwards=go_backwards)
-            io = reduce(partial(merge_propagated_sets, m=m), pool.map(parf, [tuple(io)[i::8*NThreads] for i in range(8*NThreads)], chunksize=1), {})
+            tasks = [(rounds.input_vars, rounds.output_vars, enum_vars, key_vars, m, cor_index, io[i::8*NThreads], go_backwards, rounds.assumptions()) for i in range(8*NThreads)]
+            io = reduce(partial(merge_propagated_sets, m=m), pool.starmap(_propagate_var_task, tasks, chunksize=1), {})
             io = reduce_propagated_set(io, m)
+            if go_backwards:
+                rounds.drop_last()
+            else:
+                rounds.drop_first()
             
             if debug:
                 print(f"{dbg_msg[go_backwards]}wards propagation resulted in {len(io)} pairs after {time() - stime} seconds")
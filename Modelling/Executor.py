@@ -0,0 +1,120 @@
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from itertools import starmap
+from contextlib import contextmanager
+import atexit
+import os
+
+# Worker pools for the whole package.
+# The number of workers is taken from UT_WORKERS (default: the cores available to this process) or set by set_worker_count,
+# requests for more workers are capped to it. Inside a worker process the budget is 1, such that nested parallel code
+# (e.g. QMC for a component that is modelled in a pool worker) runs serially instead of starting pools of its own.
+
+_config = {}
+_nested = []
+
+def _available_cores():
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+
+def get_worker_count():
+    if "workers" not in _config:
+        n = os.environ.get("UT_WORKERS", "")
+        _config["workers"] = max(1, int(n)) if n != "" else _available_cores()
+    return _config["workers"]
+
+def set_worker_count(n):
+    # None goes back to UT_WORKERS, the shared pools are restarted on next use
+    shutdown()
+    _config.clear()
+    if n is not None:
+        _config["workers"] = max(1, n)
+
+def budget(requested = None):
+    # the number of workers for a parallel section asking for requested workers (None for all of them)
+    if len(_nested) > 0:
+        return 1
+    n = get_worker_count()
+    return n if requested is None else max(1, min(requested, n))
+
+class SerialPool(object):
+    """
+    The part of the interface of multiprocessing.Pool used in this package, every task runs in the calling process.
+    The state set up by initializer lives in the calling process, finalizer releases it on exit.
+    """
+
+    def __init__(self, initializer = None, initargs = (), finalizer = None):
+        self.finalizer = finalizer
+        if initializer is not None:
+            initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.finalizer is not None:
+            self.finalizer()
+            self.finalizer = None
+
+    def map(self, f, iterable, chunksize = None):
+        return list(map(f, iterable))
+
+    def starmap(self, f, iterable, chunksize = None):
+        return list(starmap(f, iterable))
+
+    def imap(self, f, iterable, chunksize = 1):
+        return map(f, iterable)
+
+    imap_unordered = imap
+
+def _init_worker(initializer, initargs):
+    _nested.append(True)
+    if initializer is not None:
+        initializer(*initargs)
+
+def process_pool(n = None, initializer = None, initargs = (), finalizer = None):
+    """
+    A new pool of budget(n) processes for work that needs per worker state (set up by initializer), to be used as a context manager.
+    With the fork start method the workers inherit initargs, nothing is pickled.
+    With a budget of 1 the tasks run in the calling process, and finalizer is called on exit to release the state of initializer
+    (worker processes release theirs when they are terminated).
+    """
+    n = budget(n)
+    if n == 1:
+        return SerialPool(initializer, initargs, finalizer)
+    return Pool(n, initializer=_init_worker, initargs=(initializer, initargs))
+
+# the shared pools, started on first use and kept until the number of workers changes
+_pools = {}
+
+def _shared(kind, start, n):
+    n = budget(n)
+    if n == 1:
+        return SerialPool()
+    if kind in _pools and _pools[kind][0] != n:
+        pool = _pools.pop(kind)[1]
+        pool.terminate()
+        pool.join()
+    if kind not in _pools:
+        _pools[kind] = (n, start(n))
+    return _pools[kind][1]
+
+def get_pool(n = None):
+    # process pool for stateless tasks, do not use it as a context manager (that would terminate it)
+    return _shared("process", lambda n: Pool(n, initializer=_init_worker, initargs=(None, ())), n)
+
+@contextmanager
+def shared_pool(n = None):
+    # get_pool as a context manager, the pool is kept running on exit
+    yield get_pool(n)
+
+def get_thread_pool(n = None):
+    # thread pool for native code that releases the GIL
+    return _shared("thread", ThreadPool, n)
+
+def shutdown():
+    for kind in tuple(_pools):
+        pool = _pools.pop(kind)[1]
+        pool.terminate()
+        pool.join()
+
+atexit.register(shutdown)
@@ -0,0 +1,96 @@
+from Construction.BatchEvaluation import evaluate_batch
+from .Executor import process_pool
+from time import time
+import numpy as np
+import os
+
+def precursor_set(u, constant = 0):
+    # all x ^ constant for x with x & ~u == 0, as uint64 or as (N, n_words) for more than 64 bits (as random_keys)
+    bits = [i for i in range(u.bit_length()) if (u >> i) & 1]
+    n_words = max(1, (max(u, constant).bit_length() + 63) // 64)
+    res = np.zeros((2**len(bits), n_words), dtype=np.uint64)
+    for j, i in enumerate(bits):
+        res[(np.arange(len(res)) >> j) & 1 == 1, i // 64] |= np.uint64(1 << (i % 64))
+    res ^= np.array([(constant >> (64*w)) & (2**64 - 1) for w in range(n_words)], dtype=np.uint64)
+    return res[:, 0] if n_words == 1 else res
+
+def random_keys(rng, n, n_bits):
+    # n uniformly random keys, as uint64 or as (n, n_words) for more than 64 bits
+    n_words = max(1, (n_bits + 63) // 64)
+    keys = rng.integers(0, 2**64, (n, n_words), dtype=np.uint64)
+    if n_bits % 64 != 0:
+        keys[:, -1] &= np.uint64((1 << (n_bits % 64)) - 1)
+    return keys[:, 0] if n_words == 1 else keys
+
+_experiment_state = {}
+def _init_experiment_worker(f, input_set, seed, chunk_size, n_keys):
+    _experiment_state["f"], _experiment_state["input_set"] = f, input_set
+    _experiment_state["seed"], _experiment_state["chunk_size"], _experiment_state["n_keys"] = seed, chunk_size, n_keys
+
+# the number of (input, key) pairs that are evaluated at once, this bounds the memory of a worker independently of the chunk size
+_MAX_LANES = 2**20
+
+def _experiment_chunk(chunk):
+    # histogram of the per bit sums over the input set for the keys of one chunk, the keys only depend on the seed and the chunk index
+    # the keys are evaluated in groups and the input set in slices, such that at most _MAX_LANES inputs are evaluated at once
+    s = _experiment_state
+    f, input_set = s["f"], s["input_set"]
+    n = min(s["chunk_size"], s["n_keys"] - chunk*s["chunk_size"])
+    keys = random_keys(np.random.default_rng((s["seed"], chunk)), n, f.n_key_bits)
+    m = len(input_set)
+    group_size, slice_size = max(1, _MAX_LANES // max(1, m)), max(1, min(m, _MAX_LANES))
+    histogram = np.zeros((f.output_size, m+1), dtype=np.int64)
+    for start in range(0, n, group_size):
+        group = keys[start:start+group_size]
+        sums = np.zeros((len(group), f.output_size), dtype=np.int64)
+        for i0 in range(0, m, slice_size):
+            xs = input_set[i0:i0+slice_size]
+            # every key of the group with every input of the slice, inputs of more than 64 bits are rows of words
+            outputs = evaluate_batch(f, np.tile(xs, (len(group),) + (1,)*(xs.ndim - 1)), np.repeat(group, len(xs), axis=0))
+            outputs = outputs.reshape(len(group), len(xs), -1)
+            for i in range(f.output_size):
+                sums[:, i] += ((outputs[:, :, i // 64] >> np.uint64(i % 64)) & np.uint64(1)).sum(axis=1, dtype=np.int64)
+        for i in range(f.output_size):
+            histogram[i] += np.bincount(sums[:, i], minlength=m+1)
+    return chunk, histogram
+
+def _load_checkpoint(checkpoint, meta):
+    with np.load(checkpoint) as data:
+        if not (data["meta"] == meta).all():
+            raise ValueError(f"checkpoint {checkpoint} belongs to a different experiment")
+        return data["histogram"], set(data["done"].tolist())
+
+def _save_checkpoint(checkpoint, meta, histogram, done):
+    # written to a temporary file first, such that an interrupted run never leaves a corrupt checkpoint
+    tmp = checkpoint + ".tmp.npz"
+    np.savez(tmp, meta=meta, histogram=histogram, done=np.array(sorted(done), dtype=np.int64))
+    os.replace(tmp, checkpoint)
+
+def run_integral_experiment(f, input_set, n_keys, chunk_size = 2**10, NThreads = 1, seed = 0, checkpoint = None, checkpoint_interval = 16, debug = False):
+    """
+    f: a CompoundFunction (see Construction.CompoundFunction)
+    input_set: the inputs that are summed over, e.g. precursor_set(u)
+    n_keys: number of uniformly random keys (all key bits of f are independent)
+    returns res, where res[i, c] is the number of keys for which output bit i sums to c over the input set
+    With a checkpoint path, partial histograms are stored every checkpoint_interval chunks and an interrupted run resumes from there.
+    """
+    input_set = np.asarray(input_set, dtype=np.uint64)
+    n_chunks = (n_keys + chunk_size - 1) // chunk_size
+    meta = np.array([n_keys, chunk_size, seed, len(input_set), f.output_size], dtype=np.int64)
+    histogram = np.zeros((f.output_size, len(input_set)+1), dtype=np.int64)
+    done = set()
+    if checkpoint is not None and os.path.exists(checkpoint):
+        histogram, done = _load_checkpoint(checkpoint, meta)
+    todo = [c for c in range(n_chunks) if c not in done]
+    if debug:
+        print(f"debug: {len(done)} of {n_chunks} chunks already done")
+        stime = time()
+    with process_pool(NThreads, _init_experiment_worker, (f, input_set, seed, chunk_size, n_keys), _experiment_state.clear) as pool:
+        for chunk, h in pool.imap_unordered(_experiment_chunk, todo):
+            histogram += h
+            done.add(chunk)
+            if checkpoint is not None and (len(done) % checkpoint_interval == 0 or len(done) == n_chunks):
+                _save_checkpoint(checkpoint, meta, histogram, done)
+            if debug:
+                print(f"debug: {len(done)}/{n_chunks} chunks after {time() - stime} seconds")
+    return histogram
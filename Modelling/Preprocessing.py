@@ -0,0 +1,236 @@
+from .CNF import CNF
+from collections import defaultdict
+from time import time
+
+class _Formula(object):
+    # clauses as frozensets with occurrence lists, removed clauses are dropped from both
+
+    def __init__(self, clauses):
+        self.clauses = {}
+        self.occ = defaultdict(set)
+        self.n_ids = 0
+        self.unsat = False
+        for clause in clauses:
+            self.add(clause)
+
+    def add(self, clause):
+        clause = frozenset(clause)
+        if any(-x in clause for x in clause):
+            return None
+        if len(clause) == 0:
+            self.unsat = True
+        i = self.n_ids
+        self.n_ids += 1
+        self.clauses[i] = clause
+        for x in clause:
+            self.occ[x].add(i)
+        return i
+
+    def remove(self, i):
+        for x in self.clauses.pop(i):
+            self.occ[x].discard(i)
+
+    def vars(self):
+        return set(abs(x) for x, ids in self.occ.items() if len(ids) > 0)
+
+class PreprocessedModel(object):
+    """
+    Simplifies a model by unit propagation, equivalent literal substitution, subsumption and bounded variable elimination.
+    Protected variables (inputs, outputs, keys, count vars, ...) are never removed or renumbered,
+    such that assumptions, from_assignment and count_vars work on clauses as on the original model.
+    The simplified model is equisatisfiable under any assumptions on the protected variables,
+    model counts are only preserved when projected on protected variables.
+    lift extends a model of the simplified clauses to a model of the original clauses.
+    """
+
+    def __init__(self, model, protected_vars, max_resolvent_size = 16, max_occurrences = 16, debug = False):
+        stime = time()
+        self.protected = frozenset(protected_vars)
+        self.max_resolvent_size = max_resolvent_size
+        self.max_occurrences = max_occurrences
+        model = tuple(tuple(clause) for clause in model)
+        self.n_vars = max((abs(x) for clause in model for x in clause), default=0)
+        # reconstruction steps, replayed in reverse order by lift
+        self.stack = []
+        f = _Formula(model)
+        self.n_clauses_before, self.n_vars_before = len(model), len(f.vars())
+        changed = True
+        while changed and not f.unsat:
+            changed = self.__propagate(f)
+            changed |= self.__substitute_equivalences(f)
+            changed |= self.__propagate(f)
+            self.__subsume(f)
+            changed |= self.__eliminate(f)
+        if f.unsat:
+            self.clauses = CNF(((1,), (-1,)))
+        else:
+            self.clauses = CNF(tuple(sorted(f.clauses[i], key=abs)) for i in sorted(f.clauses))
+        self.n_clauses_after, self.n_vars_after = len(self.clauses), len(f.vars())
+        if debug:
+            print(f"debug: preprocessing took {time() - stime} seconds, {self.statistics()}")
+
+    def statistics(self):
+        return {"clauses": (self.n_clauses_before, self.n_clauses_after), "vars": (self.n_vars_before, self.n_vars_after),
+                "reduction": 1 - self.n_clauses_after / max(1, self.n_clauses_before)}
+
+    def __propagate(self, f):
+        changed = False
+        units = [i for i, c in f.clauses.items() if len(c) == 1]
+        done = set()
+        while len(units) > 0 and not f.unsat:
+            i = units.pop()
+            if i not in f.clauses:
+                continue
+            (x,) = f.clauses[i]
+            if x in done:
+                continue
+            done.add(x)
+            for j in tuple(f.occ[x]):
+                if j != i:
+                    f.remove(j)
+                    changed = True
+            for j in tuple(f.occ[-x]):
+                c = f.clauses[j]
+                f.remove(j)
+                k = f.add(c - {-x})
+                if k is not None and len(f.clauses[k]) == 1:
+                    units.append(k)
+                changed = True
+            if abs(x) not in self.protected:
+                # the unit clause itself is only kept for protected variables
+                f.remove(i)
+                self.stack.append(("unit", x))
+                changed = True
+        return changed
+
+    def __substitute_equivalences(self, f):
+        # strongly connected components of the binary implication graph are equivalent literals
+        graph = defaultdict(list)
+        for c in f.clauses.values():
+            if len(c) == 2:
+                a, b = tuple(c)
+                graph[-a].append(b)
+                graph[-b].append(a)
+        substitution = {}
+        for scc in _sccs(graph):
+            if any(-x in scc for x in scc):
+                f.unsat = True
+                return False
+            # every component appears twice (for x and for -x), only the one with the smallest positive literal is used
+            if min(scc, key=abs) < 0:
+                continue
+            protected = sorted(x for x in scc if abs(x) in self.protected)
+            rep = protected[0] if len(protected) > 0 else min(scc, key=abs)
+            for x in scc:
+                if x != rep and abs(x) not in self.protected:
+                    substitution[abs(x)] = rep if x > 0 else -rep
+        for v, l in substitution.items():
+            self.stack.append(("equiv", v, l))
+            for x, y in ((v, l), (-v, -l)):
+                for j in tuple(f.occ[x]):
+                    c = f.clauses[j]
+                    f.remove(j)
+                    f.add((c - {x}) | {y})
+        return len(substitution) > 0
+
+    def __subsume(self, f):
+        for i in sorted(f.clauses, key=lambda i: len(f.clauses[i])):
+            if i not in f.clauses:
+                continue
+            c = f.clauses[i]
+            if len(c) == 0:
+                continue
+            x = min(c, key=lambda x: len(f.occ[x]))
+            for j in tuple(f.occ[x]):
+                if j != i and len(f.clauses[j]) >= len(c) and c <= f.clauses[j]:
+                    f.remove(j)
+
+    def __eliminate(self, f):
+        changed = False
+        candidates = [v for v in f.vars() if v not in self.protected]
+        for v in sorted(candidates, key=lambda v: len(f.occ[v])*len(f.occ[-v])):
+            pos, neg = tuple(f.occ[v]), tuple(f.occ[-v])
+            if len(pos) + len(neg) == 0 or len(pos) > self.max_occurrences or len(neg) > self.max_occurrences:
+                continue
+            resolvents = []
+            for i in pos:
+                for j in neg:
+                    r = (f.clauses[i] - {v}) | (f.clauses[j] - {-v})
+                    if any(-x in r for x in r):
+                        continue
+                    resolvents.append(r)
+                    if len(r) > self.max_resolvent_size or len(resolvents) > len(pos) + len(neg):
+                        break
+                else:
+                    continue
+                break
+            else:
+                # bounded: the elimination never increases the number of clauses
+                self.stack.append(("elim", v, tuple(f.clauses[i] for i in pos)))
+                for i in pos + neg:
+                    f.remove(i)
+                for r in resolvents:
+                    f.add(r)
+                changed = True
+                if f.unsat:
+                    return changed
+        return changed
+
+    def lift(self, m):
+        # m is a model of the simplified clauses (as returned by pysat), returns a model of the original clauses
+        values = [False]*(self.n_vars+1)
+        for x in m:
+            if abs(x) <= self.n_vars:
+                values[abs(x)] = x > 0
+        true = lambda x: values[abs(x)] == (x > 0)
+        for step in self.stack[::-1]:
+            if step[0] == "unit":
+                values[abs(step[1])] = step[1] > 0
+            elif step[0] == "equiv":
+                values[step[1]] = true(step[2])
+            else:
+                v = step[1]
+                values[v] = any(not any(true(x) for x in c if x != v) for c in step[2])
+        return [v if values[v] else -v for v in range(1, self.n_vars+1)]
+
+def _sccs(graph):
+    # iterative Tarjan
+    index, low, on_stack, stack, res = {}, {}, set(), [], []
+    counter = 0
+    for root in list(graph):
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while len(work) > 0:
+            node, k = work.pop()
+            if k == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack.add(node)
+            successors = graph.get(node, [])
+            if k < len(successors):
+                work.append((node, k+1))
+                w = successors[k]
+                if w not in index:
+                    work.append((w, 0))
+                elif w in on_stack:
+                    low[node] = min(low[node], index[w])
+                continue
+            if low[node] == index[node]:
+                scc = []
+                while True:
+                    w = stack.pop()
+                    on_stack.discard(w)
+                    scc.append(w)
+                    if w == node:
+                        break
+                if len(scc) > 1:
+                    res.append(scc)
+            if len(work) > 0:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+    return res
+
+def preprocess_model(model, protected_vars, debug = False):
+    return PreprocessedModel(model, protected_vars, debug=debug)
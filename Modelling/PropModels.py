@@ -1,4 +1,6 @@
-from LogicOptimisation.QMC import QMC_optimise_CNF, QMC_THREADS
+from LogicOptimisation.QMC import QMC_optimise_CNF
+from LogicOptimisation.Espresso import espresso_optimise_CNF
+from .DiskCache import get_model_cache
 from bitarrays import bitarray
 from bitarrays.bitarray import BitArray
 from bitarrays.bitset import BitSet
@@ -8,8 +10,7 @@ from math import log2, inf
 
 def transition_matrix(f, input_size, output_size):
     res = BitArray((2**output_size, 2**input_size))
-    for i in range(2**input_size):
-        res.set((f(i), i))
+    res.set_many((np.fromiter((f(i) for i in range(2**input_size)), dtype=np.uint64, count=2**input_size), np.arange(2**input_size)))
     return res
 
 def ANF_matrix(f, input_size, output_size):
@@ -24,10 +25,34 @@ def ANF_prop_table(F, input_mask, output_mask):
     res.ORdown(1, input_mask)
     return res
 
+# CNF minimisation engines, a component selects one by its minimiser attribute
+MINIMISERS = {"QMC": QMC_optimise_CNF, "espresso": espresso_optimise_CNF}
+
+def _minimise(F, truth_table, dont_care):
+    return MINIMISERS[getattr(F, "minimiser", "QMC")](truth_table, dont_care)
+
+def _model_cache_key(kind, F, *args):
+    # the models only depend on the lookup table of F and the minimiser
+    return (kind, getattr(F, "minimiser", "QMC"), F.input_size, F.output_size, tuple(int(F(x)) for x in range(2**F.input_size))) + args
+
+def _cached(key, compute, clauses = lambda res: res):
+    cache = get_model_cache()
+    if cache is None:
+        return compute()
+    res = cache.get(key)
+    if res is None:
+        res = compute()
+        # models with an empty clause are not stored
+        if all(len(clause) > 0 for clause in clauses(res)):
+            cache.put(key, res)
+    return res
+
 def compute_parity_propagation_model(F, input_mask, output_mask):
-    m = ANF_prop_table(F, input_mask, output_mask)
-    dont_care = BitSet(2**(F.input_size + F.output_size))
-    return QMC_optimise_CNF(m, dont_care)
+    def compute():
+        m = ANF_prop_table(F, input_mask, output_mask)
+        dont_care = BitSet(2**(F.input_size + F.output_size))
+        return _minimise(F, m, dont_care)
+    return _cached(_model_cache_key("parity", F, input_mask, output_mask), compute)
 
 def UT_matrix(f, input_size, output_size):
     def row_transform(M):
@@ -63,17 +88,19 @@ def to_ord(v):
     return log2(int(abs(v)) & (-int(abs(v))))
 
 def compute_UT_propagation_model(F):
+    return _cached(_model_cache_key("UT", F), lambda: _compute_UT_propagation_model(F), lambda res: res[0])
+
+def _compute_UT_propagation_model(F):
     
-    ov = np.vectorize(to_ord)
     M = UT_matrix(F, F.input_size, F.output_size)
-    M_ord = ov(M)
-    n_extra_vars = int(np.max(np.ma.masked_invalid(M_ord)))
+    # to_ord of the nonzero entries, the position of the lowest set bit
+    j, i = np.nonzero(M)
+    low = np.abs(M[j, i]) & -np.abs(M[j, i])
+    M_ord = np.log2(low.astype(np.float64)).astype(np.int64)
+    n_extra_vars = int(M_ord.max())
 
     m = BitSet(2**(F.input_size + F.output_size + n_extra_vars))
-    for j in range(2**F.output_size):
-        for i in range(2**F.input_size):
-            if M_ord[j, i] != inf:
-                m.set(((2**int(M_ord[j, i])-1)<<(F.input_size+F.output_size)) + (j << F.input_size) + i)
+    m.set_many((((1 << M_ord) - 1) << (F.input_size+F.output_size)) + (j << F.input_size) + i)
 
     dont_care = BitSet(2**(F.input_size + F.output_size + n_extra_vars))
-    return QMC_optimise_CNF(m, dont_care), n_extra_vars # variables are in order of input, output, power vars, also returns the number of variables used to model the power
\ No newline at end of file
+    return _minimise(F, m, dont_care), n_extra_vars # variables are in order of input, output, power vars, also returns the number of variables used to model the power
\ No newline at end of file
@@ -1,51 +1,114 @@
 from pysat.solvers import Glucose42 as Solver
-from nnf.kissat import solve
-from nnf import And, Or, Var
 from functools import reduce
+from .CNF import CNF
+from .DIMACS import DIMACSWriter
+import subprocess
+import tempfile
+import shutil
+import nnf
+import os
 
-def _clauses2cnf(clauses, assumptions = []):
-    variables_in_clauses = sorted(reduce(set.union, map(lambda x: set(abs(y) for y in x), clauses)))
-    vs = {i:Var(i) for i in variables_in_clauses}
-    formula = And([Or([vs[x] if x > 0 else ~vs[-x] for x in clause]) for clause in clauses] + [Or([vs[x] if x > 0 else ~vs[-x]]) for x in assumptions])
-    return vs, formula
+def _clause_vars(clauses):
+    if isinstance(clauses, CNF):
+        return sorted(clauses.vars())
+    return sorted(reduce(set.union, map(lambda x: set(abs(y) for y in x), clauses), set()))
 
-def _nnf_model2pysat_model(vs, model):
-    res = []
-    for v in sorted(vs.keys()):
-        if model[v]:
-            res.append(v)
+class IncrementalSolver(object):
+    """
+    Keeps a single in-process solver alive for a fixed model.
+    Clauses added for one query (e.g. blocking clauses) are guarded by a fresh selector variable,
+    such that they can be retired afterwards without affecting later queries.
+    """
+
+    def __init__(self, clauses, top_var = None):
+        self.model_vars = _clause_vars(clauses)
+        self.n_model_vars = self.model_vars[-1] if len(self.model_vars) > 0 else 0
+        self.top_var = self.n_model_vars if top_var is None else max(top_var, self.n_model_vars)
+        self.solver = Solver(bootstrap_with=clauses)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.delete()
+
+    def delete(self):
+        if self.solver is not None:
+            self.solver.delete()
+            self.solver = None
+
+    def new_var(self):
+        self.top_var += 1
+        return self.top_var
+
+    def add_clauses(self, clauses, selector = None):
+        # clauses are only active when the selector is assumed to be true
+        if selector is None:
+            for clause in clauses:
+                self.solver.add_clause(clause)
         else:
-            res.append(-v)
-    return res
+            for clause in clauses:
+                self.solver.add_clause((-selector,) + tuple(clause))
+
+    def retire(self, selector):
+        if self.solver is not None:
+            self.solver.add_clause((-selector,))
+
+    def solve(self, assumptions = []):
+        return self.solver.solve(assumptions=assumptions)
+
+    def get_model(self):
+        m = self.solver.get_model()
+        # pad with variables that do not occur in any clause
+        if len(m) < self.top_var:
+            m += list(range(-len(m)-1, -self.top_var-1, -1))
+        return m
+
+    def enum_projected_models(self, projected_vars, assumptions = []):
+        selector = self.new_var()
+        assumptions = tuple(assumptions) + (selector,)
+        try:
+            while self.solver.solve(assumptions=assumptions):
+                m = self.get_model()
+                self.solver.add_clause((-selector,) + tuple(-m[v-1] for v in projected_vars))
+                yield m
+        finally:
+            self.retire(selector)
+
+    def enum_models(self, assumptions = []):
+        return self.enum_projected_models(self.model_vars, assumptions)
+
+def _kissat():
+    # the kissat binary on the path, or the one shipped with nnf
+    if shutil.which("kissat") is not None:
+        return "kissat"
+    return os.path.join(os.path.dirname(os.path.abspath(nnf.__file__)), "bin", "kissat")
 
 def SAT_solve(clauses, assumptions = []):
-    # with Solver(bootstrap_with=clauses) as solver:
-    #     res = solver.solve(assumptions=assumptions)
-    # return res
-    return solve(_clauses2cnf(clauses, assumptions)[1]) is not None
+    # the clauses are streamed to a DIMACS file for kissat, the assumptions are added as unit clauses
+    fd, path = tempfile.mkstemp(suffix=".cnf")
+    os.close(fd)
+    try:
+        with DIMACSWriter(path) as writer:
+            writer.extend(clauses)
+            for x in assumptions:
+                writer.append((x,))
+        proc = subprocess.run([_kissat(), "-q", "-n", path], stdout=subprocess.PIPE, universal_newlines=True)
+    finally:
+        os.remove(path)
+    if proc.returncode not in (10, 20):
+        raise RuntimeError(f"kissat failed with code {proc.returncode}:\n{proc.stdout}")
+    return proc.returncode == 10
 
 def enum_projected_models(clauses, projected_vars, assumptions=[]):
-    # with Solver(bootstrap_with=clauses) as solver:
-    #     while solver.solve(assumptions=assumptions):
-    #         model = solver.get_model()
-    #         solver.add_clause(tuple(-model[v-1] for v in projected_vars))
-    #         yield model
-    while True:
-        vs, formula = _clauses2cnf(clauses, assumptions)
-        m_inter = solve(formula)
-        if m_inter is None:
-            break
-        m = _nnf_model2pysat_model(vs, m_inter)
-        clauses += (tuple(-m[v-1] for v in projected_vars),)
-        yield m
-
-def enum_models(model, assumptions=[]):
-    # with Solver(bootstrap_with=model) as solver:
-    #     for m in solver.enum_models(assumptions = assumptions):
-    #         yield m
-    model_vars = sorted(reduce(set.union, map(lambda x: set(abs(y) for y in x), clauses)))
-    for m in enum_projected_models(clauses, model_vars, assumptions):
-        yield m
+    with IncrementalSolver(clauses) as solver:
+        for m in solver.enum_projected_models(projected_vars, assumptions):
+            yield m
+
+def enum_models(clauses, assumptions=[]):
+    with IncrementalSolver(clauses) as solver:
+        for m in solver.enum_models(assumptions):
+            yield m
 
 def create_assumptions(vs, x):
     res = []
@@ -62,4 +125,4 @@ def from_assignment(vs, m):
         x <<= 1
         if m[s-1] > 0:
             x |= 1
-    return x
\ No newline at end of file
+    return x
@@ -1,4 +1,4 @@
-from multiprocessing import Pool
+from .Executor import shared_pool
 from functools import partial, reduce
 from itertools import product
 
@@ -9,7 +9,7 @@ def search_simple_properties_mod_2(test, input_size, output_size, is_permutation
     output_modifiers = tuple(1<<x for x in range(output_size))
     
     Bi = [set()]
-    with Pool(num_threads) as pool:
+    with shared_pool(num_threads) as pool:
         while len(Bi) == 1 or len(Bi[-1]) > 0:
             if len(Bi) == 1 and not is_permutation:
                 to_test = [(invmask, x) for x in output_modifiers]
@@ -1,6 +1,8 @@
-from Modelling.SAT_Solving import SAT_solve, enum_models, enum_projected_models
+from Modelling.SAT_Solving import SAT_solve, IncrementalSolver, create_assumptions, from_assignment
+from Modelling.Counting import ParityCounter
+import warnings
 
-def contains_nonzero_trail(model, input_vars, output_vars, u, v, partially_defined_v=False):
+def _trail_assumptions(input_vars, output_vars, u, v, partially_defined_v=False):
     assumptions = []
     for i in range(len(input_vars)):
         assumptions.append((-1+2*((u >> i) & 1))*input_vars[i])
@@ -11,7 +13,17 @@ def contains_nonzero_trail(model, input_vars, output_vars, u, v, partially_defin
     else:
         for i in range(len(output_vars)):
             assumptions.append((-1+2*((v >> i) & 1))*output_vars[i])
-    return SAT_solve(model, assumptions)
+    return assumptions
+
+def contains_nonzero_trail(model, input_vars, output_vars, u, v, partially_defined_v=False):
+    return SAT_solve(model, _trail_assumptions(input_vars, output_vars, u, v, partially_defined_v))
+
+def contains_nonzero_trails(model, input_vars, output_vars, queries):
+    # queries is an iterable of (u, v) or (u, v, partially_defined_v)
+    # the model is loaded once and every query is an incremental solve under assumptions, answers are yielded in order
+    with IncrementalSolver(model) as solver:
+        for query in queries:
+            yield solver.solve(_trail_assumptions(input_vars, output_vars, *query))
 
 def contains_key_dependent_trail(model, input_vars, output_vars, key_vars, u, v):
     model += (key_vars, )
@@ -25,31 +37,17 @@ def is_key_dependent(model, input_vars, output_vars, key_vars, u, v):
     for i in range(len(output_vars)):
         assumptions.append((-1+2*((v >> i) & 1))*output_vars[i])
     assumptions = tuple(assumptions)
-    for k in enum_projected_models(model, key_vars, assumptions=assumptions):
-        if sum(1 for _ in enum_models(model, assumptions + k)) % 2 == 1:
-            return True
+    counter = ParityCounter(model)
+    with IncrementalSolver(model) as solver:
+        for k in solver.enum_projected_models(key_vars, assumptions=assumptions):
+            if counter.count(assumptions + create_assumptions(key_vars, from_assignment(key_vars, k))) == 1:
+                return True
     return False
 
 def is_key_dependent_limited(model, input_vars, output_vars, key_vars, u, v, limit=2**6):
-    # returns true if key dependent or when limit is reached
-    model += (key_vars, )
-    assumptions = []
-    for i in range(len(input_vars)):
-        assumptions.append((-1+2*((u >> i) & 1))*input_vars[i])
-    for i in range(len(output_vars)):
-        assumptions.append((-1+2*((v >> i) & 1))*output_vars[i])
-    assumptions = tuple(assumptions)
-    l = 0
-    for k in enum_projected_models(model, key_vars, assumptions=assumptions):
-        c = 0
-        for _ in enum_models(model, assumptions + k):
-            c+= 1
-            l += 1
-            if l > limit:
-                return True
-        if c % 2 == 1:
-            return True
-    return False
+    # the parity is computed exactly, there is no limit any more
+    warnings.warn("is_key_dependent_limited ignores limit and is deprecated, use is_key_dependent", DeprecationWarning, stacklevel=2)
+    return is_key_dependent(model, input_vars, output_vars, key_vars, u, v)
 
 def get_sum(model, input_vars, output_vars, key_vars, u, v):
     assumptions = []
@@ -59,17 +57,15 @@ def get_sum(model, input_vars, output_vars, key_vars, u, v):
         assumptions.append((-1+2*((v >> i) & 1))*output_vars[i])
     assumptions = tuple(assumptions)
     V = set()
-    for k in enum_projected_models(model, key_vars, assumptions=assumptions):
-        if sum(1 for _ in enum_models(model, assumptions + k)) % 2 == 1:
-            km = 0
-            for v in k[::-1]:
-                km <<= 1
-                if v > 0:
-                    km += 1
-            if k in V:
-                V.remove(km)
-            else:
-                V.add(km)
+    counter = ParityCounter(model)
+    with IncrementalSolver(model) as solver:
+        for k in solver.enum_projected_models(key_vars, assumptions=assumptions):
+            km = from_assignment(key_vars, k)
+            if counter.count(assumptions + create_assumptions(key_vars, km)) == 1:
+                if km in V:
+                    V.remove(km)
+                else:
+                    V.add(km)
     return V
 
 def get_key_independent_sum(model, input_vars, output_vars, key_vars, u, v):
@@ -80,20 +76,9 @@ def get_key_independent_sum(model, input_vars, output_vars, key_vars, u, v):
         assumptions.append((-1+2*((v >> i) & 1))*output_vars[i])
     for k in key_vars:
         assumptions.append(-k)
-    return sum(1 for _ in enum_models(model, assumptions)) % 2
+    return ParityCounter(model).count(assumptions)
 
 def get_key_independent_sum_limited(model, input_vars, output_vars, key_vars, u, v, limit=2**6):
-    # returns the key independent sum, except if the limit is reached, then it returns 1
-    assumptions = []
-    for i in range(len(input_vars)):
-        assumptions.append((-1+2*((u >> i) & 1))*input_vars[i])
-    for i in range(len(output_vars)):
-        assumptions.append((-1+2*((v >> i) & 1))*output_vars[i])
-    for k in key_vars:
-        assumptions.append(-k)
-    c = 0
-    for _ in solver.enum_models(assumptions = assumptions):
-        c += 1
-        if c > limit:
-            return 1
-    return c % 2
+    # the parity is computed exactly, there is no limit any more
+    warnings.warn("get_key_independent_sum_limited ignores limit and is deprecated, use get_key_independent_sum", DeprecationWarning, stacklevel=2)
+    return get_key_independent_sum(model, input_vars, output_vars, key_vars, u, v)
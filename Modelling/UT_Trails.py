@@ -1,38 +1,123 @@
-from Modelling.Trails import contains_nonzero_trail, contains_key_dependent_trail, is_key_dependent
-from Modelling.SAT_Solving import enum_projected_models, create_assumptions, from_assignment
-from pysat.card import CardEnc, EncType
-from pysat.formula import IDPool
+from Modelling.Trails import _trail_assumptions
+from Modelling.SAT_Solving import IncrementalSolver, create_assumptions, from_assignment
+from Modelling.Counting import ParityCounter
+from Modelling.Compilation import get_compiled_model
+from Modelling.CNF import CNF, as_cnf
+from Modelling.Preprocessing import preprocess_model
+from pysat.card import ITotalizer
+from pysat.formula import IDPool, WCNF
+from pysat.examples.rc2 import RC2
 from math import inf, log2
-from functools import reduce
+from .Executor import process_pool
 
 def _add_input_reduction(model, input_vars):
-    nvars = max(map(lambda x: max(map(abs, x)), model))
-    pool = IDPool(nvars+1)
+    model = as_cnf(model)
+    pool = IDPool(model.nv+1)
     # modify model to add input reduction
     new_input_vars = tuple(pool.id() for _ in input_vars)
     extra_count_vars = tuple(pool.id() for _ in input_vars)
+    reduction = CNF()
     for i, o, c in zip(new_input_vars, input_vars, extra_count_vars):
-        model += ((i, -o),)
-        model += ((-i, o, c),)
-        model += ((i, -c),)
-        model += ((-o, -c),)
+        reduction.extend(((i, -o), (-i, o, c), (i, -c), (-o, -c)))
 
-    return model, new_input_vars, extra_count_vars
+    return model + reduction, new_input_vars, extra_count_vars
 
-def get_divisibility_no_trail(model, input_vars, output_vars, key_vars, count_vars, u, v, precursor=True, partially_defined_v=False, debug=False):
+def _totalizer(count_vars, top_id):
+    # clauses of an incremental totalizer over count_vars with variables above top_id, and its outputs (see _atmost)
+    if len(count_vars) == 0:
+        return tuple(), tuple()
+    totalizer = ITotalizer(lits=list(count_vars), ubound=len(count_vars), top_id=top_id)
+    clauses, rhs = tuple(tuple(c) for c in totalizer.cnf.clauses), tuple(totalizer.rhs)
+    totalizer.delete()
+    return clauses, rhs
+
+def _bounded_solver(model, count_vars):
+    # model with a single incremental totalizer over count_vars, the bound is set through assumptions (see _atmost)
+    solver = IncrementalSolver(model)
+    clauses, rhs = _totalizer(count_vars, solver.top_var)
+    solver.top_var = max([solver.top_var] + [abs(x) for c in clauses for x in c])
+    solver.add_clauses(clauses)
+    return solver, rhs
+
+def _atmost(rhs, r):
+    # rhs[r] is implied when more than r count vars are true
+    return (-rhs[r],) if r < len(rhs) else tuple()
+
+def _weight(count_vars, m):
+    return sum(1 for c in count_vars if m[c-1] > 0)
+
+def _minimise_bound(solver, rhs, count_vars, assumptions, search="up", debug=False):
+    # smallest r such that there is a model with at most r true count vars, assuming one exists
+    if search == "up":
+        r = 0
+        while not solver.solve(assumptions + _atmost(rhs, r)):
+            r += 1
+            if debug:
+                print(f"debug: at least divisible by 2^{r}")
+    elif search == "down":
+        # every model gives an upper bound, tighten it until the bound becomes infeasible
+        solver.solve(assumptions)
+        r = _weight(count_vars, solver.get_model())
+        while r > 0 and solver.solve(assumptions + _atmost(rhs, r-1)):
+            r = _weight(count_vars, solver.get_model())
+            if debug:
+                print(f"debug: at most divisible by 2^{r}")
+    elif search == "bisect":
+        solver.solve(assumptions)
+        lo, r = 0, _weight(count_vars, solver.get_model())
+        while lo < r:
+            mid = (lo + r) // 2
+            if solver.solve(assumptions + _atmost(rhs, mid)):
+                r = _weight(count_vars, solver.get_model())
+            else:
+                lo = mid + 1
+            if debug:
+                print(f"debug: divisible by between 2^{lo} and 2^{r}")
+    else:
+        raise ValueError(f"unknown search strategy {search}")
+    return r
+
+def get_divisibility_no_trail(model, input_vars, output_vars, key_vars, count_vars, u, v, precursor=True, partially_defined_v=False, debug=False, search="up"):
+    # search is either "up", "down" or "bisect", the order in which the bound on the count vars is moved,
+    # or "maxsat" to compute the minimum weight with a single MaxSAT call (see get_dominant_trail)
     if precursor:
         model, input_vars, ecv = _add_input_reduction(model, input_vars)
         count_vars += ecv
-    if not contains_nonzero_trail(model, input_vars, output_vars, u, v):
-        return inf
-    r = 0
-    nvars = max(map(lambda x: max(map(abs, x)), model))
-    while not contains_nonzero_trail(model + tuple(CardEnc.equals(count_vars, r, top_id=nvars+1).clauses), input_vars, output_vars, u, v, partially_defined_v):
-        r += 1
-        if debug:
-            print(f"debug: at least divisible by 2^{r}")
+    if search == "maxsat":
+        return _dominant_trail(model, input_vars, output_vars, count_vars, u, v, partially_defined_v)[0]
+    solver, rhs = _bounded_solver(model, count_vars)
+    with solver:
+        if not solver.solve(_trail_assumptions(input_vars, output_vars, u, v)):
+            return inf
+        assumptions = tuple(_trail_assumptions(input_vars, output_vars, u, v, partially_defined_v))
+        return _minimise_bound(solver, rhs, count_vars, assumptions, search, debug)
 
-    return r
+def _dominant_trail(model, input_vars, output_vars, count_vars, u, v, partially_defined_v=False, hard=()):
+    if partially_defined_v:
+        with IncrementalSolver(model) as solver:
+            if not solver.solve(_trail_assumptions(input_vars, output_vars, u, v)):
+                return inf, None
+    # the trail is hard, every active count var costs 1
+    wcnf = WCNF()
+    wcnf.extend(model)
+    wcnf.extend(hard)
+    for x in _trail_assumptions(input_vars, output_vars, u, v, partially_defined_v):
+        wcnf.append((x,))
+    for c in count_vars:
+        wcnf.append((-c,), weight=1)
+    with RC2(wcnf) as rc2:
+        m = rc2.compute()
+        if m is None:
+            return inf, None
+        return rc2.cost, m
+
+def get_dominant_trail(model, input_vars, output_vars, key_vars, count_vars, u, v, precursor=True, partially_defined_v=False):
+    # a trail with the minimum number of active count vars from a single MaxSAT call
+    # returns the divisibility (as get_divisibility_no_trail) and the model of the trail, or (inf, None) if there is no trail
+    if precursor:
+        model, input_vars, ecv = _add_input_reduction(model, input_vars)
+        count_vars += ecv
+    return _dominant_trail(model, input_vars, output_vars, count_vars, u, v, partially_defined_v)
         
 def get_divisibility_no_key_dependent_trail(model, input_vars, output_vars, key_vars, count_vars, u, v, precursor=True):
     if precursor:
@@ -46,26 +131,27 @@ def get_divisibility_no_key_dependent_trail(model, input_vars, output_vars, key_
         assumptions.append((-1+2*((v >> i) & 1))*output_vars[i])
     for k in key_vars:
             assumptions.append(-k)
+    assumptions = tuple(assumptions)
     
-    if not contains_nonzero_trail(model, input_vars, output_vars, u, v):
-        return inf
-
-    enumeration_vars = reduce(set.union, map(lambda x: set(abs(y) for y in x), model))
-    d = 0
-    card_enc = tuple(CardEnc.equals(count_vars, d, top_id=len(enumeration_vars)+1).clauses)
-    while True:
-        if contains_key_dependent_trail(model + card_enc, input_vars, output_vars, key_vars, u, v):
-            return d
-        s = sum(1 for _ in enum_projected_models(model + card_enc, enumeration_vars, assumptions = assumptions))
-        if s > 0:
-            if s % 2 == 1:
+    # one counter and one solver for all bounds, both over the model with the totalizer of _bounded_solver
+    model = as_cnf(model)
+    enumeration_vars = model.vars()
+    totalizer, rhs = _totalizer(count_vars, model.nv)
+    counter = ParityCounter(model + totalizer, enumeration_vars)
+    with IncrementalSolver(model + totalizer) as solver:
+        if not solver.solve(_trail_assumptions(input_vars, output_vars, u, v)):
+            return inf
+        # the bound is only raised when there are no trails of lower weight, so at most d is the same as exactly d
+        key_dependent = solver.new_var()
+        solver.add_clauses((key_vars,), key_dependent)
+        d = 0
+        while True:
+            if solver.solve(tuple(_trail_assumptions(input_vars, output_vars, u, v)) + _atmost(rhs, d) + (key_dependent,)):
                 return d
-            else:
-                return d + 1
-        d += 1
-        # if d > u.bit_count():
-        #     return inf
-        card_enc = tuple(CardEnc.equals(count_vars, d, top_id=len(enumeration_vars)+1).clauses)
+            if solver.solve(assumptions + _atmost(rhs, d)):
+                # only key independent trails of weight d, their number is even exactly if the divisibility is higher
+                return d + 1 - counter.count(assumptions + _atmost(rhs, d))
+            d += 1
 
 def get_divisibility_no_key_dependence(model, input_vars, output_vars, key_vars, count_vars, u, v, precursor=True, return_key_mon = False):
     if precursor:
@@ -73,63 +159,119 @@ def get_divisibility_no_key_dependence(model, input_vars, output_vars, key_vars,
         count_vars += ecv
 
     assumptions = create_assumptions(input_vars, u) + create_assumptions(output_vars, v)
-    
-    if not contains_nonzero_trail(model, input_vars, output_vars, u, v):
-        return inf
 
-    enumeration_vars = reduce(set.union, map(lambda x: set(abs(y) for y in x), model))
-    d = 0
-    while True:
-        key_mons = {}
-        # collect new key candidates
-        card_enc = tuple(CardEnc.equals(count_vars, d, top_id=len(enumeration_vars)+1).clauses)
-        exists_models = False
-        for m in enum_projected_models(model + card_enc, key_vars, assumptions = assumptions):
-            exists_models = True
-            km = from_assignment(key_vars, m)
-            assumptions2 = create_assumptions(key_vars, km)
-            c = 0
-            for m in enum_projected_models(model + card_enc, enumeration_vars, assumptions = assumptions+assumptions2):
-                c += 1
-            if c % 2 == 1:
+    # one counter and one solver for all bounds, both over the model with the totalizer of _bounded_solver
+    model = as_cnf(model)
+    enumeration_vars = model.vars()
+    totalizer, rhs = _totalizer(count_vars, model.nv)
+    counter = ParityCounter(model + totalizer, enumeration_vars)
+    with IncrementalSolver(model + totalizer) as solver:
+        if not solver.solve(assumptions):
+            return inf
+        d = 0
+        while True:
+            # the bound is only raised when there are no trails of lower weight, so at most d is the same as exactly d
+            bounded = tuple(assumptions) + _atmost(rhs, d)
+            exists_models = False
+            for m in solver.enum_projected_models(key_vars, assumptions = bounded):
+                exists_models = True
+                km = from_assignment(key_vars, m)
+                if counter.count(bounded + create_assumptions(key_vars, km)) == 1:
+                    if return_key_mon:
+                        return d, km
+                    else:
+                        return d
+
+            if exists_models:
                 if return_key_mon:
-                    return d, km
-                else:
-                    return d
-        
-        if exists_models:
-            if return_key_mon:
-                return d + 1, None
-            return d + 1
-        d += 1
-        # if d > u.bit_count():
-        #     if return_higher_divisibility_poly:
-        #         return inf, None
-        #     return inf
-
-def get_divisibility_of_key_dependence_no_trail(model, input_vars, output_vars, key_vars, count_vars, u, v, precursor=True):
+                    return d + 1, None
+                return d + 1
+            d += 1
+
+def get_divisibility_of_key_dependence_no_trail(model, input_vars, output_vars, key_vars, count_vars, u, v, precursor=True, search="up"):
     if precursor:
         model, input_vars, ecv = _add_input_reduction(model, input_vars)
         count_vars += ecv
 
-    assumptions = []
-    for i in range(len(input_vars)):
-        assumptions.append((-1+2*((u >> i) & 1))*input_vars[i])
-    for i in range(len(output_vars)):
-        assumptions.append((-1+2*((v >> i) & 1))*output_vars[i])
-    for k in key_vars:
-            assumptions.append(-k)
-    
-    if not contains_nonzero_trail(model, input_vars, output_vars, u, v):
+    if search == "maxsat":
+        # key dependent trails are those with at least one active key variable
+        return _dominant_trail(model, input_vars, output_vars, count_vars, u, v, hard=(key_vars,))[0]
+    solver, rhs = _bounded_solver(model, count_vars)
+    with solver:
+        assumptions = tuple(_trail_assumptions(input_vars, output_vars, u, v))
+        if not solver.solve(assumptions):
+            return inf
+        # key dependent trails are those with at least one active key variable
+        key_dependent = solver.new_var()
+        solver.add_clauses((key_vars,), key_dependent)
+        if not solver.solve(assumptions + (key_dependent,)):
+            # no key dependent trail of any weight: the key dependence has no divisibility bound, so the result is inf
+            # (as with the maxsat search) instead of searching for a bound that does not exist
+            return inf
+        return _minimise_bound(solver, rhs, count_vars, assumptions + (key_dependent,), search)
+
+_sweep_state = {}
+def _init_sweep_worker(model, input_vars, output_vars, count_vars, u, search):
+    # every worker keeps one solver with the bound encoding for all of its queries
+    _sweep_state["input_vars"], _sweep_state["output_vars"], _sweep_state["count_vars"] = input_vars, output_vars, count_vars
+    _sweep_state["model"], _sweep_state["u"], _sweep_state["search"] = model, u, search
+    if search != "maxsat":
+        _sweep_state["solver"], _sweep_state["rhs"] = _bounded_solver(model, count_vars)
+
+def _release_sweep_worker():
+    if "solver" in _sweep_state:
+        _sweep_state["solver"].delete()
+    _sweep_state.clear()
+
+def _sweep_task(v, partially_defined_v):
+    s = _sweep_state
+    if s["search"] == "maxsat":
+        return v, _dominant_trail(s["model"], s["input_vars"], s["output_vars"], s["count_vars"], s["u"], v, partially_defined_v)[0]
+    if not s["solver"].solve(_trail_assumptions(s["input_vars"], s["output_vars"], s["u"], v)):
+        return v, inf
+    assumptions = tuple(_trail_assumptions(s["input_vars"], s["output_vars"], s["u"], v, partially_defined_v))
+    return v, _minimise_bound(s["solver"], s["rhs"], s["count_vars"], assumptions, s["search"])
+
+def _sweep_task_star(args):
+    return _sweep_task(*args)
+
+def sweep_divisibility_no_trail(model, input_vars, output_vars, key_vars, count_vars, u, vs, precursor=True, partially_defined_v=False, search="up", NThreads=None, preprocess=False):
+    # get_divisibility_no_trail for every output mask in vs, yields (v, divisibility) as soon as a query completes
+    # with preprocess, the model is simplified once (see Modelling.Preprocessing) before it is sent to the workers
+    if precursor:
+        model, input_vars, ecv = _add_input_reduction(model, input_vars)
+        count_vars += ecv
+    if preprocess:
+        model = preprocess_model(model, tuple(input_vars) + tuple(output_vars) + tuple(key_vars) + tuple(count_vars)).clauses
+    # masks with more active bits tend to give larger bounds and take longer, so they are scheduled first
+    vs = sorted(vs, key=lambda v: -v.bit_count())
+    with process_pool(NThreads, _init_sweep_worker, (model, input_vars, output_vars, count_vars, u, search), _release_sweep_worker) as pool:
+        for res in pool.imap_unordered(_sweep_task_star, ((v, partially_defined_v) for v in vs)):
+            yield res
+
+def get_divisibility_table_no_trail(model, input_vars, output_vars, key_vars, count_vars, u, vs, precursor=True, partially_defined_v=False, search="up", NThreads=None, debug=False, preprocess=False):
+    # mask -> divisibility for every output mask in vs
+    table = {}
+    for v, d in sweep_divisibility_no_trail(model, input_vars, output_vars, key_vars, count_vars, u, vs, precursor, partially_defined_v, search, NThreads, preprocess):
+        table[v] = d
+        if debug:
+            print(f"debug: {len(table)}/{len(vs)} v = {v:#x} divisible by 2^{d}")
+    return table
+
+def compile_UT_model(model, input_vars, output_vars, key_vars, count_vars, u=None, precursor=True):
+    # compiles the model once, the result can be queried by the *_compiled functions for any v (and any u if u is None)
+    if precursor:
+        model, input_vars, ecv = _add_input_reduction(model, input_vars)
+        count_vars += ecv
+    assumptions = tuple() if u is None else create_assumptions(input_vars, u)
+    return get_compiled_model(model, assumptions=assumptions), input_vars, output_vars, key_vars, count_vars
+
+def get_divisibility_no_trail_compiled(compiled, input_vars, output_vars, key_vars, count_vars, u, v, partially_defined_v=False):
+    # same result as get_divisibility_no_trail, with compiled, input_vars, ... as returned by compile_UT_model
+    if not compiled.exists(_trail_assumptions(input_vars, output_vars, u, v)):
         return inf
+    return compiled.min_weight(count_vars, _trail_assumptions(input_vars, output_vars, u, v, partially_defined_v))
 
-    enumeration_vars = reduce(set.union, map(lambda x: set(abs(y) for y in x), model))
-    d = 0
-    card_enc = tuple(CardEnc.equals(count_vars, d, top_id=len(enumeration_vars)+1).clauses)
-    while True:
-        if contains_key_dependent_trail(model + card_enc, input_vars, output_vars, key_vars, u, v):
-            return d
-        d += 1
-        # if d > u.bit_count():
-        #     return inf
-        card_enc = tuple(CardEnc.equals(count_vars, d, top_id=len(enumeration_vars)+1).clauses)
\ No newline at end of file
+def get_trail_weight_distribution_compiled(compiled, input_vars, output_vars, key_vars, count_vars, u, v, max_weight=None, modulus=None):
+    # res[w] is the number of trails with exactly w active count variables
+    return compiled.weight_distribution(count_vars, _trail_assumptions(input_vars, output_vars, u, v), max_weight, modulus)
@@ -1,5 +1,6 @@
 from bitarrays.bitset import BitSet
 from functools import reduce
+import numpy as np
 
 def to_index(pos, shape):
     if isinstance(pos, int):
@@ -15,14 +16,18 @@ def from_index(i, shape):
         pos[j], i = divmod(i, reduce(int.__mul__, shape[j+1:], 1))
     return pos
 
+def to_indices(pos, shape):
+    # to_index for arrays of positions, pos is a tuple with one array per dimension (as in numpy indexing) or an array of indices
+    if not isinstance(pos, tuple):
+        return np.asarray(pos, dtype=np.uint64)
+    i = np.zeros(np.broadcast(*pos).shape, dtype=np.uint64)
+    for j in range(len(shape)):
+        i += np.asarray(pos[j], dtype=np.uint64) * np.uint64(reduce(int.__mul__, shape[j+1:], 1))
+    return i
+
 def print_matrix(ba):
-    s = str(ba)[::-1]
-    smod = ""
-    for i in range(ba.shape[0]):
-        for j in range(ba.shape[1]):
-            smod += s[to_index((i, j), ba.shape)]
-        smod += "\n"
-    print(smod)
+    rows = np.where(ba.to_bools().reshape(ba.shape), ord("1"), ord("0")).astype(np.uint8)
+    print("".join(row.tobytes().decode() + "\n" for row in rows))
 
 class SuppBitArrayIterator:
     def __init__(self, iterator, shape):
@@ -50,6 +55,15 @@ class BitArray(BitSet):
     def test(self, pos):
         return super().test(to_index(pos, self.shape))
 
+    def set_many(self, pos):
+        super().set_many(to_indices(pos, self.shape))
+
+    def unset_many(self, pos):
+        super().unset_many(to_indices(pos, self.shape))
+
+    def test_many(self, pos):
+        return super().test_many(to_indices(pos, self.shape))
+
     def __iter__(self):
         return SuppBitArrayIterator(super().__iter__(), self.shape)
 
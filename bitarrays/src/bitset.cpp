@@ -2,6 +2,7 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/operators.h>
 #include <pybind11/stl.h>
+#include <pybind11/numpy.h>
 
 namespace py = pybind11;
 using namespace pybind11::literals;
@@ -106,31 +107,34 @@ SuppIterator BitSet::supp() const
     return SuppIterator(this);
 }
 
-void BitSet::operator&=(const BitSet &other)
+BitSet &BitSet::operator&=(const BitSet &other)
 {
     assert(s == other.size());
     for (std::size_t i = 0; i < data.size(); i++)
     {
         data[i] &= other.data[i];
     }
+    return *this;
 }
 
-void BitSet::operator|=(const BitSet &other)
+BitSet &BitSet::operator|=(const BitSet &other)
 {
     assert(s == other.size());
     for (std::size_t i = 0; i < data.size(); i++)
     {
         data[i] |= other.data[i];
     }
+    return *this;
 }
 
-void BitSet::operator^=(const BitSet &other)
+BitSet &BitSet::operator^=(const BitSet &other)
 {
     assert(s == other.size());
     for (std::size_t i = 0; i < data.size(); i++)
     {
         data[i] ^= other.data[i];
     }
+    return *this;
 }
 
 std::string BitSet::to_string(const char zero, const char one) const
@@ -178,6 +182,87 @@ inline void BitSet::ORdown(const std::size_t mask) { transform<op::or_down>(mask
 inline void BitSet::LESSup(const std::size_t mask) { transform<op::less_up>(mask); }
 inline void BitSet::MOREdown(const std::size_t mask) { transform<op::more_down>(mask); }
 
+std::vector<std::pair<std::size_t, std::size_t>> BitSet::prime_implicants_complement(std::size_t start, std::size_t stop) const
+{
+    // for every a in [start, stop) that is not in the set, the pairs (a, u) with u & a == 0 and u maximal
+    // such that the subcube a + span(u) does not intersect the set
+    std::vector<std::pair<std::size_t, std::size_t>> res;
+    BitSet X(s);
+    stop = std::min(stop, s);
+    for (std::size_t a = start; a < stop; a++)
+    {
+        if (test(a))
+            continue;
+        // X = ~(a + P)
+        X.data = data;
+        X.swap(a);
+        // X = ~upperclosure(X)
+        X.ORup();
+        X.flip();
+        // X = maxset(X)
+        X.ORdown();
+        X.MOREdown();
+        for (std::size_t i = 0; i < X.data.size(); i++)
+        {
+            uint64_t word = X.data[i];
+            while (word != 0)
+            {
+                std::size_t u = (i << 6U) + std::countr_zero(word);
+                word &= word - 1;
+                if (u >= s)
+                    break;
+                if ((u & a) == 0)
+                    res.emplace_back(a, u);
+            }
+        }
+    }
+    return res;
+}
+
+// bulk versions of set, unset and test, false (and nothing changed) if an index is out of range
+bool BitSet::set_many(const uint64_t *indices, const std::size_t n)
+{
+    for (std::size_t i = 0; i < n; i++)
+        if (indices[i] >= s)
+            return false;
+    for (std::size_t i = 0; i < n; i++)
+        data[indices[i] >> 6ULL] |= 1ULL << (indices[i] % 64ULL);
+    return true;
+}
+
+bool BitSet::unset_many(const uint64_t *indices, const std::size_t n)
+{
+    for (std::size_t i = 0; i < n; i++)
+        if (indices[i] >= s)
+            return false;
+    for (std::size_t i = 0; i < n; i++)
+        data[indices[i] >> 6ULL] &= ~(1ULL << (indices[i] % 64ULL));
+    return true;
+}
+
+bool BitSet::test_many(const uint64_t *indices, const std::size_t n, bool *res) const
+{
+    for (std::size_t i = 0; i < n; i++)
+        if (indices[i] >= s)
+            return false;
+    for (std::size_t i = 0; i < n; i++)
+        res[i] = test(indices[i]);
+    return true;
+}
+
+void BitSet::from_bools(const bool *values)
+{
+    clear();
+    for (std::size_t i = 0; i < s; i++)
+        data[i >> 6ULL] |= ((uint64_t) values[i]) << (i % 64ULL);
+}
+
+void BitSet::to_bools(bool *res) const
+{
+    for (std::size_t i = 0; i < s; i++)
+        res[i] = test(i);
+}
+
 std::partial_ordering operator<=>(const BitSet &lhs, const BitSet &rhs)
 {
     assert(lhs.data.size() == rhs.data.size());
@@ -238,7 +323,12 @@ PYBIND11_MODULE(bitset, m)
     py::class_<SuppIterator>(m, "SuppIterator")
         .def("__next__", &SuppIterator::next);
 
-    py::class_<BitSet>(m, "BitSet")
+    using indices_t = py::array_t<uint64_t, py::array::c_style | py::array::forcecast>;
+    using bools_t = py::array_t<bool, py::array::c_style | py::array::forcecast>;
+
+    // the words of a BitSet are exposed through the buffer protocol (np.asarray(bs) or bs.words()) without a copy
+    // the view is invalidated by join, bits past size() in the last word have to stay zero
+    py::class_<BitSet>(m, "BitSet", py::buffer_protocol())
         .def(py::init<const std::size_t>())
         .def(py::init<const BitSet &>())
         .def("set", &BitSet::set)
@@ -262,6 +352,60 @@ PYBIND11_MODULE(bitset, m)
         .def("ORdown", &BitSet::ORdown, py::arg("mask") = -1ULL)
         .def("LESSup", &BitSet::LESSup, py::arg("mask") = -1ULL)
         .def("MOREdown", &BitSet::MOREdown, py::arg("mask") = -1ULL)
+        .def("prime_implicants_complement", &BitSet::prime_implicants_complement, py::arg("start") = 0, py::arg("stop") = -1ULL,
+             py::call_guard<py::gil_scoped_release>())
+        .def_buffer([](BitSet &bs) -> py::buffer_info
+                    { return py::buffer_info(bs.data.data(), sizeof(uint64_t), py::format_descriptor<uint64_t>::format(), 1,
+                                             {bs.data.size()}, {sizeof(uint64_t)}); })
+        .def("words", [](py::object self)
+             {
+                 BitSet &bs = self.cast<BitSet &>();
+                 return py::array_t<uint64_t>({bs.data.size()}, {sizeof(uint64_t)}, bs.data.data(), self); })
+        .def("set_many", [](BitSet &bs, indices_t indices)
+             {
+                 bool ok;
+                 {
+                     py::gil_scoped_release release;
+                     ok = bs.set_many(indices.data(), indices.size());
+                 }
+                 if (!ok)
+                     throw py::index_error("index out of range"); })
+        .def("unset_many", [](BitSet &bs, indices_t indices)
+             {
+                 bool ok;
+                 {
+                     py::gil_scoped_release release;
+                     ok = bs.unset_many(indices.data(), indices.size());
+                 }
+                 if (!ok)
+                     throw py::index_error("index out of range"); })
+        .def("test_many", [](const BitSet &bs, indices_t indices)
+             {
+                 bools_t res(indices.size());
+                 bool ok;
+                 {
+                     py::gil_scoped_release release;
+                     ok = bs.test_many(indices.data(), indices.size(), res.mutable_data());
+                 }
+                 if (!ok)
+                     throw py::index_error("index out of range");
+                 return res; })
+        .def("to_bools", [](const BitSet &bs)
+             {
+                 bools_t res(bs.size());
+                 {
+                     py::gil_scoped_release release;
+                     bs.to_bools(res.mutable_data());
+                 }
+                 return res; })
+        .def_static("from_bools", [](bools_t values)
+                    {
+                        BitSet bs(values.size());
+                        {
+                            py::gil_scoped_release release;
+                            bs.from_bools(values.data());
+                        }
+                        return bs; })
         .def(py::self &= py::self)
         .def(py::self |= py::self)
         .def(py::self ^= py::self)
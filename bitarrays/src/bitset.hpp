@@ -6,6 +6,7 @@
 #include <string>
 #include <cassert>
 #include <bit>
+#include <utility>
 
 enum class op
 {
@@ -51,9 +52,9 @@ public:
     void clear();
     void flip();
     SuppIterator supp() const;
-    void operator&=(const BitSet &other);
-    void operator|=(const BitSet &other);
-    void operator^=(const BitSet &other);
+    BitSet &operator&=(const BitSet &other);
+    BitSet &operator|=(const BitSet &other);
+    BitSet &operator^=(const BitSet &other);
     std::string to_string(const char zero, const char one) const;
     std::string to_onezero() const;
     void join(const BitSet &other);
@@ -67,6 +68,12 @@ public:
     void ORdown(const std::size_t mask=-1ULL);
     void LESSup(const std::size_t mask=-1ULL);
     void MOREdown(const std::size_t mask=-1ULL);
+    std::vector<std::pair<std::size_t, std::size_t>> prime_implicants_complement(std::size_t start, std::size_t stop) const;
+    bool set_many(const uint64_t *indices, const std::size_t n);
+    bool unset_many(const uint64_t *indices, const std::size_t n);
+    bool test_many(const uint64_t *indices, const std::size_t n, bool *res) const;
+    void from_bools(const bool *values);
+    void to_bools(bool *res) const;
 };
 
 std::partial_ordering operator<=>(const BitSet &lhs, const BitSet &rhs);
@@ -0,0 +1,11 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# tests never use the on-disk model cache in the home directory
+os.environ["UT_MODEL_CACHE"] = ""
+# galois runs numba kernels on TBB threads, a TBB pool in a process that forks workers hangs at exit
+os.environ.setdefault("NUMBA_THREADING_LAYER", "workqueue")
+# enough workers that the pool code paths are used on small machines
+os.environ.setdefault("UT_WORKERS", "4")
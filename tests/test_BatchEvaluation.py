@@ -0,0 +1,35 @@
+import numpy as np
+from Construction.Components import SBox
+from Construction.CompoundFunction import CompoundFunction, INPUT_ID, OUTPUT_ID
+from Construction.IteratedCipher import construct_iterated_cipher
+from Construction.Linear import Linear, linear_to_compound_COPY_XOR
+from Construction.BatchEvaluation import evaluate_batch, to_lanes, from_lanes
+from galois import GF2
+
+S = SBox(4, 4, [0xC, 5, 6, 0xB, 9, 0, 0xA, 0xD, 3, 0xE, 0xF, 8, 4, 7, 1, 2])
+
+def round_function(L):
+    f = CompoundFunction(8, 8)
+    ids = [f.add_component(S) for _ in range(2)]
+    idl = f.add_component(L)
+    for i in range(8):
+        f.connect_components(INPUT_ID, i, ids[i//4], i % 4)
+        f.connect_components(ids[i//4], i % 4, idl, i)
+        f.connect_components(idl, i, OUTPUT_ID, i)
+    return f
+
+def test_lanes_round_trip():
+    rng = np.random.default_rng(0)
+    x = rng.integers(0, 2**63, 100, dtype=np.uint64)
+    assert (from_lanes(to_lanes(x, 64), 100) == x).all()
+    y = rng.integers(0, 2**63, (100, 3), dtype=np.uint64)
+    assert (from_lanes(to_lanes(y, 150), 100) == y & np.array([2**64-1, 2**64-1, 2**22-1], dtype=np.uint64)).all()
+
+def test_evaluate_batch_matches_scalar_evaluation():
+    rng = np.random.default_rng(1)
+    mat = GF2(rng.integers(0, 2, (8, 8)))
+    for L in (Linear(mat), linear_to_compound_COPY_XOR(Linear(mat))):
+        f = construct_iterated_cipher([round_function(L)]*3, [0xff, 0x0f, 0xff, 0xf0])
+        x = rng.integers(0, 2**8, 300, dtype=np.uint64)
+        k = rng.integers(0, 2**f.n_key_bits, 300, dtype=np.uint64)
+        assert evaluate_batch(f, x, k).tolist() == [f(int(a), int(b)) for a, b in zip(x, k)]
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from bitarrays.bitset import BitSet
+from bitarrays.bitarray import BitArray
+
+def test_bulk_operations_match_single_bits():
+    rng = np.random.default_rng(1)
+    for size in (1, 63, 64, 65, 1000):
+        values = rng.random(size) < 0.3
+        bs = BitSet.from_bools(values)
+        assert bs.count() == values.sum() and all(bs.test(i) == values[i] for i in range(size))
+        assert (bs.to_bools() == values).all()
+        indices = rng.integers(0, size, 20)
+        assert (bs.test_many(indices) == values[indices]).all()
+        other = BitSet(size)
+        other.set_many(np.flatnonzero(values))
+        assert other == bs
+        other.unset_many(indices)
+        values[indices] = False
+        assert (other.to_bools() == values).all()
+        with pytest.raises(IndexError):
+            other.set_many([size])
+
+def test_words_are_a_view():
+    bs = BitSet(130)
+    bs.set_many([0, 64, 129])
+    words = bs.words()
+    assert words.dtype == np.uint64 and words.tolist() == [1, 1, 2] and np.asarray(bs).tolist() == [1, 1, 2]
+    words[1] |= np.uint64(1 << 5)
+    assert bs.test(69)
+    del bs
+    assert words.tolist() == [1, 33, 2]
+
+def test_bitarray_bulk_positions():
+    ba = BitArray((4, 8))
+    rows, cols = np.array([0, 3, 2]), np.array([7, 0, 5])
+    ba.set_many((rows, cols))
+    assert [ba.test((r, c)) for r, c in zip(rows, cols)] == [True]*3 and ba.count() == 3
+    assert (ba.to_bools().reshape(ba.shape) == np.isin(np.arange(32), rows*8 + cols).reshape(4, 8)).all()
+    assert ba.test_many((rows, cols)).all() and not ba.test_many((rows, (cols + 1) % 8)).any()
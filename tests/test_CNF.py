@@ -0,0 +1,59 @@
+import pickle
+from Modelling.CNF import CNF
+from Modelling.SAT_Solving import IncrementalSolver
+
+CLAUSES = ((1, -2), (3,), (-4, 2, 5), (), (-1, -5))
+
+def test_cnf_behaves_like_tuple_of_clauses():
+    cnf = CNF(CLAUSES)
+    assert tuple(cnf) == CLAUSES and len(cnf) == len(CLAUSES) and cnf == CLAUSES
+    assert cnf[2] == CLAUSES[2] and cnf[-1] == CLAUSES[-1]
+    assert cnf.nv == 5 and cnf.vars() == {1, 2, 3, 4, 5}
+    assert cnf + ((6, 7),) == CLAUSES + ((6, 7),)
+    assert ((6, 7),) + cnf == ((6, 7),) + CLAUSES
+    assert cnf[1:3] == CLAUSES[1:3] and cnf[::2] == CLAUSES[::2] and cnf[4:1] == ()
+    assert pickle.loads(pickle.dumps(cnf[1:4])) == CLAUSES[1:4]
+
+def test_cnf_growth_and_views():
+    cnf = CNF()
+    for i in range(1, 200):
+        cnf.append((i, -i-1))
+    assert len(cnf) == 199 and cnf.nv == 200 and cnf[150] == (151, -152)
+    view = cnf[10:20]
+    assert view.nv == 21
+    view.append((1000,))
+    # appending to a view copies it, the original is not modified
+    assert len(view) == 11 and view[-1] == (1000,) and cnf[20] == (21, -22) and cnf.nv == 200
+    cnf.extend(view)
+    assert len(cnf) == 210 and cnf.nv == 1000 and tuple(cnf[199:]) == tuple(view)
+
+def test_cnf_solver_hand_off():
+    with IncrementalSolver(CNF(((1, 2), (-1,), (4, -2)))) as solver:
+        assert solver.model_vars == [1, 2, 4] and solver.solve()
+
+def test_relabel_and_new_vars():
+    from pysat.formula import IDPool
+    from Modelling.CNF import new_vars, VarPool
+    cnf = CNF(CLAUSES)
+    vs = [0, 10, 7, 3, 12, 8]
+    assert cnf.relabel(vs) == tuple(tuple(vs[x] if x > 0 else -vs[-x] for x in clause) for clause in CLAUSES)
+    assert cnf[2:].relabel(vs) == cnf.relabel(vs)[2:]
+    for occupied in ([], [[3, 5]]):
+        a, b = IDPool(start_from=2, occupied=occupied), IDPool(start_from=2, occupied=occupied)
+        assert new_vars(a, 6).tolist() == [b.id() for _ in range(6)] and a.id() == b.id()
+    a, b = VarPool(start_from=2), IDPool(start_from=2)
+    assert new_vars(a, 6).tolist() == [b.id() for _ in range(6)] and a.id() == b.id()
+
+def test_instanced_cnf():
+    from Modelling.CNF import InstancedCNF
+    a, b = CNF(((1, -2), (2, 3, -1))), CNF(((-1,), (), (1, 2)))
+    inst = InstancedCNF()
+    inst.add(a, [0, 4, 5, 6])
+    inst.add(b, [0, 7, 8])
+    inst.add(a, [0, 8, 9, 4])
+    inst.extend(((10, -11),))
+    expected = a.relabel([0, 4, 5, 6]) + b.relabel([0, 7, 8]) + a.relabel([0, 8, 9, 4]) + ((10, -11),)
+    assert inst.materialise() == expected and tuple(inst) == tuple(expected)
+    assert len(inst) == len(expected) and inst.nv == 11 and len(inst.templates) == 3
+    vs = list(range(0, 24, 2))
+    assert inst.relabel(vs).materialise() == expected.relabel(vs)
@@ -0,0 +1,39 @@
+from random import Random
+from itertools import product
+from math import inf
+from Modelling.Compilation import CompiledModel, get_compiled_model, _compiled_models, _N_COMPILED_MODELS
+
+def brute_force(clauses, nvars, projected_vars, assumptions=()):
+    res = set()
+    for values in product((False, True), repeat=nvars):
+        lit = lambda x: values[abs(x)-1] == (x > 0)
+        if all(any(lit(x) for x in clause) for clause in clauses) and all(lit(x) for x in assumptions):
+            res.add(tuple(values[v-1] for v in projected_vars))
+    return res
+
+def test_queries_match_brute_force():
+    rng = Random(2)
+    for _ in range(150):
+        nvars = rng.randint(2, 8)
+        cnf = tuple(tuple(rng.choice((-1, 1))*v for v in rng.sample(range(1, nvars+1), rng.randint(1, min(3, nvars)))) for _ in range(rng.randint(1, 10)))
+        projected_vars = list(range(1, nvars+1))
+        compiled = CompiledModel(cnf, projected_vars)
+        weighted_vars = rng.sample(projected_vars, rng.randint(1, nvars))
+        for _ in range(3):
+            assumptions = tuple(rng.choice((-1, 1))*v for v in rng.sample(projected_vars, rng.randint(0, 2)))
+            models = brute_force(cnf, nvars, projected_vars, assumptions)
+            assert compiled.count(assumptions) == len(models)
+            assert compiled.count(assumptions, modulus=2) == len(models) % 2
+            assert compiled.exists(assumptions) == (len(models) > 0)
+            weights = [sum(m[v-1] for v in weighted_vars) for m in models]
+            assert compiled.min_weight(weighted_vars, assumptions) == min(weights, default=inf)
+            distribution = [weights.count(w) for w in range(max(weights, default=-1) + 1)]
+            assert compiled.weight_distribution(weighted_vars, assumptions) == distribution
+        assert compiled.to_nnf().model_count() == compiled.count() or compiled.count() == 0
+
+def test_compiled_model_cache_is_bounded():
+    c = get_compiled_model(((1, 2), (-1, 3)))
+    assert get_compiled_model([[1, 2], [-1, 3]]) is c
+    for i in range(_N_COMPILED_MODELS):
+        get_compiled_model(((1, 2), (-1, 3)), assumptions=(i+1,))
+    assert len(_compiled_models) == _N_COMPILED_MODELS and get_compiled_model(((1, 2), (-1, 3))) is not c
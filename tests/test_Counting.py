@@ -0,0 +1,36 @@
+import sys
+from random import Random
+from itertools import product
+from Modelling.Counting import ParityCounter, count_models_mod_2
+
+def brute_force(clauses, nvars, projected_vars, assumptions=()):
+    res = set()
+    for values in product((False, True), repeat=nvars):
+        lit = lambda x: values[abs(x)-1] == (x > 0)
+        if all(any(lit(x) for x in clause) for clause in clauses) and all(lit(x) for x in assumptions):
+            res.add(tuple(values[v-1] for v in projected_vars))
+    return len(res)
+
+def random_cnf(rng, nvars, nclauses):
+    return tuple(tuple(rng.choice((-1, 1))*v for v in rng.sample(range(1, nvars+1), rng.randint(1, min(3, nvars)))) for _ in range(nclauses))
+
+def test_parity_matches_brute_force():
+    rng = Random(1)
+    for _ in range(200):
+        nvars = rng.randint(2, 9)
+        cnf = random_cnf(rng, nvars, rng.randint(1, 12))
+        used = sorted(set(abs(x) for clause in cnf for x in clause))
+        assert count_models_mod_2(cnf) == brute_force(cnf, nvars, used) % 2
+        projected_vars = sorted(rng.sample(range(1, nvars+1), rng.randint(1, nvars)))
+        counter = ParityCounter(cnf, projected_vars)
+        for _ in range(3):
+            assumptions = tuple(rng.choice((-1, 1))*v for v in rng.sample(range(1, nvars+1), rng.randint(0, 2)))
+            assert counter.count(assumptions) == brute_force(cnf, nvars, projected_vars, assumptions) % 2
+
+def test_deep_branching_does_not_touch_the_recursion_limit():
+    # a chain of equivalences x1 -> x2 -> ... with one free end branches once per variable
+    n = 3000
+    limit = sys.getrecursionlimit()
+    cnf = tuple((-x, x+1) for x in range(1, n)) + tuple((x, -x-1, x+2) for x in range(1, n-1))
+    assert ParityCounter(cnf).count() == (n + 1) % 2
+    assert sys.getrecursionlimit() == limit
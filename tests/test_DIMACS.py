@@ -0,0 +1,42 @@
+import pickle
+import pytest
+from Modelling.CNF import CNF
+from Modelling.DIMACS import DIMACSWriter, BinaryCNFWriter, load_cnf, save_cnf, write_dimacs, read_dimacs
+from Modelling.SAT_Solving import SAT_solve
+
+CLAUSES = ((1, -2), (3,), (-4, 2, 10), (), (-1, -10))
+
+def test_dimacs_round_trip(tmp_path):
+    path = str(tmp_path / "model.cnf")
+    write_dimacs(path, CNF(CLAUSES))
+    assert read_dimacs(path) == CLAUSES
+    with open(path) as f:
+        assert f.readline().split() == ["p", "cnf", "10", "5"]
+    with DIMACSWriter(path) as writer:
+        writer.extend(CNF(CLAUSES[:2]))
+        writer.append(CLAUSES[2])
+        writer.extend(CLAUSES[3:])
+    assert read_dimacs(path) == CLAUSES
+
+def test_binary_round_trip_and_pickling(tmp_path):
+    path = str(tmp_path / "model.bin")
+    with BinaryCNFWriter(path) as writer:
+        writer.extend(CNF(CLAUSES[:2]))
+        writer.extend(CLAUSES[2:])
+    cnf = load_cnf(path)
+    assert cnf == CLAUSES and cnf.nv == 10
+    # memory mapped clauses (and slices of them) are pickled as a reference to the file
+    view = cnf[1:4]
+    data = pickle.dumps(view)
+    assert len(data) < 200 and pickle.loads(data) == CLAUSES[1:4]
+    view.append((5,))
+    assert view.source is None and pickle.loads(pickle.dumps(view)) == CLAUSES[1:4] + ((5,),)
+    save_cnf(path, ())
+    assert load_cnf(path) == ()
+    # the file changed after pickling, the clauses are not mapped again
+    with pytest.raises(ValueError):
+        pickle.loads(data)
+
+def test_SAT_solve():
+    assert SAT_solve(CNF(((1, 2), (-1,), (4, -2)))) and SAT_solve(((1, 2), (-1,)), [2])
+    assert not SAT_solve(((1, 2), (-1,), (4, -2)), [-4])
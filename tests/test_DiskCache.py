@@ -0,0 +1,33 @@
+import os
+import time
+from Modelling.DiskCache import DiskCache, set_model_cache
+from Modelling import PropModels
+from Construction.Components import SBox
+
+def test_disk_cache_round_trip_and_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=3000)
+    assert cache.get(("a", 1)) is None
+    cache.put(("a", 1), [(1, -2)]*10)
+    assert cache.get(("a", 1)) == [(1, -2)]*10
+    for i in range(20):
+        cache.put(("b", i), bytes(500))
+        time.sleep(0.01)
+    sizes = [os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)]
+    assert sum(sizes) <= 3000 and not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+    # the most recent entry is kept, the oldest ones are evicted
+    assert cache.get(("b", 19)) == bytes(500) and cache.get(("b", 0)) is None
+
+def test_propagation_models_are_cached(tmp_path, monkeypatch):
+    set_model_cache(str(tmp_path))
+    try:
+        S = SBox(2, 2, [0, 2, 3, 1])
+        parity, ut = PropModels.compute_parity_propagation_model(S, 0, 0), PropModels.compute_UT_propagation_model(S)
+        def fail(*args, **kwargs):
+            raise AssertionError("model was not taken from the cache")
+        monkeypatch.setattr(PropModels, "QMC_optimise_CNF", fail)
+        # a different object with the same lookup table shares the entries
+        T = SBox(2, 2, [0, 2, 3, 1])
+        assert PropModels.compute_parity_propagation_model(T, 0, 0) == parity
+        assert PropModels.compute_UT_propagation_model(T) == ut
+    finally:
+        set_model_cache(None)
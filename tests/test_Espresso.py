@@ -0,0 +1,33 @@
+import random
+from bitarrays.bitset import BitSet
+from Construction.Components import SBox
+from LogicOptimisation.Espresso import espresso_optimise_CNF
+
+LUT = [0xC, 5, 6, 0xB, 9, 0, 0xA, 0xD, 3, 0xE, 0xF, 8, 4, 7, 1, 2]
+
+def _satisfied(clauses, x):
+    return all(any(((x >> (abs(l)-1)) & 1) == (l > 0) for l in clause) for clause in clauses)
+
+def test_espresso_CNF_is_exact_outside_dont_cares():
+    r = random.Random(7)
+    for n in (1, 4, 7, 9):
+        tt, dont_care = BitSet(2**n), BitSet(2**n)
+        for x in range(2**n):
+            p = r.random()
+            if p < 0.4:
+                tt.set(x)
+            elif p < 0.5:
+                dont_care.set(x)
+        # without time the cover falls back to minterms, it has to be exact as well
+        for clauses in (espresso_optimise_CNF(tt, dont_care), espresso_optimise_CNF(tt, dont_care, max_time=-1)):
+            for x in range(2**n):
+                if not dont_care.test(x):
+                    assert _satisfied(clauses, x) == tt.test(x)
+
+def test_espresso_models_match_QMC_models():
+    S, T = SBox(4, 4, LUT), SBox(4, 4, LUT, minimiser="espresso")
+    assert S.get_n_cvars() == T.get_n_cvars()
+    n = 8 + S.get_n_cvars()
+    for a, b in ((S.get_UT_propagation_model(), T.get_UT_propagation_model()), (S.get_parity_propagation_model(0, 0), T.get_parity_propagation_model(0, 0))):
+        for x in range(2**n):
+            assert _satisfied(a, x) == _satisfied(b, x)
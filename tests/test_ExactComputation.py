@@ -0,0 +1,106 @@
+from itertools import product
+from Construction.Components import XOR
+from Construction.CompoundFunction import CompoundFunction, INPUT_ID, OUTPUT_ID
+from Construction.Kernels import compile_correlation
+from Modelling.ExactComputation import RoundModel, construct_model_with_intermediate_vars, propagate_var, compute_exact_correlation_mod, compute_exact_correlation_mod_var, compute_correlation_precursor_model
+from Modelling.SAT_Solving import enum_projected_models, create_assumptions, from_assignment
+from test_Kernels import S, sbox_layer
+
+def test_propagate_var_bound_selectors():
+    # two inputs, two outputs, output i can only be active if input i is, count vars 5 and 6 mark it
+    cnf = ((-3, 1), (-4, 2), (-3, 5), (-4, 6), (3, -5), (4, -6))
+    count_vars = (5, 6)
+    m = 3
+    ios = tuple(((u, 0), {(tuple(), tuple()): c}) for u, c in ((3, 1), (3, 2), (3, 4), (1, 2)))
+    res = propagate_var(cnf, count_vars, 6, (1, 2), tuple(), (3, 4), tuple(), m, lambda u, v, k: 1, ios)
+    expected = set()
+    for (u, _), prop in ios:
+        o = min(c & -c for c in prop.values()).bit_length() - 1
+        for v in range(4):
+            if v & ~u == 0 and v.bit_count() <= m - 1 - o:
+                expected.add((v, 0))
+    assert set(res.keys()) == expected
+
+def test_round_model_windows():
+    fs = [sbox_layer(), sbox_layer()]
+    rounds = RoundModel(fs, precursor=True)
+    assert len(rounds) == 3 and rounds.count_vars == sum(rounds.count_varss, tuple())
+
+    def transitions(clauses, input_vars, output_vars, assumptions = ()):
+        res = set()
+        for u in (0x01, 0x30, 0xe7):
+            for r in enum_projected_models(clauses, output_vars, tuple(assumptions) + create_assumptions(input_vars, u)):
+                res.add((u, from_assignment(output_vars, r)))
+        return res
+
+    # the window after dropping the precursor behaves as the rounds built without it
+    rounds.drop_first()
+    assert rounds.count_vars == sum(rounds.count_varss[1:], tuple())
+    model, input_varss, output_varss, _, _, _ = construct_model_with_intermediate_vars(fs, precursor=False)
+    assert transitions(rounds.clauses, rounds.input_vars, rounds.output_vars, rounds.assumptions()) == transitions(model, input_varss[0], output_varss[-1])
+    rounds.drop_last()
+    assert len(rounds) == 1 and rounds.count_vars == rounds.count_varss[1]
+    model, input_varss, output_varss, _, _, _ = construct_model_with_intermediate_vars(fs[:1], precursor=False)
+    assert transitions(rounds.clauses, rounds.input_vars, rounds.output_vars, rounds.assumptions()) == transitions(model, input_varss[0], output_varss[-1])
+
+def key_addition(n):
+    f = CompoundFunction(n, n)
+    for i in range(n):
+        x = f.add_component(XOR)
+        f.connect_components(INPUT_ID, i, x, 0)
+        f.connect_to_key(x, 1)
+        f.connect_components(x, 0, OUTPUT_ID, i)
+    return f
+
+def sbox():
+    f = CompoundFunction(4, 4)
+    s = f.add_component(S)
+    for i in range(4):
+        f.connect_components(INPUT_ID, i, s, i)
+        f.connect_components(s, i, OUTPUT_ID, i)
+    return f
+
+def keyed_cipher():
+    # two keyed rounds on 4 bits, the correlation of every layer is the product of the UT matrix entries of its components
+    fs = [key_addition(4), sbox(), key_addition(4), sbox()]
+    return fs, [lambda u, v, k, c=compile_correlation(f): int(c([u], [v], [k])[0]) for f in fs]
+
+def reference_correlation(output_sizes, key_sizes, correlation_evals, u, v, m):
+    # every layer is propagated through all output masks and key masks: key masks -> correlation mod 2^m for the masks after each layer
+    s = {u: {tuple(): 1}}
+    for n, n_key, cor in zip(output_sizes, key_sizes, correlation_evals):
+        t = {}
+        for x, prop in s.items():
+            for y, k in product(range(2**n), range(2**n_key)):
+                c = cor(x, y, k)
+                if c != 0:
+                    ty = t.setdefault(y, {})
+                    for ks, c0 in prop.items():
+                        ty[ks + (k,)] = (ty.get(ks + (k,), 0) + c*c0) % 2**m
+        s = t
+    return {ks: c for ks, c in s.get(v, {}).items() if c != 0}
+
+def reference(fs, correlation_evals, u, v, m, precursor):
+    sizes, key_sizes = [f.output_size for f in fs], [f.n_key_bits for f in fs]
+    if precursor:
+        sizes, key_sizes = [fs[0].input_size] + sizes, [0] + key_sizes
+        correlation_evals = [lambda u, v, k: compute_correlation_precursor_model(u, v, k) if v & ~u == 0 else 0] + list(correlation_evals)
+    return reference_correlation(sizes, key_sizes, correlation_evals, u, v, m)
+
+CORRELATION_CASES = ((1, 1, 3, False), (0xf, 0x8, 4, False), (0b1011, 1, 3, True))
+
+def test_exact_correlation_mod_matches_reference():
+    fs, evals = keyed_cipher()
+    for u, v, m, precursor in CORRELATION_CASES:
+        expected = reference(fs, evals, u, v, m, precursor)
+        assert len(expected) > 0
+        for NThreads in (1, 3):
+            assert compute_exact_correlation_mod(fs, evals, u, v, m, precursor=precursor, NThreads=NThreads) == expected
+
+def test_exact_correlation_mod_var_matches_reference():
+    # one round model for all steps, with the worker solvers and their bound selectors kept between the steps
+    fs, evals = keyed_cipher()
+    for u, v, m, precursor in CORRELATION_CASES:
+        expected = reference(fs, evals, u, v, m, precursor)
+        for NThreads in (1, 3):
+            assert compute_exact_correlation_mod_var(fs, evals, u, v, m, precursor=precursor, NThreads=NThreads) == expected
@@ -0,0 +1,30 @@
+from Modelling.Executor import budget, get_pool, get_thread_pool, get_worker_count, process_pool, set_worker_count, SerialPool
+
+_state = {}
+def _init(x):
+    _state["x"] = x
+
+def _task(y):
+    # the budget of a worker is 1, nested pools run serially
+    return _state["x"] + y, budget(), type(process_pool(4)).__name__
+
+def _double(x):
+    return 2*x
+
+def test_budget_and_nested_pools():
+    try:
+        set_worker_count(3)
+        assert get_worker_count() == 3
+        assert budget() == 3 and budget(2) == 2 and budget(8) == 3 and budget(0) == 1
+        with process_pool(2, _init, (10,)) as pool:
+            assert sorted(pool.imap_unordered(_task, range(4))) == [(10 + y, 1, "SerialPool") for y in range(4)]
+        assert isinstance(process_pool(1, _init, (5,)), SerialPool) and _state["x"] == 5
+        # a serial pool releases the state of its initializer on exit
+        with process_pool(1, _init, (7,), _state.clear) as pool:
+            assert _state["x"] == 7 and pool.map(_double, range(2)) == [0, 2]
+        assert _state == {}
+        # the shared pools are reused and restarted when the number of workers changes
+        assert get_pool(2) is get_pool(2) and get_pool(2).map(_double, range(5)) == [0, 2, 4, 6, 8]
+        assert get_thread_pool(2) is get_thread_pool(2) and get_thread_pool(3) is not get_thread_pool(2)
+    finally:
+        set_worker_count(None)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from Construction.Components import SBox
+from Construction.CompoundFunction import CompoundFunction, INPUT_ID, OUTPUT_ID
+from Construction.IteratedCipher import construct_iterated_cipher
+from Modelling import Experiments
+from Modelling.Experiments import precursor_set, random_keys, run_integral_experiment
+
+S = SBox(4, 4, [0xC, 5, 6, 0xB, 9, 0, 0xA, 0xD, 3, 0xE, 0xF, 8, 4, 7, 1, 2])
+
+def cipher(r):
+    f = CompoundFunction(8, 8)
+    ids = [f.add_component(S) for _ in range(2)]
+    for i in range(8):
+        f.connect_components(INPUT_ID, i, ids[i//4], i % 4)
+        f.connect_components(ids[i//4], i % 4, OUTPUT_ID, (2*i) % 8 + i // 4)
+    return construct_iterated_cipher([f]*r, [0xff]*(r+1))
+
+def test_precursor_set():
+    assert sorted(precursor_set(0b1010, 1).tolist()) == [1, 3, 9, 11]
+
+def test_integral_experiment_matches_scalar_evaluation(tmp_path, monkeypatch):
+    f = cipher(2)
+    inputs = precursor_set(0x0f)
+    res = run_integral_experiment(f, inputs, 100, chunk_size=32, NThreads=2, seed=3)
+    expected = np.zeros((8, 17), dtype=np.int64)
+    for chunk in range(4):
+        keys = random_keys(np.random.default_rng((3, chunk)), min(32, 100 - 32*chunk), f.n_key_bits)
+        for k in keys.tolist():
+            ys = [f(x, k) for x in inputs.tolist()]
+            for i in range(8):
+                expected[i, sum((y >> i) & 1 for y in ys)] += 1
+    assert (res == expected).all()
+    # resuming from a complete checkpoint does not change the result
+    checkpoint = str(tmp_path / "run.npz")
+    assert (run_integral_experiment(f, inputs, 100, chunk_size=32, seed=3, checkpoint=checkpoint, checkpoint_interval=2) == res).all()
+    assert (run_integral_experiment(f, inputs, 100, chunk_size=32, seed=3, checkpoint=checkpoint) == res).all()
+    # evaluated a few keys and inputs at a time, the result is the same
+    monkeypatch.setattr(Experiments, "_MAX_LANES", 6)
+    assert (run_integral_experiment(f, inputs, 100, chunk_size=32, seed=3) == res).all()
+    with pytest.raises(ValueError):
+        run_integral_experiment(f, inputs, 100, chunk_size=32, seed=4, checkpoint=checkpoint)
+
+def _to_int(words):
+    return sum(int(w) << (64*i) for i, w in enumerate(np.atleast_1d(words)))
+
+def test_integral_experiment_wide_block():
+    # 18 S-boxes, 72 bit inputs and keys are rows of two words
+    f = CompoundFunction(72, 72)
+    ids = [f.add_component(S) for _ in range(18)]
+    for i in range(72):
+        f.connect_components(INPUT_ID, i, ids[i//4], i % 4)
+        f.connect_components(ids[i//4], i % 4, OUTPUT_ID, (5*i) % 72)
+    f = construct_iterated_cipher([f], [2**72 - 1]*2)
+    u = 0xf << 64
+    inputs = precursor_set(u, 1 << 70)
+    assert inputs.shape == (16, 2) and sorted(_to_int(x) for x in inputs) == sorted((x << 64) ^ (1 << 70) for x in range(16))
+    res = run_integral_experiment(f, inputs, 10, chunk_size=4, seed=5)
+    expected = np.zeros((72, 17), dtype=np.int64)
+    for chunk in range(3):
+        for k in random_keys(np.random.default_rng((5, chunk)), min(4, 10 - 4*chunk), f.n_key_bits):
+            ys = [f(_to_int(x), _to_int(k)) for x in inputs]
+            for i in range(72):
+                expected[i, sum((y >> i) & 1 for y in ys)] += 1
+    assert (res == expected).all()
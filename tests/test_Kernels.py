@@ -0,0 +1,60 @@
+import numpy as np
+from Construction.Components import SBox, XOR
+from Construction.CompoundFunction import CompoundFunction, INPUT_ID, OUTPUT_ID
+from Construction.IteratedCipher import construct_iterated_cipher
+from Construction.Linear import Linear
+from Construction.BatchEvaluation import evaluate_batch
+from Construction import Kernels
+from Construction.Kernels import compile_kernel, compile_correlation, structural_hash
+from Modelling.PropModels import UT_matrix
+from galois import GF2
+
+S = SBox(4, 4, [0xC, 5, 6, 0xB, 9, 0, 0xA, 0xD, 3, 0xE, 0xF, 8, 4, 7, 1, 2])
+P = [0, 4, 1, 5, 2, 6, 3, 7]
+
+def sbox_layer():
+    f = CompoundFunction(8, 8)
+    ids = [f.add_component(S) for _ in range(2)]
+    for i in range(8):
+        f.connect_components(INPUT_ID, i, ids[i//4], i % 4)
+        f.connect_components(ids[i//4], i % 4, OUTPUT_ID, P[i])
+    return f
+
+def linear_layer(mat):
+    f = CompoundFunction(8, 8)
+    idl = f.add_component(Linear(mat))
+    for i in range(8):
+        f.connect_components(INPUT_ID, i, idl, i)
+        f.connect_components(idl, i, OUTPUT_ID, i)
+    return f
+
+def test_kernel_matches_batch_evaluation(monkeypatch):
+    rng = np.random.default_rng(2)
+    mat = GF2(rng.integers(0, 2, (8, 8)))
+    f = construct_iterated_cipher([sbox_layer(), linear_layer(mat)]*2, [0xff, 0, 0x3c, 0, 0xff])
+    g = construct_iterated_cipher([sbox_layer(), linear_layer(mat)]*2, [0xff, 0, 0x3c, 0, 0xff])
+    assert structural_hash(f) == structural_hash(g)
+    x = rng.integers(0, 2**8, 1000, dtype=np.uint64)
+    k = rng.integers(0, 2**f.n_key_bits, 1000, dtype=np.uint64)
+    assert (compile_kernel(f)(x, k) == evaluate_batch(f, x, k)).all()
+    # the hash is kept per function, compiling again does not generate the source again
+    monkeypatch.setattr(Kernels, "kernel_source", None)
+    assert structural_hash(f) == structural_hash(g) and (compile_kernel(g)(x, k) == evaluate_batch(f, x, k)).all()
+
+def test_correlation_kernel_matches_UT_matrices():
+    M = UT_matrix(S, 4, 4)
+    us, vs = np.meshgrid(np.arange(256, dtype=np.uint64), np.arange(256, dtype=np.uint64))
+    us, vs = us.ravel(), vs.ravel()
+    expected = []
+    for u, v in zip(us.tolist(), vs.tolist()):
+        vp = sum(((v >> P[i]) & 1) << i for i in range(8))
+        expected.append(int(M[vp & 15, u & 15]) * int(M[vp >> 4, u >> 4]))
+    assert compile_correlation(sbox_layer())(us, vs).tolist() == expected
+    f = CompoundFunction(2, 2)
+    for i in range(2):
+        x = f.add_component(XOR)
+        f.connect_components(INPUT_ID, i, x, 0)
+        f.connect_to_key(x, 1)
+        f.connect_components(x, 0, OUTPUT_ID, i)
+    # a key addition on valid transitions: (-2)^(number of active key bits)
+    assert compile_correlation(f)([3, 3, 1], [3, 3, 1], [3, 1, 0]).tolist() == [4, -2, 1]
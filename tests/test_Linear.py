@@ -0,0 +1,62 @@
+import numpy as np
+from itertools import product
+from galois import GF, GF2
+from Construction.Linear import Linear, linear_to_compound_COPY_XOR, convert_to_F2_matrix
+from Construction.CompoundFunction import CompoundFunction, INPUT_ID, OUTPUT_ID
+from Modelling.SAT_Solving import enum_projected_models, create_assumptions
+from Modelling.UT_Trails import get_divisibility_no_trail
+
+def test_convert_to_F2_matrix():
+    Field = GF(2**4)
+    mat = Field.Random((2, 3), seed=1)
+    res = convert_to_F2_matrix(mat)
+    assert res.shape == (8, 12)
+    # column 4*i+j is the image of 2^j at position i
+    for i, j in product(range(3), range(4)):
+        x = Field.Zeros(3)
+        x[i] = Field(1 << j)
+        y = mat @ x
+        assert [int(res[4*a+b, 4*i+j]) for a in range(2) for b in range(4)] == [(int(y[a]) >> b) & 1 for a in range(2) for b in range(4)]
+
+def _single(L):
+    f = CompoundFunction(L.input_size, L.output_size)
+    c = f.add_component(L)
+    for i in range(L.input_size):
+        f.connect_components(INPUT_ID, i, c, i)
+    for i in range(L.output_size):
+        f.connect_components(c, i, OUTPUT_ID, i)
+    return f
+
+def _count(model, u, v):
+    assumptions = create_assumptions(model[1], u) + create_assumptions(model[2], v)
+    return sum(1 for _ in enum_projected_models(model[0], sorted(model[0].vars()), assumptions))
+
+def test_linear_models_match_COPY_XOR_expansion():
+    rng = np.random.default_rng(4)
+    for _ in range(2):
+        mat = GF2(rng.integers(0, 2, (3, 4)))
+        L = Linear(mat)
+        f, g = _single(L), linear_to_compound_COPY_XOR(L)
+        parity, UT, UT_expanded = f.to_model(), f.to_UT_model(), g.to_UT_model()
+        M = np.asarray(mat, dtype=int)
+        for u, v in product(range(16), range(8)):
+            # monomial trails: every active output chooses one of its inputs, the chosen inputs are u
+            choices = product(*[[i for i in range(4) if M[j, i]] for j in range(3) if (v >> j) & 1])
+            assert _count(parity, u, v) == sum(1 for c in choices if sum(1 << i for i in set(c)) == u)
+            # UT trails are the trails of the expansion, with the same weights
+            n = _count(UT, u, v)
+            assert n == _count(UT_expanded, u, v)
+            if n > 0:
+                assert get_divisibility_no_trail(*UT, u, v, precursor=False) == get_divisibility_no_trail(*UT_expanded, u, v, precursor=False)
+
+def _relation(clauses, n, m):
+    return set((sum(1 << i for i in range(n) if mo[i] > 0), sum(1 << j for j in range(m) if mo[n+j] > 0)) for mo in enum_projected_models(clauses, list(range(1, n+m+1))))
+
+def test_linear_parity_model_key_masks():
+    rng = np.random.default_rng(5)
+    L = Linear(GF2(rng.integers(0, 2, (3, 4))))
+    base = _relation(L.compute_parity_propagation_model(0, 0), 4, 3)
+    for input_key_mask, output_key_mask in ((0b0101, 0), (0, 0b010), (0b1000, 0b101)):
+        # a key fed input may be inactive while the layer uses it, a key fed output may be active while the layer does not produce it
+        expected = set((u & ~d, v | e) for u, v in base for d in range(16) if d & ~input_key_mask == 0 for e in range(8) if e & ~output_key_mask == 0)
+        assert _relation(L.compute_parity_propagation_model(input_key_mask, output_key_mask), 4, 3) == expected
@@ -0,0 +1,42 @@
+import random
+import numpy as np
+from galois import GF2
+from Construction.Components import Sink
+from Construction.CompoundFunction import CompoundFunction, INPUT_ID, OUTPUT_ID
+from Construction.IteratedCipher import construct_iterated_cipher
+from Construction.Linear import Linear, linear_to_compound_COPY_XOR
+from Construction.Optimisation import optimise_compound_function
+from Modelling.UT_Trails import get_divisibility_no_trail
+from test_Kernels import S, sbox_layer
+
+def truncated_layer():
+    # the output of the second S-box only reaches Sinks through a third S-box
+    f = CompoundFunction(8, 4)
+    ids = [f.add_component(S) for _ in range(3)]
+    for i in range(8):
+        f.connect_components(INPUT_ID, i, ids[i//4], i % 4)
+    for i in range(4):
+        f.connect_components(ids[1], i, ids[2], i)
+        f.connect_components(ids[2], i, f.add_component(Sink), 0)
+    for i in range(4):
+        f.connect_components(ids[0], i, OUTPUT_ID, i)
+    return f
+
+def test_optimisation_preserves_function_and_divisibility():
+    rng = np.random.default_rng(3)
+    # a sparse linear layer, half of its rows and columns are unit vectors (COPY1 and XOR1)
+    mat = GF2(np.eye(8, dtype=int))
+    mat[:4] += GF2(rng.integers(0, 2, (4, 8)) * (rng.random((4, 8)) < 0.3))
+    mat[np.arange(4), np.arange(4)] = 1
+    f = construct_iterated_cipher([sbox_layer(), linear_to_compound_COPY_XOR(Linear(mat)), truncated_layer()], [0xff, 0, 0x0f, 0])
+    g, statistics = optimise_compound_function(f)
+    assert (g.input_size, g.output_size, g.n_key_bits) == (f.input_size, f.output_size, f.n_key_bits)
+    assert statistics["after"]["clauses"] < statistics["before"]["clauses"] and statistics["after"]["vars"] < statistics["before"]["vars"]
+    assert statistics["rewrites"]["flatten"] > 0 and statistics["rewrites"]["identities"] > 0 and statistics["rewrites"]["dead"] > 0
+    r = random.Random(3)
+    for _ in range(200):
+        x, k = r.getrandbits(8), r.getrandbits(f.n_key_bits)
+        assert f(x, k) == g(x, k)
+    mf, mg = f.to_UT_model(), g.to_UT_model()
+    for u, v in ((0xff, 1), (0x0f, 2), (0x81, 8), (0x7f, 3), (0xfe, 4)):
+        assert get_divisibility_no_trail(*mf, u, v) == get_divisibility_no_trail(*mg, u, v)
@@ -0,0 +1,34 @@
+import random
+from itertools import product
+from Modelling.Preprocessing import preprocess_model
+from Modelling.SAT_Solving import IncrementalSolver
+
+def projections(cnf, nvars, protected):
+    res = set()
+    for bits in product((False, True), repeat=nvars):
+        if all(any(bits[abs(x)-1] == (x > 0) for x in c) for c in cnf):
+            res.add(tuple(bits[v-1] for v in protected))
+    return res
+
+def test_preprocessing_preserves_protected_projection():
+    rng = random.Random(16)
+    for _ in range(60):
+        nvars = 9
+        # chains of equivalences and units mixed with random clauses
+        cnf = [tuple(rng.choice((-1, 1))*x for x in rng.sample(range(1, nvars+1), rng.randint(1, 3))) for _ in range(rng.randint(4, 14))]
+        a, b = rng.sample(range(1, nvars+1), 2)
+        cnf += [(a, -b), (-a, b)]
+        protected = sorted(rng.sample(range(1, nvars+1), 3))
+        pre = preprocess_model(cnf, protected)
+        assert projections(pre.clauses, nvars, protected) == projections(cnf, nvars, protected)
+        with IncrementalSolver(pre.clauses) as solver:
+            if solver.solve():
+                m = pre.lift(solver.get_model())
+                assert all(any(m[abs(x)-1] == x for x in c) for c in cnf)
+
+def test_preprocessing_reduces_equivalence_chains():
+    # x1 = x2 = ... = x10, only x1 and x10 are protected
+    cnf = [c for i in range(1, 10) for c in ((-i, i+1), (i, -i-1))]
+    pre = preprocess_model(cnf, (1, 10))
+    assert sorted(map(sorted, pre.clauses)) == [[-10, 1], [-1, 10]]
+    assert pre.statistics()["clauses"] == (18, 2)
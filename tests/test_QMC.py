@@ -0,0 +1,60 @@
+import random
+from bitarrays.bitset import BitSet
+from LogicOptimisation.QMC import DNF_prime_implicants_complement, QMC_optimise_CNF
+from ortools.sat.python import cp_model
+
+def _random_truth_table(r, n, p):
+    tt = BitSet(2**n)
+    for i in range(2**n):
+        if r.random() < p:
+            tt.set(i)
+    return tt
+
+def test_prime_implicants_match_transforms():
+    r = random.Random(2)
+    for n in (3, 6, 9):
+        tt = _random_truth_table(r, n, 0.3)
+        expected = []
+        for a in range(2**n):
+            if not tt.test(a):
+                X = BitSet(tt)
+                X.swap(a)
+                X.ORup()
+                X.flip()
+                X.ORdown()
+                X.MOREdown()
+                expected += [(a, u) for u in X if u & a == 0]
+        assert DNF_prime_implicants_complement(tt, 1) == expected
+        assert DNF_prime_implicants_complement(tt, 4) == expected
+
+def test_QMC_CNF_is_exact():
+    r = random.Random(3)
+    n = 5
+    tt = _random_truth_table(r, n, 0.6)
+    clauses = QMC_optimise_CNF(tt, BitSet(2**n), threads=2)
+    for x in range(2**n):
+        satisfied = all(any(((x >> (abs(l)-1)) & 1) == (l > 0) for l in clause) for clause in clauses)
+        assert satisfied == tt.test(x)
+
+def test_QMC_cover_is_minimal_with_dont_cares():
+    r = random.Random(5)
+    n = 6
+    for _ in range(3):
+        tt, dont_care = _random_truth_table(r, n, 0.5), _random_truth_table(r, n, 0.2)
+        tt |= dont_care
+        tt ^= dont_care
+        clauses = QMC_optimise_CNF(tt, dont_care, threads=1)
+        for x in range(2**n):
+            if not dont_care.test(x):
+                assert all(any(((x >> (abs(l)-1)) & 1) == (l > 0) for l in clause) for clause in clauses) == tt.test(x)
+        # the unreduced set cover over all prime implicants
+        S = DNF_prime_implicants_complement(tt, 1)
+        model = cp_model.CpModel()
+        variables = [model.NewBoolVar(f"x{i}") for i in range(len(S))]
+        for v in range(2**n):
+            if not tt.test(v) and not dont_care.test(v):
+                model.AddBoolOr([variables[i] for i, (a, u) in enumerate(S) if (v ^ a) & ~u == 0])
+        model.Minimize(sum(variables))
+        solver = cp_model.CpSolver()
+        assert solver.Solve(model) == cp_model.OPTIMAL
+        assert len(clauses) == solver.ObjectiveValue()
@@ -0,0 +1,64 @@
+from itertools import product
+from Modelling.SAT_Solving import IncrementalSolver, enum_models, enum_projected_models, create_assumptions, from_assignment
+
+def brute_force(clauses, projected_vars, assumptions=()):
+    variables = sorted(set(abs(x) for clause in clauses for x in clause) | set(projected_vars) | set(abs(x) for x in assumptions))
+    res = set()
+    for values in product((False, True), repeat=len(variables)):
+        a = dict(zip(variables, values))
+        lit = lambda x: a[abs(x)] == (x > 0)
+        if all(any(lit(x) for x in clause) for clause in clauses) and all(lit(x) for x in assumptions):
+            res.add(tuple(a[v] for v in projected_vars))
+    return res
+
+def projected(models, projected_vars):
+    return [tuple(m[v-1] > 0 for v in projected_vars) for m in models]
+
+CNFS = [
+    ((1, 2), (-1, -2), (4, 1)), # variable 3 does not occur
+    ((1, 2, 3), (-1, -2), (-2, -3), (2, 4, -5)),
+    ((1, -2), (2, -3), (3, -1), (4, 5, 6), (-4, -6)),
+]
+
+def test_enum_models_only_uses_clause_variables():
+    for cnf in CNFS:
+        vs = sorted(set(abs(x) for clause in cnf for x in clause))
+        models = projected(enum_models(cnf), vs)
+        assert len(models) == len(set(models)) == len(brute_force(cnf, vs))
+        assert set(models) == brute_force(cnf, vs)
+
+def test_enum_projected_models():
+    for cnf in CNFS:
+        for pv in ((1,), (1, 2), (2, 4)):
+            models = projected(enum_projected_models(cnf, pv), pv)
+            assert len(models) == len(set(models))
+            assert set(models) == brute_force(cnf, pv)
+
+def test_selector_isolation():
+    cnf = CNFS[1]
+    with IncrementalSolver(cnf) as solver:
+        for _ in range(2):
+            for a in ((1,), (-1,), (), (2, -5)):
+                models = projected(solver.enum_projected_models((1, 2, 3), a), (1, 2, 3))
+                assert len(models) == len(set(models))
+                assert set(models) == brute_force(cnf, (1, 2, 3), a)
+
+def test_nested_enumeration():
+    cnf = CNFS[2]
+    key_vars = (4, 5)
+    with IncrementalSolver(cnf) as solver:
+        outer = set()
+        for k in solver.enum_projected_models(key_vars):
+            k = create_assumptions(key_vars, from_assignment(key_vars, k))
+            outer.add(tuple(x > 0 for x in k))
+            inner = projected(solver.enum_models(k), solver.model_vars)
+            assert set(inner) == brute_force(cnf, solver.model_vars, k)
+            assert len(inner) == len(set(inner))
+    assert outer == brute_force(cnf, key_vars)
+
+def test_abandoned_generator_after_delete():
+    solver = IncrementalSolver(CNFS[0])
+    g = solver.enum_projected_models((1,))
+    next(g)
+    solver.delete()
+    g.close()
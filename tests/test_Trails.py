@@ -0,0 +1,36 @@
+from random import Random
+from itertools import product
+from Modelling.Trails import contains_nonzero_trail, contains_nonzero_trails, is_key_dependent, get_sum, get_key_independent_sum
+
+def test_contains_nonzero_trails_matches_single_queries():
+    # output i is active iff input i is, output 2 is the xor-like combination of both inputs
+    cnf = ((-1, 3), (1, -3), (-2, 4), (2, -4), (-5, 1, 2), (-1, -2, -5))
+    queries = [(u, v, p) for u in range(4) for v in range(8) for p in (False, True)]
+    batch = list(contains_nonzero_trails(cnf, (1, 2), (3, 4, 5), iter(queries)))
+    assert batch == [contains_nonzero_trail(cnf, (1, 2), (3, 4, 5), *q) for q in queries]
+    assert list(contains_nonzero_trails(cnf, (1, 2), (3, 4, 5), [(1, 1)])) == [True]
+
+def key_parities(cnf, nvars, input_vars, output_vars, key_vars, u, v):
+    # key mask -> number of models of the trail u -> v with that key mask modulo 2, by explicit enumeration
+    parities = {}
+    for bits in product((0, 1), repeat=nvars):
+        if any(bits[x-1] != (u >> i) & 1 for i, x in enumerate(input_vars)) or any(bits[x-1] != (v >> i) & 1 for i, x in enumerate(output_vars)):
+            continue
+        if all(any(bits[abs(x)-1] == (x > 0) for x in c) for c in cnf):
+            k = sum(bits[x-1] << i for i, x in enumerate(key_vars))
+            parities[k] = parities.get(k, 0) ^ 1
+    return parities
+
+def test_sums_match_enumeration():
+    rng = Random(11)
+    input_vars, output_vars, key_vars = (1, 2), (3,), (4, 5)
+    for _ in range(40):
+        # every variable occurs, such that the models are the assignments of all 7 variables
+        cnf = tuple(tuple(rng.choice((-1, 1))*x for x in rng.sample(range(1, 8), 3)) for _ in range(rng.randint(2, 8)))
+        cnf += tuple((x, -x) for x in range(1, 8))
+        for u, v in product(range(4), range(2)):
+            parities = key_parities(cnf, 7, input_vars, output_vars, key_vars, u, v)
+            assert get_sum(cnf, input_vars, output_vars, key_vars, u, v) == set(k for k, p in parities.items() if p == 1)
+            assert get_key_independent_sum(cnf, input_vars, output_vars, key_vars, u, v) == parities.get(0, 0)
+            # the key 0 does not make a sum key dependent
+            assert is_key_dependent(cnf, input_vars, output_vars, key_vars, u, v) == any(p == 1 for k, p in parities.items() if k != 0)
@@ -0,0 +1,85 @@
+from Modelling.UT_Trails import get_divisibility_no_trail, get_dominant_trail, get_divisibility_table_no_trail, get_divisibility_of_key_dependence_no_trail, get_divisibility_no_key_dependence, get_divisibility_no_key_dependent_trail
+from itertools import product
+from math import inf
+import random
+
+def _brute_min_weight(cnf, nvars, assumptions, count_vars):
+    res = inf
+    for bits in product((False, True), repeat=nvars):
+        if all(bits[abs(x)-1] == (x > 0) for x in assumptions) and all(any(bits[abs(x)-1] == (x > 0) for x in c) for c in cnf):
+            res = min(res, sum(bits[c-1] for c in count_vars))
+    return res
+
+def test_divisibility_search_strategies_match_brute_force():
+    rng = random.Random(6)
+    input_vars, output_vars, key_vars, count_vars = (1, 2), (3,), (4,), (5, 6, 7, 8)
+    for _ in range(30):
+        cnf = tuple(tuple(rng.choice((-1, 1))*x for x in rng.sample(range(1, 9), 3)) for _ in range(rng.randint(3, 10)))
+        for u, v in ((1, 1), (3, 0), (2, 1)):
+            trail = tuple(input_vars[i] if (u >> i) & 1 else -input_vars[i] for i in range(2)) + ((3,) if v else (-3,))
+            expected = _brute_min_weight(cnf, 8, trail, count_vars)
+            expected_key = _brute_min_weight(cnf, 8, trail + (4,), count_vars)
+            for search in ("up", "down", "bisect", "maxsat"):
+                assert get_divisibility_no_trail(cnf, input_vars, output_vars, key_vars, count_vars, u, v, precursor=False, search=search) == expected
+                assert get_divisibility_of_key_dependence_no_trail(cnf, input_vars, output_vars, key_vars, count_vars, u, v, precursor=False, search=search) == expected_key
+            d, m = get_dominant_trail(cnf, input_vars, output_vars, key_vars, count_vars, u, v, precursor=False)
+            assert d == expected
+            if m is not None:
+                assert all(any(x in m for x in c) for c in cnf) and all(x in m for x in trail)
+                assert sum(1 for c in count_vars if c in m) == d
+
+def test_divisibility_table_matches_single_queries():
+    rng = random.Random(8)
+    input_vars, output_vars, key_vars, count_vars = (1, 2), (3, 4), (5,), (6, 7, 8)
+    cnf = tuple(tuple(rng.choice((-1, 1))*x for x in rng.sample(range(1, 9), 3)) for _ in range(8))
+    for search, preprocess in (("up", False), ("maxsat", False), ("up", True)):
+        table = get_divisibility_table_no_trail(cnf, input_vars, output_vars, key_vars, count_vars, 1, range(4), search=search, NThreads=2, preprocess=preprocess)
+        assert table == {v: get_divisibility_no_trail(cnf, input_vars, output_vars, key_vars, count_vars, 1, v) for v in range(4)}
+
+def _brute_no_key_dependence(cnf, nvars, trail, key_vars, count_vars):
+    # parity of the trails of the lowest weight for every key, d + 1 if it is even for all keys
+    models = [bits for bits in product((False, True), repeat=nvars) if all(bits[abs(x)-1] == (x > 0) for x in trail) and all(any(bits[abs(x)-1] == (x > 0) for x in c) for c in cnf)]
+    if len(models) == 0:
+        return inf
+    d = min(sum(m[c-1] for c in count_vars) for m in models)
+    parities = {}
+    for m in models:
+        if sum(m[c-1] for c in count_vars) == d:
+            k = tuple(m[c-1] for c in key_vars)
+            parities[k] = parities.get(k, 0) ^ 1
+    return d if any(parities.values()) else d + 1
+
+def test_divisibility_no_key_dependence_matches_brute_force():
+    rng = random.Random(9)
+    input_vars, output_vars, key_vars, count_vars = (1,), (2,), (3, 4), (5, 6, 7)
+    for _ in range(30):
+        cnf = tuple(tuple(rng.choice((-1, 1))*x for x in rng.sample(range(1, 8), 3)) for _ in range(rng.randint(3, 9)))
+        for u, v in ((1, 1), (0, 1), (1, 0)):
+            trail = (input_vars[0] if u else -input_vars[0], output_vars[0] if v else -output_vars[0])
+            expected = _brute_no_key_dependence(cnf, 7, trail, key_vars, count_vars)
+            assert get_divisibility_no_key_dependence(cnf, input_vars, output_vars, key_vars, count_vars, u, v, precursor=False) == expected
+
+def _brute_no_key_dependent_trail(cnf, nvars, trail, key_vars, count_vars):
+    # d if a lightest trail is key dependent or their number is odd, d + 1 otherwise (trails are projected on the model variables)
+    model_vars = sorted(set(abs(x) for c in cnf for x in c))
+    models = set(tuple(bits[x-1] for x in model_vars) for bits in product((False, True), repeat=nvars) if all(bits[abs(x)-1] == (x > 0) for x in trail) and all(any(bits[abs(x)-1] == (x > 0) for x in c) for c in cnf))
+    if len(models) == 0:
+        return inf
+    value = lambda m, x: m[model_vars.index(x)] if x in model_vars else False
+    weight = lambda m: sum(value(m, c) for c in count_vars)
+    d = min(weight(m) for m in models)
+    lightest = [m for m in models if weight(m) == d]
+    if any(value(m, k) for m in lightest for k in key_vars):
+        return d
+    return d + 1 - len(lightest) % 2
+
+def test_divisibility_no_key_dependent_trail_matches_brute_force():
+    rng = random.Random(10)
+    input_vars, output_vars, key_vars, count_vars = (1,), (2,), (3, 4), (5, 6, 7)
+    for _ in range(30):
+        cnf = tuple(tuple(rng.choice((-1, 1))*x for x in rng.sample(range(1, 8), 3)) for _ in range(rng.randint(3, 9)))
+        cnf += tuple((x, -x) for x in range(1, 8))
+        for u, v in ((1, 1), (0, 1), (1, 0)):
+            trail = (input_vars[0] if u else -input_vars[0], output_vars[0] if v else -output_vars[0])
+            expected = _brute_no_key_dependent_trail(cnf, 7, trail, key_vars, count_vars)
+            assert get_divisibility_no_key_dependent_trail(cnf, input_vars, output_vars, key_vars, count_vars, u, v, precursor=False) == expected